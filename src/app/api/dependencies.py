@@ -1,11 +1,13 @@
 from typing import Annotated
 from sqlalchemy.ext.asyncio import AsyncSession
-from fastapi import Depends, UploadFile, File
+from fastapi import Depends, UploadFile, File, Header
+import hmac
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from app.core.db.database import async_get_db
 from app.core.security import verify_token, TokenType
 from app.core.exceptions.http_exceptions import UnauthorizedException, ForbiddenException
+from app.core.config import settings
 from app.model.user import User
 
 http_bearer = HTTPBearer()
@@ -44,4 +46,19 @@ async def get_active_current_user(
     
     return user
 
-ActiveCurrentUser = Annotated[User, Depends(get_active_current_user)]
\ No newline at end of file
+ActiveCurrentUser = Annotated[User, Depends(get_active_current_user)]
+
+
+async def get_query_debug(
+    x_debug_token: Annotated[str | None, Header(description="Token enabling query diagnostics")] = None
+) -> bool:
+    if x_debug_token is None:
+        return False
+    
+    expected = settings.QUERY_DEBUG_TOKEN
+    if not expected or not hmac.compare_digest(x_debug_token, expected.get_secret_value()):
+        raise ForbiddenException("Query diagnostics not allowed")
+    
+    return True
+
+QueryDebug = Annotated[bool, Depends(get_query_debug)]
\ No newline at end of file
@@ -2,10 +2,12 @@ from fastapi import APIRouter
 
 from app.api.v1.auth_router import auth
 from app.api.v1.dataset_router import dataset
+from app.api.v1.job_router import jobs
 
 from app.core.config import settings
 
 api_router = APIRouter(prefix=settings.API_BASE)
 
 api_router.include_router(auth)
-api_router.include_router(dataset)
\ No newline at end of file
+api_router.include_router(dataset)
+api_router.include_router(jobs)
\ No newline at end of file
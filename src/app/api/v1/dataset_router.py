@@ -1,10 +1,11 @@
-from fastapi import APIRouter, status, UploadFile, Query
+from fastapi import APIRouter, status, UploadFile, Query, BackgroundTasks, Request
+from typing import Literal
 
-from app.api.dependencies import dbDepSession, ActiveCurrentUser, fileDep
+from app.api.dependencies import dbDepSession, ActiveCurrentUser, fileDep, QueryDebug
 from app.service.dataset_service import dataset_service
 from app.service.record_service import record_service
-from app.schemas.dataset_schema import DatasetResponse, DatasetPaginatedResponse, DatasetUploadResponse, UpdateDataset
-from app.schemas.record_schema import RecordCreate, RecordResponse, RecordPaginatedRespone, RecordUpdate, RecordListResponse, ListBatchUpdate
+from app.schemas.dataset_schema import DatasetResponse, DatasetPaginatedResponse, DatasetUploadResponse, UpdateDataset, UpdateDatasetStorage, UpdateDatasetEncoding, DatasetEncodingResponse, AlterDatasetColumn, AlterDatasetColumnResponse, DatasetProfileResponse, ColumnValuesResponse, CreateDatasetVersion, DatasetVersionResponse, DatasetVersionListResponse, DatasetVersionRecordsResponse, JoinDatasets, JoinDatasetsResponse, CloneDataset
+from app.schemas.record_schema import RecordCreate, RecordResponse, RecordPaginatedRespone, RecordUpdate, RecordListResponse, ListBatchUpdate, RecordSampleResponse, RecordChangesResponse, RecordBulkCreateResponse, BulkDeleteRecords, BulkDeleteResponse, UpdateByFilter, UpdateByFilterResponse, FindReplace, FindReplaceResponse, DuplicatesResponse, ViewportResponse
 
 
 
@@ -22,9 +23,11 @@ dataset = APIRouter(
 async def upload_dataset(
     file: fileDep,
     db: dbDepSession,
-    user: ActiveCurrentUser
+    user: ActiveCurrentUser,
+    storage: Literal["jsonb", "columnar"] = Query(default="jsonb", description="Storage backend for the rows"),
+    record_encoding: Literal["object", "positional"] | None = Query(default=None, description="Row layout, wide files default to positional")
 ):
-    return await dataset_service.create_dataset(db, file, user.id)
+    return await dataset_service.create_dataset(db, file, user.id, storage, record_encoding)
 
 @dataset.post(
     "/{id}/records",
@@ -41,6 +44,35 @@ async def create_record(
     return await record_service.create_record(db, id, user, record_data.model_dump())
 
 
+@dataset.post(
+    "/{id}/records/bulk",
+    response_model=RecordBulkCreateResponse,
+    status_code=status.HTTP_201_CREATED,
+    description="Create many records from a JSON array or an NDJSON stream of record bodies. Invalid records are reported and skipped",
+    openapi_extra={
+        "requestBody": {
+            "required": True,
+            "content": {
+                "application/json": {
+                    "schema": {"type": "array", "items": RecordCreate.model_json_schema()}
+                },
+                "application/x-ndjson": {
+                    "schema": {"type": "string", "description": "One record body per line"}
+                }
+            }
+        }
+    }
+)
+async def bulk_create_records(
+    id: str,
+    request: Request,
+    db: dbDepSession,
+    user: ActiveCurrentUser
+):
+    return await record_service.bulk_create_records(
+        id, user, db, request.stream(), request.headers.get("content-type", "application/json")
+    )
+
 @dataset.get(
     "/",
     response_model=DatasetPaginatedResponse,
@@ -67,7 +99,7 @@ async def export_dataset(
     user: ActiveCurrentUser,
     format: str | None = Query(default="csv", description="The format to export as", examples=["csv", "xlxs"])
 ):
-    return await dataset_service.export_dataset(id, db, user)
+    return await dataset_service.export_dataset(id, db, user, format)
     
 
 @dataset.get(
@@ -82,9 +114,28 @@ async def get_all_record_for_dataset(
     db: dbDepSession,
     user: ActiveCurrentUser,
     page: int = Query(default=1, ge=1, examples=["2"], description="The current page to fetch"),
-    page_size: int = Query(default=10, ge=1, examples=["50"], description="Number of resource to fetch per page")
+    page_size: int = Query(default=10, ge=1, examples=["50"], description="Number of resource to fetch per page"),
+    columns: str | None = Query(default=None, examples=["name,email"], description="Comma separated list of columns to return")
 ):
-    return await record_service.get_records_for_dataset(id, user, db, page, page_size)
+    return await record_service.get_records_for_dataset(id, user, db, page, page_size, columns)
+
+
+@dataset.get(
+    "/{id}/records/stream",
+    status_code=status.HTTP_200_OK,
+    description="Stream all records in a dataset as newline delimited json, ordered by id"
+)
+async def stream_records(
+    id: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    key: str | None = Query(default=None, description="Name of the column to filter by"),
+    value: str | None = Query(default=None, description="Value of the column for filtering"),
+    after: str | None = Query(default=None, description="Resume after this record id"),
+    columns: str | None = Query(default=None, examples=["name,email"], description="Comma separated list of columns to return"),
+    batch_size: int = Query(default=1000, ge=1, le=10000, description="Number of rows fetched from the cursor at a time")
+):
+    return await record_service.stream_records(id, user, db, key, value, after, columns, batch_size)
 
 
 @dataset.get(
@@ -97,11 +148,13 @@ async def filter_rows_by_column(
     id: str,
     db: dbDepSession,
     user: ActiveCurrentUser,
+    debug: QueryDebug,
     key: str | None = Query(default=None, description="Name of the column to filter by"),
     value: str | None = Query(default=None, description="Value of the column for filtering"),
     sort: str | None = Query(default=None, description="Column to sort by"),
     page_size: int = Query(default=100, ge=1, description="Number of records to fetch"),
-    page: int = Query(default=1, ge=1, description="Number of records to fetch")
+    page: int = Query(default=1, ge=1, description="Number of records to fetch"),
+    columns: str | None = Query(default=None, examples=["name,email"], description="Comma separated list of columns to return")
 ):
     return await record_service.filter_record_by_column(
         dataset_id=id, 
@@ -111,9 +164,157 @@ async def filter_rows_by_column(
         user=user, 
         page_size=page_size, 
         page=page,
-        sort_by=sort
+        sort_by=sort,
+        columns=columns,
+        debug=debug
     )
 
+@dataset.get(
+    "/{id}/changes",
+    response_model=RecordChangesResponse,
+    status_code=status.HTTP_200_OK,
+    description="Fetch the record changes made after a sequence number, for incremental sync"
+)
+async def get_dataset_changes(
+    id: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    since: int = Query(default=0, ge=0, description="Last sequence number already applied"),
+    limit: int = Query(default=1000, ge=1, le=10000, description="Maximum number of changes to return"),
+    columns: str | None = Query(default=None, examples=["name,email"], description="Comma separated list of columns to return")
+):
+    return await record_service.get_changes(id, user, db, since, limit, columns)
+
+@dataset.get(
+    "/{id}/profile",
+    response_model=DatasetProfileResponse,
+    status_code=status.HTTP_200_OK,
+    description="Fetch column statistics for a dataset"
+)
+async def get_dataset_profile(
+    id: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser
+):
+    return await dataset_service.get_dataset_profile(id, user, db)
+
+
+@dataset.get(
+    "/{id}/viewport",
+    response_model=ViewportResponse,
+    status_code=status.HTTP_200_OK,
+    description="Fetch the records with a position in [start, end) and the columns in [column_start, column_end), for spreadsheet grids"
+)
+async def get_viewport(
+    id: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    start: int = Query(ge=0, examples=["250000"], description="First position to fetch"),
+    end: int = Query(ge=1, examples=["250100"], description="Position to stop before"),
+    column_start: int = Query(default=0, ge=0, description="Index of the first column in file order"),
+    column_end: int | None = Query(default=None, ge=1, description="Index of the column to stop before, the last column when omitted")
+):
+    return await record_service.get_viewport(id, user, db, start, end, column_start, column_end)
+
+
+@dataset.get(
+    "/{id}/sample",
+    response_model=RecordSampleResponse,
+    status_code=status.HTTP_200_OK,
+    description="Fetch a random sample of records. bernoulli and system are fast approximate samples topped up to n when they come back short, reservoir is an exact uniform sample and stratified samples proportionally per value of a column"
+)
+async def sample_records(
+    id: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    n: int = Query(default=100, ge=1, le=10000, description="Number of records to sample"),
+    method: Literal["system", "bernoulli", "reservoir", "stratified"] = Query(default="bernoulli", description="Sampling method"),
+    column: str | None = Query(default=None, description="Column to stratify by"),
+    seed: int | None = Query(default=None, description="Seed for repeatable system/bernoulli samples"),
+    columns: str | None = Query(default=None, examples=["name,email"], description="Comma separated list of columns to return")
+):
+    return await record_service.sample_records(id, user, db, n, method, column, seed, columns)
+
+
+@dataset.get(
+    "/{id}/columns/{column}/values",
+    response_model=ColumnValuesResponse,
+    status_code=status.HTTP_200_OK,
+    description="Fetch the most frequent distinct values of a column"
+)
+async def get_column_values(
+    id: str,
+    column: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    limit: int = Query(default=20, ge=1, le=1000, description="Number of distinct values to return"),
+    prefix: str | None = Query(default=None, description="Only return values starting with this prefix")
+):
+    return await record_service.get_column_values(id, column, user, db, limit, prefix)
+
+
+@dataset.post(
+    "/{id}/versions",
+    response_model=DatasetVersionResponse,
+    status_code=status.HTTP_201_CREATED,
+    description="Create a version of the dataset. No rows are copied, later changes keep their previous value"
+)
+async def create_dataset_version(
+    id: str,
+    version_data: CreateDatasetVersion,
+    db: dbDepSession,
+    user: ActiveCurrentUser
+):
+    return await dataset_service.create_version(id, version_data.name, user, db)
+
+
+@dataset.get(
+    "/{id}/duplicates",
+    response_model=DuplicatesResponse,
+    status_code=status.HTTP_200_OK,
+    description="Find groups of records with equal values, on every column or the given ones"
+)
+async def find_duplicate_records(
+    id: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    columns: str | None = Query(default=None, examples=["name,email"], description="Comma separated list of columns to compare, all columns when omitted"),
+    limit: int = Query(default=100, ge=1, le=1000, description="Maximum number of groups to return")
+):
+    return await record_service.find_duplicates(id, user, db, columns, limit)
+
+
+@dataset.get(
+    "/{id}/versions",
+    response_model=DatasetVersionListResponse,
+    status_code=status.HTTP_200_OK,
+    description="List the versions of a dataset"
+)
+async def list_dataset_versions(
+    id: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser
+):
+    return await dataset_service.list_versions(id, user, db)
+
+
+@dataset.get(
+    "/{id}/versions/{version_number}/records",
+    response_model=DatasetVersionRecordsResponse,
+    status_code=status.HTTP_200_OK,
+    description="Fetch the records of a dataset as they were in a version, paginated"
+)
+async def get_dataset_version_records(
+    id: str,
+    version_number: int,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    page: int = Query(default=1, ge=1, examples=["2"], description="The current page to fetch"),
+    page_size: int = Query(default=10, ge=1, le=100, examples=["50"], description="Number of resource to fetch per page")
+):
+    return await dataset_service.get_version_records(id, version_number, user, db, page, page_size)
+
+
 @dataset.get(
     "/{id}",
     response_model=DatasetResponse,
@@ -128,6 +329,40 @@ async def get_dataset_by_id(
     return await dataset_service.get_dataset(id, user, db)
 
 
+@dataset.patch(
+    "/{id}/records",
+    response_model=UpdateByFilterResponse,
+    status_code=status.HTTP_200_OK,
+    description="Set columns on every record matching a filter. Large updates run as a background job, dry_run only counts the matches"
+)
+async def update_records_by_filter(
+    id: str,
+    update_data: UpdateByFilter,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    background_task: BackgroundTasks
+):
+    return await record_service.update_by_filter(
+        id, user, db, update_data.filter.model_dump(), update_data.data, background_task, update_data.dry_run
+    )
+
+
+@dataset.post(
+    "/{id}/records/replace",
+    response_model=FindReplaceResponse,
+    status_code=status.HTTP_200_OK,
+    description="Find and replace text in the string columns of every record. Large replaces run as a background job, preview only counts the matches and samples the changes"
+)
+async def find_replace_records(
+    id: str,
+    replace_data: FindReplace,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    background_task: BackgroundTasks
+):
+    return await record_service.find_replace(id, user, db, replace_data.model_dump(), background_task)
+
+
 @dataset.put(
     "/{id}/records/batch",
     response_model=RecordListResponse,
@@ -151,15 +386,105 @@ async def batch_update_records(
     "/records/{record_id}",
     response_model=RecordResponse,
     status_code=status.HTTP_200_OK,
+    description="Update record of a dataset. Prefer PUT /{id}/records/{record_id}, which skips the lookup of the record's dataset"
+)
+async def update_record_by_id(
+    record_id: str,
+    record_data: RecordUpdate,
+    db: dbDepSession,
+    user: ActiveCurrentUser
+):
+    return await record_service.update_record_by_id(record_id, record_data.model_dump(), db, user)
+
+@dataset.put(
+    "/{id}/records/{record_id}",
+    response_model=RecordResponse,
+    status_code=status.HTTP_200_OK,
     description="Update record of a dataset"
 )
 async def update_record(
+    id: str,
     record_id: str,
     record_data: RecordUpdate,
     db: dbDepSession,
     user: ActiveCurrentUser
 ):
-    return await record_service.update_record(record_id, record_data.model_dump(), db, user)
+    return await record_service.update_record(id, record_id, record_data.model_dump(), db, user)
+
+@dataset.put(
+    "/{id}/storage",
+    response_model=DatasetResponse,
+    status_code=status.HTTP_200_OK,
+    description="Move a dataset to another storage backend"
+)
+async def update_dataset_storage(
+    id: str,
+    storage_data: UpdateDatasetStorage,
+    db: dbDepSession,
+    user: ActiveCurrentUser
+):
+    return await dataset_service.change_storage(id, storage_data.storage, user, db)
+
+@dataset.put(
+    "/{id}/encoding",
+    response_model=DatasetEncodingResponse,
+    status_code=status.HTTP_200_OK,
+    description="Rewrite the rows of a dataset in another record encoding. Large datasets are rewritten by a background job, their records can not be read or written until it finishes"
+)
+async def update_dataset_encoding(
+    id: str,
+    encoding_data: UpdateDatasetEncoding,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    background_task: BackgroundTasks
+):
+    return await dataset_service.change_encoding(id, encoding_data.record_encoding, user, db, background_task)
+
+@dataset.post(
+    "/{id}/columns",
+    response_model=AlterDatasetColumnResponse,
+    status_code=status.HTTP_200_OK,
+    description="Add, rename, drop or retype a column. Rows are rewritten inside the database, as a background job for large datasets"
+)
+async def alter_dataset_column(
+    id: str,
+    column_data: AlterDatasetColumn,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    background_task: BackgroundTasks
+):
+    return await dataset_service.alter_column(id, column_data.model_dump(), user, db, background_task)
+
+
+@dataset.post(
+    "/{id}/clone",
+    response_model=DatasetResponse,
+    status_code=status.HTTP_201_CREATED,
+    description="Copy a dataset into a new one, optionally filtered, projected and sorted. Rows are copied inside the database in one statement"
+)
+async def clone_dataset(
+    id: str,
+    clone_data: CloneDataset,
+    db: dbDepSession,
+    user: ActiveCurrentUser
+):
+    return await dataset_service.clone_dataset(id, clone_data.model_dump(), user, db)
+
+
+@dataset.post(
+    "/{id}/join",
+    response_model=JoinDatasetsResponse,
+    status_code=status.HTTP_201_CREATED,
+    description="Join another of your datasets on key columns into a new dataset. Rows are joined inside the database, as a background job for large datasets"
+)
+async def join_datasets(
+    id: str,
+    join_data: JoinDatasets,
+    db: dbDepSession,
+    user: ActiveCurrentUser,
+    background_task: BackgroundTasks
+):
+    return await dataset_service.join_datasets(id, join_data.model_dump(), user, db, background_task)
 
 @dataset.put(
     "/{id}",
@@ -175,6 +500,37 @@ async def update_dataset(
 ):
     return await dataset_service.update_dataset(id, dataset_data.name, db, user)
 
+@dataset.delete(
+    "/{id}/records",
+    response_model=BulkDeleteResponse,
+    status_code=status.HTTP_200_OK,
+    description="Delete many records, either by id or every record matching a filter"
+)
+async def bulk_delete_records(
+    id: str,
+    delete_data: BulkDeleteRecords,
+    user: ActiveCurrentUser,
+    db: dbDepSession
+):
+    record_filter = delete_data.filter.model_dump() if delete_data.filter else None
+    return await record_service.bulk_delete_records(id, user, db, delete_data.ids, record_filter)
+
+
+@dataset.delete(
+    "/{id}/duplicates",
+    response_model=BulkDeleteResponse,
+    status_code=status.HTTP_200_OK,
+    description="Delete every record but the oldest of each group of records with equal values"
+)
+async def remove_duplicate_records(
+    id: str,
+    user: ActiveCurrentUser,
+    db: dbDepSession,
+    columns: str | None = Query(default=None, examples=["name,email"], description="Comma separated list of columns to compare, all columns when omitted")
+):
+    return await record_service.remove_duplicates(id, user, db, columns)
+
+
 @dataset.delete(
     "/{id}/records/{record_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -192,14 +548,15 @@ async def delete_record(
 @dataset.delete(
     "/{id}",
     status_code=status.HTTP_204_NO_CONTENT,
-    description="Delete dataset"
+    description="Delete dataset. It disappears immediately, its records are removed in the background"
 )
 async def delete_dataset(
     id: str,
     db: dbDepSession,
-    user: ActiveCurrentUser
+    user: ActiveCurrentUser,
+    background_task: BackgroundTasks
 ):
-    return await dataset_service.delete_dataset(user, id, db)
+    return await dataset_service.delete_dataset(user, id, db, background_task)
 
 
 
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, status
+
+from app.api.dependencies import dbDepSession, ActiveCurrentUser
+from app.service.job_service import job_service
+from app.schemas.job_schema import JobResponse
+
+
+jobs = APIRouter(
+    prefix="/jobs",
+    tags=["Job"]
+)
+
+@jobs.get(
+    "/{job_id}",
+    response_model=JobResponse,
+    status_code=status.HTTP_200_OK,
+    description="Fetch the status, progress and result of a background job"
+)
+async def get_job(
+    job_id: str,
+    db: dbDepSession,
+    user: ActiveCurrentUser
+):
+    return await job_service.get_job(job_id, user, db)
@@ -65,6 +65,35 @@ class RedisSettings(BaseSettings):
         return f"redis://{self.REDIS_HOST}:{self.REDIS_POST}"
     
     
+class CacheSettings(BaseSettings):
+    CACHE_TTL_SECONDS: int = 3600
+    
+    
+class DatasetSettings(BaseSettings):
+    # Uploads with at least this many columns store rows as positional arrays
+    POSITIONAL_ENCODING_MIN_COLUMNS: int = 20
+    # Rows removed per transaction when purging a deleted dataset
+    DATASET_PURGE_BATCH_SIZE: int = 5000
+    # Bulk record creation
+    BULK_INSERT_MAX_ROWS: int = 100000
+    BULK_INSERT_BATCH_SIZE: int = 5000
+    # Set-based writes touching more rows than this run as background jobs
+    BACKGROUND_JOB_ROW_THRESHOLD: int = 10000
+    BACKGROUND_JOB_BATCH_SIZE: int = 5000
+    # Largest block of rows one viewport request can read
+    VIEWPORT_MAX_ROWS: int = 1000
+    # Aggregate row_count changes in Redis and fold them into postgres periodically
+    ROW_COUNT_BUFFERING: bool = False
+    ROW_COUNT_FLUSH_SECONDS: int = 5
+    
+    
+class DiagnosticsSettings(BaseSettings):
+    # Requests sending this value in the X-Debug-Token header get timings and query plans
+    QUERY_DEBUG_TOKEN: SecretStr | None = None
+    SLOW_QUERY_THRESHOLD_MS: int = 500
+    SLOW_QUERY_SAMPLE_RATE: float = 0.1
+    
+    
 class DefaultRateLimitSettings(BaseSettings):
     DEFAULT_RATE_LIMIT_LIMIT: int = 10
     DEFAULT_RATE_LIMIT_PERIOD: int = 3600
@@ -116,6 +145,9 @@ class Settings(
     DatabaseSettings,
     CryptSettings,
     RedisSettings,
+    CacheSettings,
+    DatasetSettings,
+    DiagnosticsSettings,
     LoggerSettings,
     DefaultRateLimitSettings,
     EnvironmentSettings,
@@ -0,0 +1,81 @@
+from sqlalchemy.sql.expression import Executable, ClauseElement
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import contextmanager
+from typing import Any, Iterator
+import json
+import random
+import time
+import structlog
+
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+
+class Explain(Executable, ClauseElement):
+    inherit_cache = False
+    
+    def __init__(self, statement: Executable, analyze: bool = False, buffers: bool = False):
+        self.statement = statement
+        self.analyze = analyze
+        self.buffers = buffers
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    options = []
+    if element.analyze:
+        options.append("ANALYZE")
+    if element.buffers:
+        options.append("BUFFERS")
+    options.append("FORMAT JSON")
+    
+    return f"EXPLAIN ({', '.join(options)}) " + compiler.process(element.statement, **kw)
+
+
+async def explain(db: AsyncSession, statement: Executable, analyze: bool = False) -> Any:
+    result = await db.execute(Explain(statement, analyze=analyze, buffers=analyze))
+    plan = result.scalar()
+    return json.loads(plan) if isinstance(plan, str) else plan
+
+
+class QueryDiagnostics:
+    """Per-phase timings for a request, plus query plans when debugging"""
+    
+    def __init__(self, debug: bool = False):
+        self.debug = debug
+        self.timings: dict[str, float] = {}
+        self.plans: dict[str, Any] = {}
+        
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round((time.perf_counter() - start) * 1000, 3)
+    
+    async def capture_plan(self, db: AsyncSession, name: str, statement: Executable) -> None:
+        """EXPLAIN ANALYZE in debug mode, otherwise sample plans of slow statements into the log"""
+        if self.debug:
+            self.plans[name] = await explain(db, statement, analyze=True)
+            return
+        
+        elapsed = self.timings.get(name, 0)
+        if elapsed < settings.SLOW_QUERY_THRESHOLD_MS or random.random() >= settings.SLOW_QUERY_SAMPLE_RATE:
+            return
+        
+        try:
+            plan = await explain(db, statement)
+        except Exception as e:
+            logger.warning("Slow query plan capture failed", phase=name, error=str(e))
+            return
+        
+        logger.warning("Slow query", phase=name, elapsed_ms=elapsed, plan=plan)
+    
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "timings_ms": self.timings,
+            "plans": self.plans
+        }
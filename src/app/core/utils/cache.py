@@ -0,0 +1,28 @@
+from redis.exceptions import RedisError
+from typing import Any
+import json
+import structlog
+
+from app.core.redis import get_redis
+from app.core.config import settings
+
+logger = structlog.get_logger(__name__)
+
+
+async def get_cached_json(key: str) -> Any | None:
+    try:
+        redis = await get_redis()
+        cached = await redis.get(key)
+    except (RuntimeError, RedisError) as e:
+        logger.warning("Cache read failed", key=key, error=str(e))
+        return None
+    
+    return json.loads(cached) if cached else None
+
+
+async def set_cached_json(key: str, value: Any, ttl: int | None = None) -> None:
+    try:
+        redis = await get_redis()
+        await redis.set(key, json.dumps(value), ex=ttl or settings.CACHE_TTL_SECONDS)
+    except (RuntimeError, RedisError) as e:
+        logger.warning("Cache write failed", key=key, error=str(e))
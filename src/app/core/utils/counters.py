@@ -0,0 +1,89 @@
+from redis.exceptions import RedisError
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any
+import asyncio
+import structlog
+
+from app.core.redis import get_redis
+
+logger = structlog.get_logger(__name__)
+
+ROW_COUNT_DELTAS_KEY = "datasets:row_count:pending"
+# session.info key holding the deltas of the open transaction
+PENDING_DELTAS_INFO = "row_count_deltas"
+
+_flushes: set[asyncio.Task] = set()
+
+
+async def buffer_row_count(dataset_id: Any, delta: int) -> bool:
+    """Add a row count delta to the shared buffer, False if Redis is unavailable"""
+    try:
+        redis = await get_redis()
+        await redis.hincrby(ROW_COUNT_DELTAS_KEY, str(dataset_id), delta)
+    except (RuntimeError, RedisError) as e:
+        logger.warning("Row count buffering failed", dataset_id=str(dataset_id), error=str(e))
+        return False
+    
+    return True
+
+
+def queue_row_count(db: AsyncSession, dataset_id: Any, delta: int) -> None:
+    """Buffer a row count delta once the session commits, a rolled back write never counts"""
+    pending = db.info.setdefault(PENDING_DELTAS_INFO, {})
+    pending[str(dataset_id)] = pending.get(str(dataset_id), 0) + delta
+
+
+@event.listens_for(Session, "after_commit")
+def _flush_after_commit(session: Session) -> None:
+    pending = session.info.pop(PENDING_DELTAS_INFO, None)
+    if pending:
+        task = asyncio.get_running_loop().create_task(_flush_row_counts(pending))
+        _flushes.add(task)
+        task.add_done_callback(_flushes.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_after_rollback(session: Session) -> None:
+    session.info.pop(PENDING_DELTAS_INFO, None)
+
+
+async def _flush_row_counts(pending: dict[str, int]) -> None:
+    """Hand committed deltas to Redis, writing them straight to postgres if it is down"""
+    from app.core.db.database import async_session
+    from app.model.dataset import Dataset
+    
+    unbuffered = {
+        dataset_id: delta for dataset_id, delta in pending.items()
+        if delta and not await buffer_row_count(dataset_id, delta)
+    }
+    if not unbuffered:
+        return
+    
+    try:
+        async with async_session() as session:
+            await Dataset.apply_row_count_deltas(session, unbuffered)
+            await session.commit()
+    except Exception as e:
+        logger.error("Row count deltas lost", deltas=unbuffered, reason=str(e))
+
+
+async def take_row_count_deltas() -> dict[str, int]:
+    """Read and clear the buffered deltas in one transaction"""
+    redis = await get_redis()
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.hgetall(ROW_COUNT_DELTAS_KEY)
+        pipe.delete(ROW_COUNT_DELTAS_KEY)
+        pending, _ = await pipe.execute()
+    
+    return {dataset_id: int(delta) for dataset_id, delta in pending.items() if int(delta)}
+
+
+async def restore_row_count_deltas(deltas: dict[str, int]) -> None:
+    """Put deltas back after a failed fold so they are retried"""
+    redis = await get_redis()
+    async with redis.pipeline(transaction=True) as pipe:
+        for dataset_id, delta in deltas.items():
+            pipe.hincrby(ROW_COUNT_DELTAS_KEY, dataset_id, delta)
+        await pipe.execute()
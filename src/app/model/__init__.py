@@ -2,4 +2,7 @@ from app.model.user import User
 from app.model.refresh_token import RefreshToken
 from app.model.dataset import Dataset
 from app.model.records import Record
+from app.model.dataset_version import DatasetVersion, RecordVersion
+from app.model.dataset_change import DatasetChange
+from app.model.task import Task
 from app.core.db.database import Base
\ No newline at end of file
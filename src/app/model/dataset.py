@@ -1,10 +1,13 @@
 from __future__ import annotations
-from sqlalchemy import String, ForeignKey, DateTime, Integer
+from sqlalchemy import String, ForeignKey, DateTime, Integer, BigInteger, Boolean, select, update, func, values, column
+from sqlalchemy.orm.attributes import set_committed_value
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy.orm import Mapped, mapped_column, relationship, load_only
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from uuid import uuid4, UUID as UUID_PKG
-from typing import Any, TYPE_CHECKING
+from typing import Any, TYPE_CHECKING, Self, Sequence
+from datetime import datetime
 
 from app.model.basemodel import BaseModel
 
@@ -21,11 +24,190 @@ class Dataset(BaseModel):
     data_schema: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
     row_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
     column_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    column_stats: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True, deferred=True, default=None)
+    storage: Mapped[str] = mapped_column(String, nullable=False, server_default="jsonb", default="jsonb")
+    storage_options: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True, default=None)
+    # jsonb does not keep key order, so the file column order lives here and
+    # positional rows index into it
+    column_positions: Mapped[dict[str, int] | None] = mapped_column(JSONB, nullable=True, default=None)
+    record_encoding: Mapped[str] = mapped_column(String, nullable=False, server_default="object", default="object")
+    # derived column name -> expression, see app.repositories.expressions
+    derived_columns: Mapped[dict[str, str] | None] = mapped_column(JSONB, nullable=True, default=None)
+    # position the next appended record gets, see Record.position
+    next_position: Mapped[int] = mapped_column(BigInteger, nullable=False, server_default="0", default=0)
+    # encoding a background job is rewriting the rows to; they are mixed
+    # until it finishes, so row endpoints refuse the dataset meanwhile
+    encoding_target: Mapped[str | None] = mapped_column(String, nullable=True, default=None, init=False)
+    # number of the latest DatasetVersion, 0 while the dataset has none
+    current_version: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0", default=0)
+    # deleted datasets are hidden right away, their rows are purged in the background
+    is_deleted: Mapped[bool] = mapped_column(Boolean, nullable=False, server_default="false", default=False, init=False)
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True, default=None, init=False)
     
+    # Never loaded implicitly: a dataset can hold millions of records and is
+    # fetched on every record request. Rows are deleted by the FK cascade.
     records: Mapped[list["Record"]] = relationship(
-        "Record", back_populates="dataset", lazy="selectin", init=False, cascade="all, delete-orphan"
+        "Record", back_populates="dataset", lazy="raise", init=False, cascade="all, delete-orphan", passive_deletes=True
     )
     
     user: Mapped["User"] = relationship(
-        "User", back_populates="datasets", uselist=False, init=False
-    )
\ No newline at end of file
+        "User", back_populates="datasets", uselist=False, lazy="raise", init=False
+    )
+    
+    @classmethod
+    async def get_by_id(cls, id: str, db: AsyncSession) -> Self | None:
+        result = await db.execute(select(cls).where(cls.id == id, cls.is_deleted.is_(False)))
+        return result.scalar_one_or_none()
+    
+    @classmethod
+    async def get_for_records(cls, id: str, db: AsyncSession) -> Self | None:
+        """The columns record endpoints read, anything else raises instead of loading"""
+        result = await db.execute(
+            select(cls)
+            .options(load_only(
+                cls.user_id, cls.data_schema, cls.row_count, cls.storage, cls.storage_options,
+                cls.column_positions, cls.record_encoding, cls.derived_columns, cls.next_position,
+                cls.current_version, cls.encoding_target, cls.updated_at,
+                raiseload=True
+            ))
+            .where(cls.id == id, cls.is_deleted.is_(False))
+        )
+        return result.scalar_one_or_none()
+    
+    @classmethod
+    async def get_profile(cls, id: str, db: AsyncSession) -> Any | None:
+        """Owner, row_count and column_stats in one narrow query"""
+        result = await db.execute(
+            select(cls.user_id, cls.row_count, cls.column_stats)
+            .where(cls.id == id, cls.is_deleted.is_(False))
+        )
+        return result.one_or_none()
+    
+    @classmethod
+    async def bulk_get_by_ids(cls, ids: list[str], db: AsyncSession) -> Sequence[Self]:
+        result = await db.execute(select(cls).where(cls.id.in_(ids), cls.is_deleted.is_(False)))
+        return result.scalars().all()
+    
+    @classmethod
+    async def get_deleted_ids(cls, db: AsyncSession) -> Sequence[UUID_PKG]:
+        result = await db.execute(select(cls.id).where(cls.is_deleted.is_(True)))
+        return result.scalars().all()
+    
+    async def apply_write(
+        self,
+        db: AsyncSession,
+        row_delta: int = 0,
+        column_stats: dict[str, Any] | None = None
+    ) -> None:
+        """Record a write to this dataset's rows in a single UPDATE ... RETURNING.
+
+        row_count is adjusted in place so concurrent writers never lose an
+        increment, and nothing is flushed or refreshed through the ORM.
+        """
+        changes: dict[str, Any] = {"updated_at": func.now()}
+        if row_delta:
+            changes["row_count"] = Dataset.row_count + row_delta
+        if column_stats is not None:
+            changes["column_stats"] = column_stats
+        
+        result = await db.execute(
+            update(Dataset)
+            .where(Dataset.id == self.id)
+            .values(**changes)
+            .returning(Dataset.row_count, Dataset.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.one()
+        
+        set_committed_value(self, "row_count", row.row_count)
+        set_committed_value(self, "updated_at", row.updated_at)
+        if column_stats is not None:
+            set_committed_value(self, "column_stats", column_stats)
+    
+    @classmethod
+    async def apply_row_count_deltas(cls, db: AsyncSession, deltas: dict[str, int]) -> None:
+        """Fold buffered row count deltas back in one statement"""
+        if not deltas:
+            return
+        
+        pending = values(
+            column("id", UUID(as_uuid=True)), column("delta", Integer), name="pending"
+        ).data([(UUID_PKG(dataset_id), delta) for dataset_id, delta in deltas.items()])
+        
+        await db.execute(
+            update(cls)
+            .where(cls.id == pending.c.id)
+            .values(row_count=cls.row_count + pending.c.delta)
+            .execution_options(synchronize_session=False)
+        )
+    
+    @classmethod
+    async def get_owner_id(cls, id: str, db: AsyncSession) -> UUID_PKG | None:
+        """Ownership check that reads a single column instead of the dataset row"""
+        result = await db.execute(select(cls.user_id).where(cls.id == id, cls.is_deleted.is_(False)))
+        return result.scalar_one_or_none()
+    
+    @property
+    def data_version(self) -> str:
+        """Changes whenever the dataset row is saved; buffered record writes skip the save"""
+        return str(int(self.updated_at.timestamp() * 1_000_000))
+    
+    @property
+    def ordered_columns(self) -> list[str]:
+        """Schema columns in file order, columns without a position last"""
+        positions = self.column_positions or {}
+        placed = sorted((col for col in self.data_schema if col in positions), key=positions.__getitem__)
+        return placed + [col for col in self.data_schema if col not in positions]
+    
+    async def reserve_positions(self, db: AsyncSession, count: int) -> int:
+        """Claim `count` positions at the end of the dataset, returning the first.
+
+        The dataset row stays locked until commit, so claiming 0 first pins
+        the start for an insert whose size is only known afterwards.
+        """
+        result = await db.execute(
+            update(Dataset)
+            .where(Dataset.id == self.id)
+            .values(next_position=Dataset.next_position + count)
+            .returning(Dataset.next_position)
+            .execution_options(synchronize_session=False)
+        )
+        next_position = result.scalar_one()
+        set_committed_value(self, "next_position", next_position)
+        return next_position - count
+    
+    async def claim_version(self, db: AsyncSession) -> int:
+        """Bump current_version in place and return the new number.
+
+        Concurrent snapshots each get their own number, and the row_count and
+        schema they record are read under the same row lock.
+        """
+        result = await db.execute(
+            update(Dataset)
+            .where(Dataset.id == self.id)
+            .values(current_version=Dataset.current_version + 1, updated_at=func.now())
+            .returning(Dataset.current_version, Dataset.row_count, Dataset.data_schema, Dataset.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        row = result.one()
+        for key in ("current_version", "row_count", "data_schema", "updated_at"):
+            set_committed_value(self, key, getattr(row, key))
+        return row.current_version
+    
+    async def load_column_stats(self, db: AsyncSession, for_update: bool = False) -> dict[str, Any] | None:
+        """column_stats is deferred so it is not pulled on every dataset load.
+
+        Writers that merge into the stats pass for_update so the dataset row
+        stays locked until commit and concurrent merges cannot overwrite
+        each other.
+        """
+        if not for_update:
+            await db.refresh(self, attribute_names=["column_stats"])
+            return self.column_stats
+        
+        result = await db.execute(
+            select(Dataset.column_stats).where(Dataset.id == self.id).with_for_update()
+        )
+        stats = result.scalar_one()
+        set_committed_value(self, "column_stats", stats)
+        return stats
\ No newline at end of file
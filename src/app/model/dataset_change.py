@@ -0,0 +1,93 @@
+from __future__ import annotations
+from sqlalchemy import BigInteger, String, ForeignKey, DateTime, Index, Identity, select, insert, and_, case, func, null
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from uuid import UUID as UUID_PKG
+from datetime import datetime
+from typing import Any, TYPE_CHECKING, Sequence
+
+from app.core.db.database import Base
+from app.model.records import Record, RecordCodec
+
+if TYPE_CHECKING:
+    from app.model.dataset import Dataset
+
+
+class DatasetChange(Base):
+    """Append-only log of record changes, one row per changed record.
+
+    `seq` only grows, so clients sync by asking for everything after the last
+    seq they saw. Writers log after saving the dataset row, whose row lock is
+    held until commit, so the entries of one dataset become visible in seq
+    order. A "reset" entry means the whole dataset changed and clients should
+    reload it.
+    """
+    __tablename__ = "dataset_changes"
+
+    INSERT = "insert"
+    UPDATE = "update"
+    DELETE = "delete"
+    RESET = "reset"
+
+    seq: Mapped[int] = mapped_column(BigInteger, Identity(), primary_key=True, init=False)
+    dataset_id: Mapped[UUID_PKG] = mapped_column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), nullable=False)
+    op: Mapped[str] = mapped_column(String, nullable=False)
+    record_id: Mapped[UUID_PKG | None] = mapped_column(UUID(as_uuid=True), nullable=True, default=None)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now(), init=False)
+
+    __table_args__ = (
+        Index("ix_dataset_changes_dataset_seq", "dataset_id", "seq"),
+    )
+
+    @classmethod
+    async def log(
+        cls,
+        db: AsyncSession,
+        dataset_id: Any,
+        op: str,
+        record_ids: Sequence[Any] = ()
+    ) -> None:
+        if op == cls.RESET:
+            payload = [{"dataset_id": dataset_id, "op": op, "record_id": None}]
+        else:
+            payload = [{"dataset_id": dataset_id, "op": op, "record_id": record_id} for record_id in record_ids]
+
+        if payload:
+            await db.execute(insert(cls), payload)
+
+    @classmethod
+    async def latest_seq(cls, db: AsyncSession, dataset_id: Any) -> int:
+        result = await db.execute(select(func.max(cls.seq)).where(cls.dataset_id == dataset_id))
+        return result.scalar() or 0
+
+    @classmethod
+    async def changes_since(
+        cls,
+        db: AsyncSession,
+        dataset: Dataset,
+        since: int = 0,
+        limit: int = 1000,
+        columns: list[str] | None = None
+    ) -> Sequence[Any]:
+        """Changes after `since` in seq order, with the current data of each record"""
+        codec = RecordCodec.for_dataset(dataset)
+
+        query = (
+            select(
+                cls.seq,
+                cls.op,
+                cls.record_id,
+                cls.created_at,
+                case((Record.id.is_(None), null()), else_=codec.as_object(columns)).label("data")
+            )
+            .select_from(cls)
+            .outerjoin(Record, and_(Record.dataset_id == dataset.id, Record.id == cls.record_id))
+            .where(cls.dataset_id == dataset.id, cls.seq > since)
+            .order_by(cls.seq.asc())
+            .limit(limit)
+        )
+
+        result = await db.execute(query)
+        return result.mappings().all()
@@ -0,0 +1,167 @@
+from __future__ import annotations
+from sqlalchemy import String, ForeignKey, Integer, DateTime, Index, UniqueConstraint, select, exists, func, literal, union_all, ColumnElement
+from sqlalchemy.dialects.postgresql import UUID, JSONB, insert
+from sqlalchemy.orm import Mapped, mapped_column
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from uuid import UUID as UUID_PKG
+from datetime import datetime
+from typing import Any, TYPE_CHECKING, Self, Sequence
+
+from app.model.basemodel import BaseModel
+from app.model.records import Record, RecordCodec
+
+if TYPE_CHECKING:
+    from app.model.dataset import Dataset
+
+
+class DatasetVersion(BaseModel):
+    """A named point in the history of a dataset.
+
+    Creating a version copies no rows: it only bumps `Dataset.current_version`.
+    Rows changed afterwards leave their before-image in `record_versions`,
+    and a version is read by overlaying those images on the current rows.
+    """
+    __tablename__ = "dataset_versions"
+
+    dataset_id: Mapped[UUID_PKG] = mapped_column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), nullable=False)
+    version_number: Mapped[int] = mapped_column(Integer, nullable=False)
+    name: Mapped[str | None] = mapped_column(String, nullable=True)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False, server_default="0")
+    data_schema: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "version_number", name="uq_dataset_versions_dataset_version"),
+    )
+
+    @classmethod
+    async def get_for_dataset(
+        cls,
+        dataset_id: str,
+        version_number: int,
+        db: AsyncSession
+    ) -> Self | None:
+        result = await db.execute(
+            select(cls).where(cls.dataset_id == dataset_id, cls.version_number == version_number)
+        )
+        return result.scalar_one_or_none()
+
+    @classmethod
+    async def list_for_dataset(cls, dataset_id: str, db: AsyncSession) -> Sequence[Self]:
+        result = await db.execute(
+            select(cls).where(cls.dataset_id == dataset_id).order_by(cls.version_number.desc())
+        )
+        return result.scalars().all()
+
+
+class RecordVersion(BaseModel):
+    """Before-image of a record, kept once per version it was changed after.
+
+    Images are always stored as keyed objects so old versions stay readable
+    whatever encoding the dataset is converted to later.
+    """
+    __tablename__ = "record_versions"
+
+    dataset_id: Mapped[UUID_PKG] = mapped_column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), nullable=False)
+    version_number: Mapped[int] = mapped_column(Integer, nullable=False)
+    record_id: Mapped[UUID_PKG] = mapped_column(UUID(as_uuid=True), nullable=False)
+    data: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
+    record_created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (
+        UniqueConstraint("dataset_id", "version_number", "record_id", name="uq_record_versions_version_record"),
+        Index("ix_record_versions_dataset_record", "dataset_id", "record_id", "version_number"),
+    )
+
+    @classmethod
+    async def capture(
+        cls,
+        db: AsyncSession,
+        dataset: Dataset,
+        condition: ColumnElement[bool]
+    ) -> None:
+        """Keep the current image of the rows matching `condition` before they change.
+
+        Only the first change after a version is captured, later ones hit the
+        unique constraint and are skipped.
+        """
+        if not dataset.current_version:
+            return
+
+        codec = RecordCodec.for_dataset(dataset)
+        source = select(
+            func.gen_random_uuid(),
+            literal(dataset.id, UUID(as_uuid=True)),
+            literal(dataset.current_version),
+            Record.id,
+            codec.as_object(),
+            Record.created_at,
+            func.now(),
+            func.now(),
+            literal(True)
+        ).where(Record.dataset_id == dataset.id, condition)
+
+        stmt = insert(cls).from_select(
+            ["id", "dataset_id", "version_number", "record_id", "data", "record_created_at", "created_at", "updated_at", "is_active"],
+            source
+        ).on_conflict_do_nothing(constraint="uq_record_versions_version_record")
+
+        await db.execute(stmt)
+
+    @classmethod
+    async def read_version(
+        cls,
+        db: AsyncSession,
+        dataset: Dataset,
+        version: DatasetVersion,
+        page: int = 1,
+        page_size: int = 100
+    ) -> Sequence[Any]:
+        """Rows of a dataset as they were when `version` was created, in id order.
+
+        A row's state at version V is its image from the earliest version >= V
+        it was changed after, or the current row if it has not changed since.
+        Rows created after the version are left out.
+        """
+        codec = RecordCodec.for_dataset(dataset)
+        cutoff = version.created_at
+
+        images = (
+            select(cls.record_id, cls.data, cls.record_created_at)
+            .where(cls.dataset_id == dataset.id, cls.version_number >= version.version_number)
+            .distinct(cls.record_id)
+            .order_by(cls.record_id, cls.version_number.asc())
+            .subquery()
+        )
+
+        changed = exists().where(
+            cls.dataset_id == dataset.id,
+            cls.record_id == Record.id,
+            cls.version_number >= version.version_number
+        )
+
+        rows = union_all(
+            select(
+                images.c.record_id.label("id"),
+                images.c.data.label("data"),
+                images.c.record_created_at.label("created_at")
+            ).where(images.c.record_created_at <= cutoff),
+            select(
+                Record.id.label("id"),
+                codec.as_object().label("data"),
+                Record.created_at.label("created_at")
+            ).where(Record.dataset_id == dataset.id, Record.created_at <= cutoff, ~changed)
+        ).subquery()
+
+        page = max(1, page)
+        page_size = min(max(1, page_size), 100)
+
+        query = (
+            select(rows)
+            .order_by(rows.c.id)
+            .limit(page_size)
+            .offset((page - 1) * page_size)
+        )
+
+        result = await db.execute(query)
+        return result.mappings().all()
@@ -1,35 +1,110 @@
 from __future__ import annotations
-from sqlalchemy import String, ForeignKey, insert, Index, select, and_, func
-from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, BigInteger, ForeignKey, insert, update, delete, Index, select, and_, or_, case, true, func, literal, literal_column, null, values, column, cast, Text, Numeric, ColumnElement, Float, Select, tablesample
+from sqlalchemy.dialects.postgresql import UUID, JSONB, ARRAY, aggregate_order_by, array
+from sqlalchemy.orm import Mapped, mapped_column, relationship, aliased
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from uuid import uuid4, UUID as UUID_PKG
-from typing import Any, TYPE_CHECKING, Self, Sequence
+from typing import Any, TYPE_CHECKING, Self, Sequence, AsyncIterator
+from datetime import datetime, timezone
 import math
+import json
 
 from app.model.basemodel import BaseModel
+from app.core.db.diagnostics import QueryDiagnostics
 
 if TYPE_CHECKING:
     from src.app.model.dataset import Dataset
 
 
+def as_text(value: Any) -> str | None:
+    """How a JSON value reads through ->>, for comparisons"""
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def build_jsonb_array(values: list[ColumnElement[Any]]) -> ColumnElement[Any]:
+    # jsonb_build_array has the same 100 argument limit
+    parts = [
+        func.jsonb_build_array(*values[i:i+100], type_=JSONB)
+        for i in range(0, len(values), 100)
+    ] or [func.jsonb_build_array(type_=JSONB)]
+    
+    expr = parts[0]
+    for part in parts[1:]:
+        expr = expr.op("||", return_type=JSONB)(part)
+    return expr
+
+
+def build_jsonb_object(items: list[tuple[str, ColumnElement[Any]]]) -> ColumnElement[Any]:
+    # jsonb_build_object is limited to 100 arguments, so build it in chunks
+    parts = []
+    for i in range(0, len(items), 50):
+        args: list[Any] = []
+        for key, value in items[i:i+50]:
+            args.extend([literal(key, Text), value])
+        parts.append(func.jsonb_build_object(*args, type_=JSONB))
+    
+    expr = parts[0]
+    for part in parts[1:]:
+        expr = expr.op("||", return_type=JSONB)(part)
+    return expr
+
+
+# JSON type of the values of each column type in `Dataset.data_schema`
+JSON_TYPES = {"string": "string", "integer": "number", "number": "number", "boolean": "boolean"}
+
+JSON_NULL = literal_column("'null'::jsonb", JSONB)
+JSON_EMPTY = literal_column("'{}'::jsonb", JSONB)
+
+NUMBER_PATTERN = r"^\s*-?[0-9]+(\.[0-9]+)?([eE][-+]?[0-9]+)?\s*$"
+TRUE_WORDS = ("true", "t", "yes", "y", "1")
+FALSE_WORDS = ("false", "f", "no", "n", "0")
+
+
+def convert_json_value(text: ColumnElement[Any], column_type: str) -> ColumnElement[Any]:
+    """A value read through ->> as jsonb of `column_type`, JSON null when it does not convert"""
+    if column_type in ("integer", "number"):
+        number = cast(text, Numeric)
+        if column_type == "integer":
+            number = func.round(number)
+        return case((text.regexp_match(NUMBER_PATTERN), func.to_jsonb(number)), else_=JSON_NULL)
+    
+    if column_type == "boolean":
+        word = func.lower(func.trim(text))
+        return case(
+            (word.in_(TRUE_WORDS), literal_column("'true'::jsonb", JSONB)),
+            (word.in_(FALSE_WORDS), literal_column("'false'::jsonb", JSONB)),
+            else_=JSON_NULL
+        )
+    
+    return case((text.is_(None), JSON_NULL), else_=func.to_jsonb(text))
+
+
 class Record(BaseModel):
     __tablename__ = "records"
     
-    dataset_id: Mapped[UUID_PKG] = mapped_column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), nullable=False, index=True)
-    data: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
+    dataset_id: Mapped[UUID_PKG] = mapped_column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="CASCADE"), primary_key=True, nullable=False)
+    data: Mapped[dict[str, Any] | list[Any]] = mapped_column(JSONB, nullable=False)
+    # row order within the dataset, from Dataset.next_position; deletes leave gaps
+    position: Mapped[int | None] = mapped_column(BigInteger, nullable=True, default=None)
     
     dataset: Mapped["Dataset"] = relationship(
-        "Dataset", back_populates="records", uselist=False, init=False
+        "Dataset", back_populates="records", uselist=False, lazy="raise", init=False
     )
     
+    # Hash partitioned on dataset_id (see migration e71d2c5a90b6). Every query
+    # should carry a dataset_id predicate so postgres prunes to one partition.
     __table_args__ = (
         Index(
             "idx_records_data_gin",
             "data",
             postgresql_using="gin"
         ),
+        Index("ix_records_id", "id"),
+        Index("ix_records_dataset_position", "dataset_id", "position"),
+        {"postgresql_partition_by": "HASH (dataset_id)"}
     )
     
     @classmethod
@@ -38,7 +113,8 @@ class Record(BaseModel):
         dataset_id: str,
         records: list[dict[str, Any]],
         db: AsyncSession,
-        batch_size: int = 100
+        batch_size: int = 1000,
+        first_position: int = 0
     ):
         total = len(records)
 
@@ -48,15 +124,443 @@ class Record(BaseModel):
             payload = [
                 {
                     "dataset_id": dataset_id,
-                    "data": row
+                    "data": row,
+                    "position": first_position + i + offset
                 }
-                for row in batch
+                for offset, row in enumerate(batch)
             ]
 
             stmt = insert(Record).values(payload)
             await db.execute(stmt)
     
     
+    @classmethod
+    async def copy_records(
+        cls,
+        dataset_id: UUID_PKG,
+        records: list[Any],
+        db: AsyncSession,
+        first_position: int = 0
+    ) -> list[UUID_PKG]:
+        """Load encoded rows with COPY, falling back to batched INSERTs.
+
+        COPY goes through the asyncpg connection of the session, so it is part
+        of the same transaction. Returns the ids of the new records.
+        """
+        ids = [uuid4() for _ in records]
+        positions = range(first_position, first_position + len(records))
+        now = datetime.now(timezone.utc)
+        
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        driver = raw.driver_connection
+        
+        if not hasattr(driver, "copy_records_to_table"):
+            await db.execute(insert(cls), [
+                {"id": id, "dataset_id": dataset_id, "data": data, "position": position}
+                for id, data, position in zip(ids, records, positions)
+            ])
+            return ids
+        
+        await driver.copy_records_to_table(
+            cls.__tablename__,
+            columns=["id", "dataset_id", "data", "position", "created_at", "updated_at", "is_active"],
+            records=[
+                (id, dataset_id, json.dumps(data), position, now, now, True)
+                for id, data, position in zip(ids, records, positions)
+            ]
+        )
+        return ids
+    
+    @classmethod
+    async def insert_from_select(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        rows: Select[Any],
+        order_by: list[ColumnElement[Any]] | None = None,
+        first_position: int = 0
+    ) -> int:
+        """Add the rows of a select, one stored `data` column, to a dataset with one INSERT ... SELECT.
+
+        Rows get positions from `first_position` on in `order_by` order. With
+        `order_by`, created_at is also spaced a microsecond apart in that
+        order, so the new rows read back in it.
+        """
+        rows = rows.add_columns(func.row_number().over(order_by=order_by).label("rn"))
+        source = rows.subquery("source")
+        
+        created_at: ColumnElement[Any] = func.now()
+        if order_by:
+            created_at = created_at + source.c.rn * literal_column("interval '1 microsecond'")
+        
+        stmt = insert(cls).from_select(
+            ["id", "dataset_id", "data", "position", "created_at", "updated_at", "is_active"],
+            select(
+                func.gen_random_uuid(),
+                literal(dataset_id, UUID(as_uuid=True)),
+                source.c.data,
+                source.c.rn + (first_position - 1),
+                created_at,
+                func.now(),
+                true()
+            )
+        )
+        result = await db.execute(stmt)
+        return result.rowcount
+    
+    @classmethod
+    def join_select(
+        cls,
+        left: tuple[UUID_PKG, RecordCodec],
+        right: tuple[UUID_PKG, RecordCodec],
+        keys: list[tuple[str, str]],
+        right_columns: dict[str, str],
+        target: RecordCodec,
+        how: str = "inner",
+        left_positions: tuple[int, int] | None = None
+    ) -> tuple[Select[Any], list[ColumnElement[Any]]]:
+        """Rows of two datasets joined on equal key values, as stored `data` of `target`,
+        with the order that keeps left rows in position order.
+
+        Keys compare as jsonb, so 1 and 1.0 match but "1" and 1 do not, and
+        null keys match nothing. `right_columns` maps output names to the
+        right hand columns kept; every left column is kept as is.
+        `left_positions` limits the left rows to a [start, end) range.
+        """
+        (left_id, left_codec), (right_id, right_codec) = left, right
+        l, r = aliased(cls, name="l"), aliased(cls, name="r")
+        
+        condition = [r.dataset_id == right_id]
+        for left_key, right_key in keys:
+            left_value = left_codec.json_value(left_key, l.data)
+            condition += [
+                left_value == right_codec.json_value(right_key, r.data),
+                func.jsonb_typeof(left_value) != "null"
+            ]
+        
+        right_values = [(name, right_codec.json_value(column, r.data)) for name, column in right_columns.items()]
+        if target.positional:
+            data = target.build({
+                **{col: left_codec.json_value(col, l.data) for col in target.columns if col not in right_columns},
+                **dict(right_values)
+            })
+        else:
+            data = left_codec.as_object(data=l.data)
+            if right_values:
+                data = data.op("||", return_type=JSONB)(build_jsonb_object(right_values))
+        
+        query = (
+            select(data.label("data"))
+            .select_from(l)
+            .join(r, and_(*condition), isouter=how == "left")
+            .where(l.dataset_id == left_id)
+        )
+        if left_positions is not None:
+            query = query.where(l.position >= left_positions[0], l.position < left_positions[1])
+        return query, [l.position, l.id, r.position]
+    
+    @classmethod
+    async def patch_records(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        patches: dict[str, dict[str, Any]],
+        codec: RecordCodec | None = None,
+        batch_size: int = 1000
+    ) -> list[dict[str, Any]]:
+        """Merge a patch into each record with one UPDATE ... FROM (VALUES) per chunk.
+
+        Returns the updated rows with `data` and the `previous_data` they
+        replaced, both as keyed objects. Ids not in the dataset are skipped.
+        """
+        codec = codec or RecordCodec()
+        updated: list[dict[str, Any]] = []
+        items = list(patches.items())
+        
+        for i in range(0, len(items), batch_size):
+            chunk = items[i:i+batch_size]
+            
+            patch_values = values(
+                column("id", UUID(as_uuid=True)), column("patch", JSONB), name="patches"
+            ).data([(UUID_PKG(id), codec.encode_patch(patch)) for id, patch in chunk])
+            
+            # the pre-update image, locked so it matches the row being replaced
+            previous = (
+                select(cls.id, cls.data)
+                .where(cls.dataset_id == dataset_id, cls.id.in_([id for id, _ in chunk]))
+                .with_for_update()
+                .subquery("previous")
+            )
+            
+            stmt = (
+                update(cls)
+                .where(
+                    cls.dataset_id == dataset_id,
+                    cls.id == patch_values.c.id,
+                    cls.id == previous.c.id
+                )
+                .values(data=codec.merge(patch_values.c.patch), updated_at=func.now())
+                .returning(
+                    cls.id,
+                    cls.dataset_id,
+                    codec.as_object().label("data"),
+                    codec.as_object(data=previous.c.data).label("previous_data"),
+                    cls.created_at,
+                    cls.updated_at
+                )
+                .execution_options(synchronize_session=False)
+            )
+            
+            result = await db.execute(stmt)
+            updated.extend(dict(row) for row in result.mappings().all())
+        
+        return updated
+    
+    @classmethod
+    async def delete_matching(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        condition: ColumnElement[bool],
+        codec: RecordCodec | None = None,
+        batch_size: int = 5000
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Delete the matching records in chunks, yielding each chunk's (id, data)"""
+        codec = codec or RecordCodec()
+        
+        while True:
+            chunk = (
+                select(cls.id)
+                .where(cls.dataset_id == dataset_id, condition)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            result = await db.execute(
+                delete(cls)
+                .where(cls.dataset_id == dataset_id, cls.id.in_(chunk))
+                .returning(cls.id, codec.as_object().label("data"))
+                .execution_options(synchronize_session=False)
+            )
+            rows = [dict(row) for row in result.mappings().all()]
+            if rows:
+                yield rows
+            
+            if len(rows) < batch_size:
+                break
+    
+    @classmethod
+    def duplicate_condition(cls, dataset_id: UUID_PKG, row_hash: ColumnElement[Any]) -> ColumnElement[bool]:
+        """Matches every row but the oldest of each group of equal hashes"""
+        ranked = (
+            select(
+                cls.id,
+                func.row_number().over(partition_by=row_hash, order_by=(cls.created_at, cls.id)).label("rn")
+            )
+            .where(cls.dataset_id == dataset_id)
+            .subquery("ranked")
+        )
+        return cls.id.in_(select(ranked.c.id).where(ranked.c.rn > 1).scalar_subquery())
+    
+    @classmethod
+    async def duplicate_groups(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        row_hash: ColumnElement[Any],
+        limit: int = 100,
+        ids_per_group: int = 100
+    ) -> tuple[int, int, Sequence[Any]]:
+        """(group count, surplus rows, largest groups) of rows sharing a hash.
+
+        Each group lists its ids oldest first, the first one being the row
+        that removing duplicates keeps.
+        """
+        groups = (
+            select(
+                row_hash.label("row_hash"),
+                func.count().label("count"),
+                func.array_agg(aggregate_order_by(cls.id, cls.created_at, cls.id)).label("ids")
+            )
+            .where(cls.dataset_id == dataset_id)
+            .group_by(row_hash)
+            .having(func.count() > 1)
+            .subquery("groups")
+        )
+        
+        totals = await db.execute(
+            select(func.count(), func.coalesce(func.sum(groups.c.count - 1), 0))
+        )
+        group_count, surplus = totals.one()
+        
+        result = await db.execute(
+            select(
+                groups.c.row_hash,
+                groups.c.count,
+                groups.c.ids[1:ids_per_group].label("ids")
+            )
+            .order_by(groups.c.count.desc(), groups.c.row_hash)
+            .limit(limit)
+        )
+        return group_count, int(surplus), result.mappings().all()
+    
+    @classmethod
+    async def rewrite_matching(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        condition: ColumnElement[bool],
+        data: ColumnElement[Any],
+        batch_size: int = 5000
+    ) -> int:
+        """Set `data` on up to `batch_size` matching records, returning how many changed.
+
+        The rewrite has to stop a record from matching, so calling this until
+        it returns less than `batch_size` converges.
+        """
+        chunk = (
+            select(cls.id)
+            .where(cls.dataset_id == dataset_id, condition)
+            .limit(batch_size)
+            .scalar_subquery()
+        )
+        result = await db.execute(
+            update(cls)
+            .where(cls.dataset_id == dataset_id, cls.id.in_(chunk))
+            .values(data=data, updated_at=cls.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
+    @classmethod
+    async def count_matching(cls, db: AsyncSession, dataset_id: UUID_PKG, condition: ColumnElement[bool]) -> int:
+        result = await db.execute(
+            select(func.count()).select_from(cls).where(cls.dataset_id == dataset_id, condition)
+        )
+        return result.scalar() or 0
+    
+    @classmethod
+    async def matching_ids(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        condition: ColumnElement[bool],
+        after: UUID_PKG | None = None,
+        limit: int = 5000
+    ) -> list[UUID_PKG]:
+        """Next chunk of matching ids in id order, for keyset-chunked writes"""
+        query = select(cls.id).where(cls.dataset_id == dataset_id, condition)
+        if after:
+            query = query.where(cls.id > after)
+        
+        result = await db.execute(query.order_by(cls.id).limit(limit))
+        return list(result.scalars().all())
+    
+    @classmethod
+    async def count_patch(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        patch: ColumnElement[Any]
+    ) -> tuple[int, int]:
+        """Rows with a non-empty computed patch, and the number of cells patched"""
+        patches = (
+            select(patch.label("patch"))
+            .where(cls.dataset_id == dataset_id)
+            .subquery()
+        )
+        cells = select(func.count()).select_from(func.jsonb_object_keys(patches.c.patch)).scalar_subquery()
+        result = await db.execute(
+            select(func.count(), func.coalesce(func.sum(cells), 0))
+            .where(patches.c.patch != JSON_EMPTY)
+        )
+        rows, cell_count = result.one()
+        return rows, int(cell_count)
+    
+    @classmethod
+    async def sample_patches(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        patch: ColumnElement[Any],
+        codec: RecordCodec,
+        columns: list[str],
+        limit: int = 20
+    ) -> list[dict[str, Any]]:
+        """First rows in id order with a non-empty computed patch, as before/after cells"""
+        computed = patch.label("patch")
+        result = await db.execute(
+            select(cls.id, computed, codec.as_object(columns).label("before"))
+            .where(cls.dataset_id == dataset_id, patch != JSON_EMPTY)
+            .order_by(cls.id)
+            .limit(limit)
+        )
+        
+        samples = []
+        for row in result.mappings().all():
+            after = codec.decode_patch(row["patch"])
+            for column in columns:
+                if column in after:
+                    samples.append({"id": row["id"], "column": column, "before": row["before"].get(column), "after": after[column]})
+        return samples
+    
+    @classmethod
+    async def update_matching(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        condition: ColumnElement[bool],
+        patch: dict[str, Any] | ColumnElement[Any],
+        codec: RecordCodec | None = None
+    ) -> list[dict[str, Any]]:
+        """Merge one patch into every matching record in a single UPDATE.
+
+        `patch` is either a partial row or a SQL expression computing an
+        encoded patch from each row. Returns the updated rows with `data` and
+        `previous_data`, as keyed objects.
+        """
+        codec = codec or RecordCodec()
+        if isinstance(patch, dict):
+            patch = literal(codec.encode_patch(patch), JSONB)
+        
+        previous = (
+            select(cls.id, cls.data)
+            .where(cls.dataset_id == dataset_id, condition)
+            .with_for_update()
+            .subquery("previous")
+        )
+        
+        stmt = (
+            update(cls)
+            .where(cls.dataset_id == dataset_id, cls.id == previous.c.id)
+            .values(data=codec.merge(patch), updated_at=func.now())
+            .returning(
+                cls.id,
+                codec.as_object().label("data"),
+                codec.as_object(data=previous.c.data).label("previous_data")
+            )
+            .execution_options(synchronize_session=False)
+        )
+        
+        result = await db.execute(stmt)
+        return [dict(row) for row in result.mappings().all()]
+    
+    @classmethod
+    async def get_in_dataset(
+        cls,
+        dataset_id: str,
+        id: str,
+        db: AsyncSession
+    ) -> Self | None:
+        result = await db.execute(select(cls).where(cls.dataset_id == dataset_id, cls.id == id))
+        return result.scalar_one_or_none()
+    
+    @classmethod
+    async def get_dataset_id(cls, id: str, db: AsyncSession) -> UUID_PKG | None:
+        """Dataset of a record known only by id; probes every partition's primary key index"""
+        result = await db.execute(select(cls.dataset_id).where(cls.id == id))
+        return result.scalar_one_or_none()
+    
     @classmethod
     async def get_all_by_dataset(
         cls,
@@ -67,6 +571,189 @@ class Record(BaseModel):
         return result.scalars().all()
     
     
+    @classmethod
+    def projection(
+        cls,
+        columns: list[str] | None = None,
+        codec: RecordCodec | None = None
+    ) -> list[ColumnElement[Any]]:
+        codec = codec or RecordCodec()
+        return [
+            cls.id,
+            cls.dataset_id,
+            codec.as_object(columns).label("data"),
+            cls.position,
+            cls.created_at,
+            cls.updated_at
+        ]
+    
+    @classmethod
+    async def stream_records(
+        cls,
+        db: AsyncSession,
+        dataset_id: str,
+        key: str | None = None,
+        value: str | None = None,
+        after: str | None = None,
+        columns: list[str] | None = None,
+        codec: RecordCodec | None = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Sequence[Any]]:
+        """Yield batches of rows in id order from a server-side cursor"""
+        codec = codec or RecordCodec()
+        conditions = [cls.dataset_id == dataset_id]
+        if key and value:
+            conditions.append(codec.value(key).ilike(f"%{value}%"))
+        if after:
+            conditions.append(cls.id > after)
+        
+        query = (
+            select(*cls.projection(columns, codec))
+            .where(and_(*conditions))
+            .order_by(cls.id.asc())
+            .execution_options(yield_per=batch_size)
+        )
+        
+        result = await db.stream(query)
+        async for partition in result.mappings().partitions():
+            yield partition
+    
+    @classmethod
+    async def sample_records(
+        cls,
+        db: AsyncSession,
+        dataset_id: str,
+        n: int,
+        method: str = "bernoulli",
+        row_count: int = 0,
+        column: str | None = None,
+        seed: int | None = None,
+        columns: list[str] | None = None,
+        codec: RecordCodec | None = None
+    ) -> Sequence[Any]:
+        codec = codec or RecordCodec()
+        
+        if method in ("system", "bernoulli"):
+            # TABLESAMPLE applies to the whole table, so the percentage is the
+            # share of this dataset we need, padded so the LIMIT is usually met
+            percentage = min(100.0, n / max(row_count, 1) * 100 * 1.5)
+            sampling = func.system(percentage) if method == "system" else func.bernoulli(percentage)
+            sampled = tablesample(
+                cls.__table__, sampling, name="sampled", seed=literal(seed) if seed is not None else None
+            )
+            
+            sample_ids = (
+                select(sampled.c.id)
+                .where(sampled.c.dataset_id == dataset_id)
+                .order_by(func.random())
+                .limit(n)
+            )
+        
+        elif method == "stratified":
+            stratum = codec.value(column)
+            ranked = (
+                select(
+                    cls.id,
+                    func.row_number().over(partition_by=stratum, order_by=func.random()).label("rn"),
+                    func.count().over(partition_by=stratum).label("stratum_size"),
+                    func.count().over().label("total")
+                )
+                .where(cls.dataset_id == dataset_id)
+                .subquery()
+            )
+            # proportional allocation, every stratum gets at least one row
+            allocation = func.ceil(ranked.c.stratum_size * literal(n, Float) / ranked.c.total)
+            sample_ids = (
+                select(ranked.c.id)
+                .where(ranked.c.rn <= allocation)
+                .order_by(ranked.c.rn)
+                .limit(n)
+            )
+        
+        else:
+            # exact uniform sample, postgres keeps only the top n in a bounded heap
+            sample_ids = (
+                select(cls.id)
+                .where(cls.dataset_id == dataset_id)
+                .order_by(func.random())
+                .limit(n)
+            )
+        
+        query = select(*cls.projection(columns, codec)).where(
+            cls.dataset_id == dataset_id,
+            cls.id.in_(sample_ids.scalar_subquery())
+        )
+        
+        result = await db.execute(query)
+        records = list(result.mappings().all())
+        
+        # TABLESAMPLE picks pages or rows by chance and can come back short,
+        # top up from the rest of the dataset so callers get n when it has n
+        missing = n - len(records)
+        if method in ("system", "bernoulli") and missing > 0:
+            shuffle = func.md5(cast(cls.id, String) + str(seed)) if seed is not None else func.random()
+            top_up_ids = (
+                select(cls.id)
+                .where(cls.dataset_id == dataset_id, cls.id.notin_([record["id"] for record in records]))
+                .order_by(shuffle)
+                .limit(missing)
+            )
+            result = await db.execute(
+                select(*cls.projection(columns, codec)).where(
+                    cls.dataset_id == dataset_id,
+                    cls.id.in_(top_up_ids.scalar_subquery())
+                )
+            )
+            records.extend(result.mappings().all())
+        
+        return records
+    
+    @classmethod
+    async def viewport(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        start: int,
+        end: int,
+        columns: list[str],
+        codec: RecordCodec
+    ) -> Sequence[Any]:
+        """Rows with a position in [start, end), values in `columns` order, seeking ix_records_dataset_position"""
+        query = (
+            select(
+                cls.id,
+                cls.position,
+                build_jsonb_array([codec.json_value(col) for col in columns]).label("values")
+            )
+            .where(cls.dataset_id == dataset_id, cls.position >= start, cls.position < end)
+            .order_by(cls.position)
+        )
+        result = await db.execute(query)
+        return result.mappings().all()
+    
+    @classmethod
+    async def distinct_values(
+        cls,
+        db: AsyncSession,
+        dataset_id: str,
+        column: str,
+        limit: int = 20,
+        prefix: str | None = None,
+        codec: RecordCodec | None = None
+    ) -> list[dict[str, Any]]:
+        codec = codec or RecordCodec()
+        value = codec.value(column)
+        count = func.count().label("count")
+        
+        query = select(value.label("value"), count).where(cls.dataset_id == dataset_id)
+        if prefix:
+            query = query.where(value.istartswith(prefix, autoescape=True))
+        
+        query = query.group_by(value).order_by(count.desc(), value.asc()).limit(limit)
+        
+        result = await db.execute(query)
+        return [dict(row) for row in result.mappings().all()]
+    
     @classmethod
     async def filter_records(
         cls,
@@ -77,35 +764,29 @@ class Record(BaseModel):
         page: int = 1,
         page_size: int = 100,
         sort_by: str | None = None,
-        sort_order: str = "asc"
+        sort_order: str = "asc",
+        columns: list[str] | None = None,
+        codec: RecordCodec | None = None,
+        diagnostics: QueryDiagnostics | None = None
     ) -> dict[str, Any]:
         
-        query = select(cls)
-        count_qeuery = select(func.count()).select_from(cls)
+        diagnostics = diagnostics or QueryDiagnostics()
+        codec = codec or RecordCodec()
+        
+        conditions = [cls.dataset_id == dataset_id]
+        if key and value:
+            conditions.append(codec.value(key).ilike(f"%{value}%"))
+        
+        query = select(*cls.projection(columns, codec)).where(and_(*conditions))
+        count_qeuery = select(func.count()).select_from(cls).where(and_(*conditions))
         
         page = max(1, page)
-        page_size = max(1, page_size)
+        page_size = min(max(1, page_size), 100)
         
         offset = ( page - 1) * page_size
         
-        if key and value:
-            and_condition = and_(
-                        cls.dataset_id == dataset_id,
-                        cls.data[key].astext.ilike(f"%{value}%")
-                    )
-            query = (
-                query
-                .where(
-                    and_condition
-                )     
-            )
-            
-            count_qeuery = count_qeuery.where(and_condition)
-        
         if sort_by:
-            sort_column = cls.data[sort_by].astext
-            print(sort_by)
-            print(sort_column)
+            sort_column = codec.value(sort_by)
             if sort_order.lower() == "desc":
                 query = query.order_by(sort_column.desc(), cls.id.desc())
             else:
@@ -119,11 +800,16 @@ class Record(BaseModel):
                 
         
         
-        count_result = await db.execute(count_qeuery)
-        count = count_result.scalar() or 0
+        with diagnostics.phase("count"):
+            count_result = await db.execute(count_qeuery)
+            count = count_result.scalar() or 0
         
-        result = await db.execute(query)
-        records = result.scalars().all()
+        with diagnostics.phase("page"):
+            result = await db.execute(query)
+            records = result.mappings().all()
+        
+        await diagnostics.capture_plan(db, "count", count_qeuery)
+        await diagnostics.capture_plan(db, "page", query)
         
         total_page = math.ceil(count / page_size)
         
@@ -135,6 +821,265 @@ class Record(BaseModel):
                 "total": count,
                 "total_page": total_page,
                 "has_next_page": total_page > page,
-                "has_prev_page": page < 1
+                "has_prev_page": page > 1
             }
-        }
\ No newline at end of file
+        }
+
+
+class RecordCodec:
+    """How the rows of a dataset are laid out in `records.data`.
+
+    "object" rows are documents keyed by column name. "positional" rows are
+    arrays ordered by `Dataset.column_positions`, so the column names are
+    stored once on the dataset instead of in every row. Queries go through
+    the codec for column access and rehydrate keys only for the columns a
+    request projects.
+    """
+    OBJECT = "object"
+    POSITIONAL = "positional"
+    ENCODINGS = (OBJECT, POSITIONAL)
+
+    def __init__(self, encoding: str = OBJECT, positions: dict[str, int] | None = None):
+        self.encoding = encoding
+        self.positions = positions or {}
+
+    @classmethod
+    def for_dataset(cls, dataset: "Dataset") -> RecordCodec:
+        return cls(dataset.record_encoding, dataset.column_positions)
+
+    @property
+    def positional(self) -> bool:
+        return self.encoding == self.POSITIONAL
+
+    @property
+    def columns(self) -> list[str]:
+        return sorted(self.positions, key=self.positions.__getitem__)
+
+    # -------- SQL -------- #
+    def json_value(self, column: str, data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        data = Record.data if data is None else data
+        if not self.positional:
+            return data[column]
+        if column not in self.positions:
+            return null()
+        return data[self.positions[column]]
+
+    def value(self, column: str, data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        data = Record.data if data is None else data
+        if self.positional and column not in self.positions:
+            return null().cast(Text)
+        return self.json_value(column, data).astext
+
+    def row_hash(self, columns: list[str] | None = None, data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        """md5 of the projected values, so rows group by content whatever their encoding.
+
+        Every column is read through `json_value`, so a missing key, a short
+        positional row and an explicit null all hash the same.
+        """
+        data = Record.data if data is None else data
+        values = build_jsonb_object([(col, self.json_value(col, data)) for col in columns or self.columns])
+        return func.md5(cast(values, Text))
+
+    def as_object(
+        self,
+        columns: list[str] | None = None,
+        data: ColumnElement[Any] | None = None
+    ) -> ColumnElement[Any]:
+        """Build the projected `data` document inside postgres"""
+        data = Record.data if data is None else data
+        
+        if self.positional:
+            return build_jsonb_object([(col, self.json_value(col, data)) for col in columns or self.columns])
+        
+        if not columns:
+            return data
+        
+        if self.positions:
+            removed = [col for col in self.positions if col not in columns]
+            if len(removed) < len(columns):
+                if not removed:
+                    return data
+                return data.op("-", return_type=JSONB)(literal(removed, ARRAY(Text)))
+        
+        return build_jsonb_object([(col, data[col]) for col in columns])
+
+    def build(self, values: dict[str, ColumnElement[Any]]) -> ColumnElement[Any]:
+        """Build a stored row from per-column SQL expressions"""
+        if not self.positional:
+            return build_jsonb_object(list(values.items()))
+        
+        width = max(self.positions.values(), default=-1) + 1
+        slots: list[ColumnElement[Any]] = [null()] * width
+        for column, expr in values.items():
+            slots[self.positions[column]] = expr
+        return build_jsonb_array(slots)
+
+    def merge(self, patch: ColumnElement[Any], data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        """Apply a patch built by `encode_patch` to a stored row"""
+        data = Record.data if data is None else data
+        if not self.positional:
+            return data.op("||", return_type=JSONB)(patch)
+        
+        width = max(self.positions.values(), default=-1) + 1
+        elements = func.jsonb_array_elements(self.padded(width, data)).table_valued("value", with_ordinality="ordinality").render_derived()
+        position = cast(elements.c.ordinality - 1, Text)
+        merged = func.coalesce(patch.op("->", return_type=JSONB)(position), elements.c.value)
+        
+        return func.coalesce(
+            select(func.jsonb_agg(aggregate_order_by(merged, elements.c.ordinality), type_=JSONB)).scalar_subquery(),
+            literal([], JSONB)
+        )
+
+    def set_value(
+        self,
+        column: str,
+        value: ColumnElement[Any],
+        data: ColumnElement[Any] | None = None
+    ) -> ColumnElement[Any]:
+        """Stored row with one column set to a jsonb value"""
+        data = Record.data if data is None else data
+        if not self.positional:
+            return data.op("||", return_type=JSONB)(func.jsonb_build_object(literal(column, Text), value, type_=JSONB))
+        
+        position = self.positions[column]
+        return func.jsonb_set(self.padded(position + 1, data), literal([str(position)], ARRAY(Text)), value, type_=JSONB)
+
+    def padded(self, width: int, data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        """Positional row extended with nulls to `width`; rows written before a column was added are shorter"""
+        data = Record.data if data is None else data
+        missing = func.greatest(width - func.jsonb_array_length(data), 0)
+        return data.op("||", return_type=JSONB)(
+            func.to_jsonb(func.array_fill(cast(null(), Text), array([missing])), type_=JSONB)
+        )
+
+    def remove_value(self, column: str, data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        """Stored row without a column; positional rows keep the slot, nulled"""
+        data = Record.data if data is None else data
+        if not self.positional:
+            return data.op("-", return_type=JSONB)(literal(column, Text))
+        return self.set_value(column, JSON_NULL, data)
+
+    def rename_value(self, column: str, new_name: str, data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        """Stored row with a key renamed; positional rows are unchanged, their names live on the dataset"""
+        data = Record.data if data is None else data
+        if self.positional:
+            return data
+        
+        without = data.op("-", return_type=JSONB)(literal(column, Text))
+        return case(
+            (data.has_key(new_name), without),
+            else_=without.op("||", return_type=JSONB)(
+                func.jsonb_build_object(literal(new_name, Text), data[column], type_=JSONB)
+            )
+        )
+
+    def replace_patch(
+        self,
+        columns: list[str],
+        pattern: str,
+        replacement: str,
+        flags: str = "g",
+        data: ColumnElement[Any] | None = None
+    ) -> ColumnElement[Any]:
+        """Patch for `merge` with regexp_replace applied to the string values of `columns`.
+
+        Only cells that match are in the patch, so an empty patch means the
+        row has nothing to replace.
+        """
+        data = Record.data if data is None else data
+        if self.positional:
+            cells = func.jsonb_array_elements(data).table_valued(
+                column("value", JSONB), with_ordinality="ordinality"
+            ).render_derived()
+            key = cast(cells.c.ordinality - 1, Text)
+            keys = [str(self.positions[col]) for col in columns if col in self.positions]
+        else:
+            cells = func.jsonb_each(data).table_valued(column("key", Text), column("value", JSONB)).render_derived()
+            key = cells.c.key
+            keys = columns
+
+        text = cells.c.value.op("#>>", return_type=Text)(literal([], ARRAY(Text)))
+        replaced = func.to_jsonb(func.regexp_replace(text, pattern, replacement, flags))
+        match_flags = "i" if "i" in flags else None
+
+        return func.coalesce(
+            select(func.jsonb_object_agg(key, replaced, type_=JSONB))
+            .where(
+                key.in_(keys),
+                func.jsonb_typeof(cells.c.value) == "string",
+                text.regexp_match(pattern, flags=match_flags)
+            )
+            .scalar_subquery(),
+            JSON_EMPTY
+        )
+
+    def numeric_value(self, column: str, data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        """Column value as numeric, NULL when it does not look like a number"""
+        value = self.value(column, data)
+        return case((value.regexp_match(NUMBER_PATTERN), cast(value, Numeric)), else_=null())
+
+    def condition(self, column: str, op: str, value: Any = None) -> ColumnElement[bool]:
+        text = self.value(column)
+        
+        if op == "is_null":
+            return or_(text.is_(None), func.trim(text) == "")
+        if op == "not_null":
+            return and_(text.is_not(None), func.trim(text) != "")
+        if op == "in":
+            return text.in_([as_text(item) for item in value or []])
+        if op == "contains":
+            return text.ilike(f"%{value}%")
+        if op == "starts_with":
+            return text.istartswith(as_text(value), autoescape=True)
+        if op in ("gt", "gte", "lt", "lte"):
+            number = self.numeric_value(column)
+            return {
+                "gt": number > value,
+                "gte": number >= value,
+                "lt": number < value,
+                "lte": number <= value
+            }[op]
+        if op == "ne":
+            return text.is_distinct_from(as_text(value))
+        return text == as_text(value)
+
+    def where(self, conditions: list[dict[str, Any]], match: str = "all") -> ColumnElement[bool]:
+        """Combine structured filter conditions ({column, op, value})"""
+        clauses = [self.condition(c["column"], c.get("op", "eq"), c.get("value")) for c in conditions]
+        if not clauses:
+            return true()
+        return or_(*clauses) if match == "any" else and_(*clauses)
+
+    # -------- Python -------- #
+    def encode(self, row: dict[str, Any]) -> dict[str, Any] | list[Any]:
+        if not self.positional:
+            return row
+        
+        slots: list[Any] = [None] * (max(self.positions.values(), default=-1) + 1)
+        for column, position in self.positions.items():
+            slots[position] = row.get(column)
+        return slots
+
+    def encode_patch(self, patch: dict[str, Any]) -> dict[str, Any]:
+        """Partial row for `merge`, keyed by position for positional rows"""
+        if not self.positional:
+            return patch
+        
+        return {str(self.positions[column]): value for column, value in patch.items()}
+
+    def decode_patch(self, patch: dict[str, Any]) -> dict[str, Any]:
+        """Partial row built by `encode_patch` or SQL, keyed by column again"""
+        if not self.positional:
+            return patch
+        
+        columns = {str(position): column for column, position in self.positions.items()}
+        return {columns[key]: value for key, value in patch.items() if key in columns}
+
+    def decode(self, data: dict[str, Any] | list[Any]) -> dict[str, Any]:
+        if not self.positional:
+            return data
+        
+        return {
+            column: data[position] if position < len(data) else None
+            for column, position in self.positions.items()
+        }
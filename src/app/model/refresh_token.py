@@ -30,7 +30,7 @@ class RefreshToken(BaseModel):
     last_used: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     
     user: Mapped["User"] = relationship(
-        back_populates="refresh_tokens", uselist=False, init=False
+        back_populates="refresh_tokens", uselist=False, lazy="raise", init=False
     )
     
     @classmethod
@@ -1,16 +1,48 @@
-from sqlalchemy import Column, String, select
+from sqlalchemy import Column, String, ForeignKey, select, func
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Mapped, mapped_column
 from sqlalchemy.dialects.postgresql import UUID
 from uuid import UUID as UUID_PKG
-from typing import Any
+from typing import Any, Self, Sequence
+from datetime import timedelta
 
 from app.model.basemodel import BaseModel
 
 class Task(BaseModel):
     __tablename__ = "tasks"
     
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    
+    # a job reports after every chunk, one silent for this long was lost in a restart
+    STALE_AFTER = timedelta(minutes=10)
+    
     job_id: Mapped[UUID_PKG] = mapped_column(UUID(as_uuid=True), nullable=False, unique=True)
     status: Mapped[str] = mapped_column(String, nullable=False)
-    result: Mapped[dict[str, Any]] = mapped_column(JSONB, nullable=False)
\ No newline at end of file
+    result: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True, default=None)
+    kind: Mapped[str] = mapped_column(String, nullable=False, server_default="job", default="job")
+    user_id: Mapped[UUID_PKG | None] = mapped_column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True, default=None)
+    dataset_id: Mapped[UUID_PKG | None] = mapped_column(UUID(as_uuid=True), ForeignKey("datasets.id", ondelete="SET NULL"), nullable=True, default=None)
+    progress: Mapped[dict[str, Any] | None] = mapped_column(JSONB, nullable=True, default=None)
+    
+    @classmethod
+    async def get_active_for_dataset(
+        cls,
+        db: AsyncSession,
+        dataset_id: UUID_PKG,
+        kinds: Sequence[str]
+    ) -> Self | None:
+        result = await db.execute(
+            select(cls)
+            .where(
+                cls.dataset_id == dataset_id,
+                cls.kind.in_(kinds),
+                cls.status.in_((cls.PENDING, cls.RUNNING)),
+                cls.updated_at > func.now() - cls.STALE_AFTER
+            )
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
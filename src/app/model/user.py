@@ -29,10 +29,11 @@ class User(BaseModel):
     otp_type: Mapped[OTPType | None] = mapped_column(PG_ENUM(OTPType, name="otp_type_enum"), nullable=True)
     otp_expiry: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     
+    # The user is loaded on every authenticated request, load these explicitly when needed
     refresh_tokens: Mapped[list["RefreshToken"]] = relationship(
-        back_populates="user", cascade="all, delete-orphan", lazy="selectin", init=False
+        back_populates="user", cascade="all, delete-orphan", lazy="raise", passive_deletes=True, init=False
     )
     
     datasets: Mapped[list["Dataset"]] = relationship(
-        "Dataset", back_populates="user", lazy="selectin", cascade="all, delete-orphan", init=False
+        "Dataset", back_populates="user", lazy="raise", cascade="all, delete-orphan", passive_deletes=True, init=False
     )
\ No newline at end of file
@@ -0,0 +1,433 @@
+from sqlalchemy import ColumnElement, Numeric, Text, Boolean, Integer, case, cast, func, literal, null, true, false, and_, or_, not_
+from typing import Any
+from functools import reduce
+from decimal import Decimal, ROUND_HALF_UP
+import numpy as np
+import pandas as pd
+import ast
+import math
+
+from app.model.records import RecordCodec, NUMBER_PATTERN, TRUE_WORDS, FALSE_WORDS, JSON_NULL, as_text
+
+
+class ExpressionError(Exception):
+    pass
+
+
+def number_value(value: float) -> int | float:
+    """A float as postgres numeric gives it back: integral values have no fraction"""
+    return int(value) if value.is_integer() else value
+
+
+def round_half_up(value: float, digits: int = 0) -> float:
+    """round() as postgres does it on numeric, on the shortest decimal form of the float"""
+    if not math.isfinite(value):
+        return value
+    exponent = Decimal(1).scaleb(-digits)
+    return float(Decimal(repr(value)).quantize(exponent, rounding=ROUND_HALF_UP))
+
+
+def number_text(value: Any) -> str | None:
+    """How a number reads as text in SQL, 3 and not 3.0"""
+    if value is None or isinstance(value, (str, bool)):
+        return as_text(value)
+    return as_text(number_value(float(value)))
+
+
+class Expression:
+    """A derived column expression, checked against a dataset schema.
+
+    Expressions use Python syntax restricted to arithmetic, comparisons,
+    and/or/not, `a if cond else b` and the functions in FUNCTIONS. Bare
+    names and col("Column Name") read columns. Values are coerced to what
+    each operation needs, and anything that does not convert is null, so
+    `price * qty` works on columns uploaded as text.
+
+    Every expression evaluates on pandas frames; those without pandas-only
+    functions also translate to SQL and run inside postgres.
+    """
+    MAX_LENGTH = 500
+
+    # name: (min args, max args, result kind, None when it is the common kind of the args)
+    FUNCTIONS: dict[str, tuple[int, int | None, str | None]] = {
+        "col": (1, 1, None),
+        "round": (1, 2, "number"),
+        "abs": (1, 1, "number"),
+        "lower": (1, 1, "string"),
+        "upper": (1, 1, "string"),
+        "trim": (1, 1, "string"),
+        "length": (1, 1, "number"),
+        "concat": (1, None, "string"),
+        "coalesce": (2, None, None),
+        "number": (1, 1, "number"),
+        "text": (1, 1, "string"),
+        "date": (1, 1, "string"),
+    }
+    PANDAS_ONLY = {"date"}
+
+    BINARY = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod)
+    COMPARE = (ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE)
+
+    # column types in `Dataset.data_schema` and the kind of value they hold
+    KINDS = {"integer": "number", "number": "number", "boolean": "boolean"}
+    SQL_TYPES = {"number": Numeric, "string": Text, "boolean": Boolean}
+    DTYPES = {"number": "Float64", "string": "string", "boolean": "boolean"}
+
+    def __init__(self, source: str, schema: dict[str, Any]):
+        if len(source) > self.MAX_LENGTH:
+            raise ExpressionError(f"Expression longer than {self.MAX_LENGTH} characters")
+
+        try:
+            self.tree = ast.parse(source.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ExpressionError(f"Invalid expression: {e.msg}")
+
+        self.source = source
+        self.schema = schema
+        self.columns: list[str] = []
+        self._kinds: dict[ast.AST, str] = {}
+        self.kind = self._check(self.tree.body)
+        self.translatable = not any(
+            isinstance(node, ast.Call) and node.func.id in self.PANDAS_ONLY
+            for node in ast.walk(self.tree)
+        )
+
+    @property
+    def column_type(self) -> str:
+        """Schema type of the values the expression produces"""
+        return "string" if self.kind == "null" else self.kind
+
+    # -------- Checking -------- #
+    def _column(self, name: str) -> str:
+        if name not in self.schema:
+            raise ExpressionError(f"Unknown column {name}")
+        if name not in self.columns:
+            self.columns.append(name)
+        return self.KINDS.get(self.schema[name], "string")
+
+    def _common(self, kinds: list[str]) -> str:
+        kinds = [kind for kind in kinds if kind != "null"]
+        if not kinds:
+            return "null"
+        return kinds[0] if len(set(kinds)) == 1 else "string"
+
+    def _check(self, node: ast.AST) -> str:
+        if isinstance(node, ast.Constant):
+            value = node.value
+            if value is None:
+                kind = "null"
+            elif isinstance(value, bool):
+                kind = "boolean"
+            elif isinstance(value, (int, float)):
+                kind = "number"
+            elif isinstance(value, str):
+                kind = "string"
+            else:
+                raise ExpressionError(f"Unsupported constant {value!r}")
+
+        elif isinstance(node, ast.Name):
+            kind = self._column(node.id)
+
+        elif isinstance(node, ast.BinOp) and isinstance(node.op, self.BINARY):
+            self._check(node.left)
+            self._check(node.right)
+            kind = "number"
+
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd, ast.Not)):
+            self._check(node.operand)
+            kind = "boolean" if isinstance(node.op, ast.Not) else "number"
+
+        elif isinstance(node, ast.BoolOp):
+            for value in node.values:
+                self._check(value)
+            kind = "boolean"
+
+        elif isinstance(node, ast.Compare):
+            if len(node.ops) != 1 or not isinstance(node.ops[0], self.COMPARE):
+                raise ExpressionError("Only single ==, !=, <, <=, > and >= comparisons are supported")
+            self._check(node.left)
+            self._check(node.comparators[0])
+            kind = "boolean"
+
+        elif isinstance(node, ast.IfExp):
+            self._check(node.test)
+            kind = self._common([self._check(node.body), self._check(node.orelse)])
+
+        elif isinstance(node, ast.Call):
+            kind = self._check_call(node)
+
+        else:
+            raise ExpressionError(f"Unsupported syntax: {type(node).__name__}")
+
+        self._kinds[node] = kind
+        return kind
+
+    def _check_call(self, node: ast.Call) -> str:
+        name = node.func.id if isinstance(node.func, ast.Name) else None
+        if name not in self.FUNCTIONS:
+            raise ExpressionError(f"Unknown function {ast.unparse(node.func)}")
+        if node.keywords:
+            raise ExpressionError(f"{name} takes no keyword arguments")
+
+        low, high, kind = self.FUNCTIONS[name]
+        if len(node.args) < low or (high is not None and len(node.args) > high):
+            raise ExpressionError(f"Wrong number of arguments for {name}")
+
+        if name == "col":
+            arg = node.args[0]
+            if not (isinstance(arg, ast.Constant) and isinstance(arg.value, str)):
+                raise ExpressionError("col takes a column name string")
+            return self._column(arg.value)
+
+        if name == "round" and len(node.args) == 2:
+            digits = node.args[1]
+            if not (isinstance(digits, ast.Constant) and type(digits.value) is int):
+                raise ExpressionError("round takes a constant number of digits")
+
+        kinds = [self._check(arg) for arg in node.args]
+        return kind or self._common(kinds)
+
+    def _column_name(self, node: ast.AST) -> str | None:
+        if isinstance(node, ast.Name):
+            return node.id
+        if isinstance(node, ast.Call) and node.func.id == "col":
+            return node.args[0].value
+        return None
+
+    def _compare_kind(self, left: ast.AST, right: ast.AST) -> str:
+        kinds = {self._kinds[left], self._kinds[right]}
+        if "number" in kinds:
+            return "number"
+        if "boolean" in kinds:
+            return "boolean"
+        return "string"
+
+    # -------- SQL -------- #
+    def to_sql(self, codec: RecordCodec, data: ColumnElement[Any] | None = None) -> ColumnElement[Any]:
+        """The expression as a jsonb value computed from a stored row"""
+        if not self.translatable:
+            raise ExpressionError("Expression uses functions that only run in pandas")
+
+        kind = self.column_type
+        value = self._sql_as(self.tree.body, kind, codec, data)
+        return func.coalesce(func.to_jsonb(value), JSON_NULL)
+
+    def _sql_convert(self, expr: ColumnElement[Any], current: str, kind: str) -> ColumnElement[Any]:
+        if current == kind:
+            return expr
+        if current == "null":
+            return cast(null(), self.SQL_TYPES[kind])
+        if kind == "string":
+            return cast(expr, Text)
+
+        text = expr if current == "string" else cast(expr, Text)
+        if kind == "number":
+            return case((text.regexp_match(NUMBER_PATTERN), cast(text, Numeric)), else_=null())
+
+        word = func.lower(func.trim(text))
+        return case((word.in_(TRUE_WORDS), true()), (word.in_(FALSE_WORDS), false()), else_=null())
+
+    def _sql_as(self, node: ast.AST, kind: str, codec: RecordCodec, data: ColumnElement[Any] | None) -> ColumnElement[Any]:
+        return self._sql_convert(self._sql(node, codec, data), self._kinds[node], kind)
+
+    def _sql(self, node: ast.AST, codec: RecordCodec, data: ColumnElement[Any] | None) -> ColumnElement[Any]:
+        kind = self._kinds[node]
+        column = self._column_name(node)
+
+        if column is not None:
+            return self._sql_convert(codec.value(column, data), "string", kind)
+
+        if isinstance(node, ast.Constant):
+            if node.value is None:
+                return null()
+            return literal(node.value, self.SQL_TYPES[kind])
+
+        if isinstance(node, ast.BinOp):
+            left = self._sql_as(node.left, "number", codec, data)
+            right = self._sql_as(node.right, "number", codec, data)
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left - right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+            if isinstance(node.op, ast.Div):
+                return left / func.nullif(right, 0)
+            return func.mod(left, func.nullif(right, 0))
+
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return not_(self._sql_as(node.operand, "boolean", codec, data))
+            operand = self._sql_as(node.operand, "number", codec, data)
+            return -operand if isinstance(node.op, ast.USub) else operand
+
+        if isinstance(node, ast.BoolOp):
+            values = [self._sql_as(value, "boolean", codec, data) for value in node.values]
+            return and_(*values) if isinstance(node.op, ast.And) else or_(*values)
+
+        if isinstance(node, ast.Compare):
+            right_node = node.comparators[0]
+            compare_kind = self._compare_kind(node.left, right_node)
+            left = self._sql_as(node.left, compare_kind, codec, data)
+            right = self._sql_as(right_node, compare_kind, codec, data)
+            return {
+                ast.Eq: lambda: left == right,
+                ast.NotEq: lambda: left != right,
+                ast.Lt: lambda: left < right,
+                ast.LtE: lambda: left <= right,
+                ast.Gt: lambda: left > right,
+                ast.GtE: lambda: left >= right,
+            }[type(node.ops[0])]()
+
+        if isinstance(node, ast.IfExp):
+            return case(
+                (self._sql_as(node.test, "boolean", codec, data), self._sql_as(node.body, kind, codec, data)),
+                else_=self._sql_as(node.orelse, kind, codec, data)
+            )
+
+        name = node.func.id
+        if name == "round":
+            digits = node.args[1].value if len(node.args) == 2 else 0
+            return func.round(self._sql_as(node.args[0], "number", codec, data), literal(digits, Integer))
+        if name == "abs":
+            return func.abs(self._sql_as(node.args[0], "number", codec, data))
+        if name in ("lower", "upper", "trim"):
+            return getattr(func, name)(self._sql_as(node.args[0], "string", codec, data))
+        if name == "length":
+            return cast(func.char_length(self._sql_as(node.args[0], "string", codec, data)), Numeric)
+        if name == "concat":
+            return func.concat(*[self._sql_as(arg, "string", codec, data) for arg in node.args])
+        if name == "coalesce":
+            return func.coalesce(*[self._sql_as(arg, kind, codec, data) for arg in node.args])
+        return self._sql_as(node.args[0], kind, codec, data)
+
+    # -------- pandas -------- #
+    def evaluate(self, frame: pd.DataFrame) -> list[Any]:
+        """Values for every row of a frame of keyed rows, as JSON-ready python values"""
+        kind = self.column_type
+        series = self._pd_as(self.tree.body, kind, frame).astype(object)
+        values = series.where(series.notna(), None).tolist()
+
+        if kind == "number":
+            return [None if value is None or not math.isfinite(value) else number_value(float(value)) for value in values]
+        if kind == "boolean":
+            return [None if value is None else bool(value) for value in values]
+        return values
+
+    def _pd_constant(self, value: Any, kind: str, frame: pd.DataFrame) -> pd.Series:
+        dtype = self.DTYPES.get(kind, object)
+        return pd.Series([value] * len(frame), index=frame.index, dtype=dtype)
+
+    def _pd_convert(self, series: pd.Series, current: str, kind: str) -> pd.Series:
+        if current == kind:
+            return series
+        if current == "null":
+            return pd.Series(pd.NA, index=series.index, dtype=self.DTYPES[kind])
+
+        if current == "string":
+            text = series
+        else:
+            raw = series.astype(object)
+            text = raw.map(number_text if current == "number" else as_text, na_action="ignore").astype("string")
+        if kind == "string":
+            return text
+
+        if kind == "number":
+            raw = text.astype(object)
+            valid = text.str.fullmatch(NUMBER_PATTERN.strip("^$")).fillna(False).astype(bool)
+            return pd.to_numeric(raw.where(valid, None), errors="coerce").astype("Float64")
+
+        word = text.str.strip().str.lower()
+        result = pd.Series(pd.NA, index=series.index, dtype="boolean")
+        result[word.isin(TRUE_WORDS).fillna(False).astype(bool)] = True
+        result[word.isin(FALSE_WORDS).fillna(False).astype(bool)] = False
+        return result
+
+    def _pd_as(self, node: ast.AST, kind: str, frame: pd.DataFrame) -> pd.Series:
+        return self._pd_convert(self._pd(node, frame), self._kinds[node], kind)
+
+    def _pd(self, node: ast.AST, frame: pd.DataFrame) -> pd.Series:
+        kind = self._kinds[node]
+        column = self._column_name(node)
+
+        if column is not None:
+            raw = frame[column].astype(object) if column in frame.columns else pd.Series([None] * len(frame), index=frame.index, dtype=object)
+            text = raw.map(as_text, na_action="ignore").astype("string")
+            return self._pd_convert(text, "string", kind)
+
+        if isinstance(node, ast.Constant):
+            return self._pd_constant(node.value, kind, frame)
+
+        if isinstance(node, ast.BinOp):
+            left = self._pd_as(node.left, "number", frame)
+            right = self._pd_as(node.right, "number", frame)
+            if isinstance(node.op, ast.Add):
+                return left + right
+            if isinstance(node.op, ast.Sub):
+                return left - right
+            if isinstance(node.op, ast.Mult):
+                return left * right
+            divisor = right.where(right != 0)
+            if isinstance(node.op, ast.Div):
+                return left / divisor
+            # sign of the dividend, like postgres mod()
+            return np.fmod(left, divisor)
+
+        if isinstance(node, ast.UnaryOp):
+            if isinstance(node.op, ast.Not):
+                return ~self._pd_as(node.operand, "boolean", frame)
+            operand = self._pd_as(node.operand, "number", frame)
+            return -operand if isinstance(node.op, ast.USub) else operand
+
+        if isinstance(node, ast.BoolOp):
+            values = [self._pd_as(value, "boolean", frame) for value in node.values]
+            if isinstance(node.op, ast.And):
+                return reduce(lambda a, b: a & b, values)
+            return reduce(lambda a, b: a | b, values)
+
+        if isinstance(node, ast.Compare):
+            right_node = node.comparators[0]
+            compare_kind = self._compare_kind(node.left, right_node)
+            left = self._pd_as(node.left, compare_kind, frame)
+            right = self._pd_as(right_node, compare_kind, frame)
+            result = {
+                ast.Eq: lambda: left == right,
+                ast.NotEq: lambda: left != right,
+                ast.Lt: lambda: left < right,
+                ast.LtE: lambda: left <= right,
+                ast.Gt: lambda: left > right,
+                ast.GtE: lambda: left >= right,
+            }[type(node.ops[0])]()
+            return result.astype("boolean")
+
+        if isinstance(node, ast.IfExp):
+            test = self._pd_as(node.test, "boolean", frame).fillna(False).astype(bool)
+            body = self._pd_as(node.body, kind, frame)
+            orelse = self._pd_as(node.orelse, kind, frame)
+            return body.where(test, orelse)
+
+        name = node.func.id
+        if name == "round":
+            digits = node.args[1].value if len(node.args) == 2 else 0
+            # postgres rounds halves away from zero, pandas to even
+            values = self._pd_as(node.args[0], "number", frame).astype(object)
+            return values.map(lambda value: round_half_up(value, digits), na_action="ignore").astype("Float64")
+        if name == "abs":
+            return self._pd_as(node.args[0], "number", frame).abs()
+        if name in ("lower", "upper"):
+            return getattr(self._pd_as(node.args[0], "string", frame).str, name)()
+        if name == "trim":
+            return self._pd_as(node.args[0], "string", frame).str.strip()
+        if name == "length":
+            return self._pd_as(node.args[0], "string", frame).str.len().astype("Float64")
+        if name == "concat":
+            parts = [self._pd_as(arg, "string", frame).fillna("") for arg in node.args]
+            return reduce(lambda a, b: a + b, parts)
+        if name == "coalesce":
+            values = [self._pd_as(arg, kind, frame) for arg in node.args]
+            return reduce(lambda a, b: a.where(a.notna(), b), values)
+        if name == "date":
+            text = self._pd_as(node.args[0], "string", frame).astype(object)
+            dates = pd.to_datetime(text.where(text.notna(), None), errors="coerce", format="mixed")
+            return dates.dt.strftime("%Y-%m-%d").astype("string")
+        return self._pd_as(node.args[0], kind, frame)
@@ -0,0 +1,229 @@
+import pandas as pd
+import numpy as np
+from typing import Any
+import base64
+import math
+
+
+class ProfileRepository:
+    """Per-column statistics kept on `Dataset.column_stats`.
+
+    Profiles are built with vectorized pandas operations at ingest and then
+    merged incrementally by the record write paths. Distinct counts use a
+    HyperLogLog sketch so they never need a rescan; min/max and the distinct
+    estimate are upper bounds once rows have been deleted.
+    """
+    HLL_PRECISION = 8
+    HLL_REGISTERS = 1 << HLL_PRECISION
+    TOP_K_TRACKED = 50
+    TOP_K_RETURNED = 10
+    # deltas up to this many rows are profiled in plain python, a DataFrame
+    # costs more than the rows themselves for single-record writes
+    SMALL_DELTA_ROWS = 64
+
+    # -------- HyperLogLog -------- #
+    def _empty_registers(self) -> np.ndarray:
+        return np.zeros(self.HLL_REGISTERS, dtype=np.uint8)
+
+    def _encode_registers(self, registers: np.ndarray) -> str:
+        return base64.b64encode(registers.tobytes()).decode("ascii")
+
+    def _decode_registers(self, encoded: str | None) -> np.ndarray:
+        if not encoded:
+            return self._empty_registers()
+        return np.frombuffer(base64.b64decode(encoded), dtype=np.uint8).copy()
+
+    def _hll_registers(self, values: np.ndarray) -> np.ndarray:
+        registers = self._empty_registers()
+        if len(values) == 0:
+            return registers
+
+        hashes = pd.util.hash_array(values)
+        suffix_bits = 64 - self.HLL_PRECISION
+
+        index = (hashes >> np.uint64(suffix_bits)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << suffix_bits) - 1)
+
+        # rank = position of the leftmost 1-bit in the remaining bits
+        _, exponent = np.frexp(remainder.astype(np.float64))
+        rank = np.where(remainder == 0, suffix_bits + 1, suffix_bits - exponent + 1).astype(np.uint8)
+
+        np.maximum.at(registers, index, rank)
+        return registers
+
+    def _hll_estimate(self, registers: np.ndarray) -> int:
+        m = self.HLL_REGISTERS
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / float(np.sum(np.power(2.0, -registers.astype(np.float64))))
+
+        zeros = int(np.count_nonzero(registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return round(m * math.log(m / zeros))
+
+        return round(raw)
+
+    # -------- Profiling -------- #
+    def _profile_column(self, series: pd.Series) -> dict[str, Any]:
+        values = series.astype(object)
+        null_mask = values.isna() | (values.astype(str).str.strip() == "")
+
+        present = values[~null_mask].astype(str)
+        present_array = present.to_numpy(dtype=object)
+
+        numeric = pd.to_numeric(present, errors="coerce").dropna()
+        numeric = numeric[np.isfinite(numeric)]
+
+        top = present.value_counts().head(self.TOP_K_TRACKED)
+
+        return {
+            "count": int(len(present)),
+            "null_count": int(null_mask.sum()),
+            "min": present.min() if len(present) else None,
+            "max": present.max() if len(present) else None,
+            "numeric_count": int(len(numeric)),
+            "numeric_sum": float(numeric.sum()) if len(numeric) else 0.0,
+            "numeric_min": float(numeric.min()) if len(numeric) else None,
+            "numeric_max": float(numeric.max()) if len(numeric) else None,
+            "top": {str(k): int(v) for k, v in top.items()},
+            "hll": self._encode_registers(self._hll_registers(present_array))
+        }
+
+    def _profile_values(self, values: list[Any]) -> dict[str, Any]:
+        """_profile_column for a handful of values, without pandas"""
+        present: list[str] = []
+        numeric: list[float] = []
+        for value in values:
+            if value is None or (isinstance(value, float) and math.isnan(value)) or str(value).strip() == "":
+                continue
+            text = str(value)
+            present.append(text)
+            try:
+                number = float(text)
+            except ValueError:
+                continue
+            if math.isfinite(number):
+                numeric.append(number)
+        
+        top: dict[str, int] = {}
+        for text in present:
+            top[text] = top.get(text, 0) + 1
+        
+        return {
+            "count": len(present),
+            "null_count": len(values) - len(present),
+            "min": min(present) if present else None,
+            "max": max(present) if present else None,
+            "numeric_count": len(numeric),
+            "numeric_sum": float(sum(numeric)),
+            "numeric_min": min(numeric) if numeric else None,
+            "numeric_max": max(numeric) if numeric else None,
+            "top": top,
+            "hll": self._encode_registers(self._hll_registers(np.array(present, dtype=object)))
+        }
+
+    def build_profile(self, df: pd.DataFrame) -> dict[str, Any]:
+        return {str(col): self._profile_column(df[col]) for col in df.columns}
+
+    def empty_column(self) -> dict[str, Any]:
+        return self._profile_column(pd.Series([], dtype=object))
+
+    def constant_column(self, value: Any, count: int) -> dict[str, Any]:
+        """Profile of a column holding the same value in `count` rows"""
+        if not count:
+            return self.empty_column()
+
+        stats = self._profile_column(pd.Series([value], dtype=object))
+        for key in ("count", "null_count", "numeric_count"):
+            stats[key] *= count
+        stats["numeric_sum"] *= count
+        stats["top"] = {k: v * count for k, v in stats["top"].items()}
+        return stats
+
+    def _merge_bound(self, current: Any, incoming: Any, pick) -> Any:
+        if current is None:
+            return incoming
+        if incoming is None:
+            return current
+        return pick(current, incoming)
+
+    def _merge_column(self, current: dict[str, Any], delta: dict[str, Any], sign: int) -> dict[str, Any]:
+        merged = dict(current)
+
+        for key in ("count", "null_count", "numeric_count"):
+            merged[key] = max(0, current.get(key, 0) + sign * delta[key])
+        merged["numeric_sum"] = current.get("numeric_sum", 0.0) + sign * delta["numeric_sum"]
+
+        top = dict(current.get("top", {}))
+        for value, count in delta["top"].items():
+            if value in top:
+                top[value] += sign * count
+            elif sign > 0 and len(top) < self.TOP_K_TRACKED:
+                top[value] = count
+        merged["top"] = {k: v for k, v in top.items() if v > 0}
+
+        if sign > 0:
+            for key, pick in (("min", min), ("max", max), ("numeric_min", min), ("numeric_max", max)):
+                merged[key] = self._merge_bound(current.get(key), delta[key], pick)
+
+            registers = np.maximum(
+                self._decode_registers(current.get("hll")),
+                self._decode_registers(delta["hll"])
+            )
+            merged["hll"] = self._encode_registers(registers)
+
+        return merged
+
+    def apply_rows(
+        self,
+        profile: dict[str, Any] | None,
+        rows: list[dict[str, Any]],
+        sign: int = 1
+    ) -> dict[str, Any] | None:
+        """Merge inserted (sign=1) or removed (sign=-1) rows into a profile"""
+        if profile is None or not rows:
+            return profile
+
+        updated = dict(profile)
+        
+        if len(rows) <= self.SMALL_DELTA_ROWS:
+            for col, stats in profile.items():
+                delta = self._profile_values([row.get(col) for row in rows])
+                updated[col] = self._merge_column(stats, delta, sign)
+            return updated
+        
+        # object columns keep 1 as "1" next to nulls, as the small path does
+        df = pd.DataFrame(rows, dtype=object)
+
+        for col, stats in profile.items():
+            series = df[col] if col in df.columns else pd.Series([None] * len(df), dtype=object)
+            updated[col] = self._merge_column(stats, self._profile_column(series), sign)
+
+        return updated
+
+    def render(self, profile: dict[str, Any]) -> dict[str, Any]:
+        columns = {}
+        for col, stats in profile.items():
+            total = stats["count"] + stats["null_count"]
+            top = sorted(stats["top"].items(), key=lambda item: item[1], reverse=True)
+
+            columns[col] = {
+                "count": stats["count"],
+                "null_count": stats["null_count"],
+                "null_ratio": round(stats["null_count"] / total, 6) if total else 0.0,
+                "distinct_count": min(
+                    self._hll_estimate(self._decode_registers(stats.get("hll"))), stats["count"]
+                ),
+                "min": stats["min"],
+                "max": stats["max"],
+                "numeric_count": stats["numeric_count"],
+                "numeric_min": stats["numeric_min"],
+                "numeric_max": stats["numeric_max"],
+                "mean": stats["numeric_sum"] / stats["numeric_count"] if stats["numeric_count"] else None,
+                "top_values": [
+                    {"value": value, "count": count} for value, count in top[:self.TOP_K_RETURNED]
+                ]
+            }
+        return columns
+
+
+profile_repository = ProfileRepository()
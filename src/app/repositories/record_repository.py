@@ -1,4 +1,5 @@
-from typing import Any
+from typing import Any, AsyncIterator, Collection
+import json
 
 
 class RecordRepository:
@@ -8,12 +9,17 @@ class RecordRepository:
         self,
         payload: dict[str, Any],
         dataset_schema: dict[str, Any],
-        allow_partial: bool = False  # for updates
+        allow_partial: bool = False,  # for updates
+        read_only: Collection[str] = ()  # derived columns
     ) -> tuple[bool, str | None]:
         
         payload_keys = set(payload.keys())
-        print(payload)
-        schema_keys = set(dataset_schema.keys())
+        schema_keys = set(dataset_schema.keys()) - set(read_only)
+        
+        # -------- Derived fields -------- #
+        computed = payload_keys & set(read_only)
+        if computed:
+            return False, f"Derived fields can not be written: {list(computed)}"
 
         # -------- Missing fields -------- #
         if not allow_partial:
@@ -26,7 +32,109 @@ class RecordRepository:
         if extra:
             return False, f"Unknown fields: {list(extra)}"
         
+        # -------- Types -------- #
+        mistyped = [key for key, value in payload.items() if not self.matches_type(value, dataset_schema[key])]
+        if mistyped:
+            return False, f"Values do not match the column type: {mistyped}"
+        
         return True, None
+    
+    def matches_type(self, value: Any, column_type: str) -> bool:
+        """Whether a JSON value fits a column; string columns take any value, like uploads"""
+        if value is None or column_type not in ("integer", "number", "boolean"):
+            return True
+        if column_type == "boolean":
+            return isinstance(value, bool)
+        if isinstance(value, bool):
+            return False
+        if column_type == "integer":
+            return isinstance(value, int) or (isinstance(value, float) and value.is_integer())
+        return isinstance(value, (int, float))
+    
+    def resolve_columns(
+        self,
+        columns: str | None,
+        dataset_schema: dict[str, Any]
+    ) -> tuple[list[str] | None, str | None]:
+        """Parse a comma separated column list and check it against the schema"""
+        if not columns:
+            return None, None
+        
+        requested = list(dict.fromkeys(col.strip() for col in columns.split(",") if col.strip()))
+        if not requested:
+            return None, None
+        
+        unknown = [col for col in requested if col not in dataset_schema]
+        if unknown:
+            return None, f"Unknown columns: {unknown}"
+        
+        return requested, None
+    
+    def validate_filter(
+        self,
+        conditions: list[dict[str, Any]],
+        dataset_schema: dict[str, Any]
+    ) -> str | None:
+        unknown = [c["column"] for c in conditions if c["column"] not in dataset_schema]
+        if unknown:
+            return f"Unknown columns: {unknown}"
+        return None
+    
+    def validate_bulk_item(
+        self,
+        item: Any,
+        dataset_schema: dict[str, Any],
+        read_only: Collection[str] = ()
+    ) -> tuple[dict[str, Any] | None, str | None]:
+        """Check one bulk item, shaped like a single record create body"""
+        if not isinstance(item, dict) or not isinstance(item.get("data"), dict):
+            return None, "Expected an object with a data object"
+        
+        is_valid, reason = self.validate_record_payload(item["data"], dataset_schema, read_only=read_only)
+        if not is_valid:
+            return None, reason
+        
+        return item["data"], None
+    
+    async def iter_bulk_items(
+        self,
+        chunks: AsyncIterator[bytes],
+        content_type: str
+    ) -> AsyncIterator[tuple[int, Any, str | None]]:
+        """Yield (index, item, parse error) from a JSON array or an NDJSON stream.
+
+        NDJSON is parsed line by line as it arrives so large bodies are never
+        held in memory; a JSON array has to be read whole.
+        """
+        if content_type.split(";")[0].strip() in ("application/x-ndjson", "application/ndjson"):
+            index = 0
+            buffer = b""
+            async for chunk in chunks:
+                buffer += chunk
+                *lines, buffer = buffer.split(b"\n")
+                for line in lines:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield index, json.loads(line), None
+                    except ValueError:
+                        yield index, None, "Invalid JSON"
+                    index += 1
+            
+            if buffer.strip():
+                try:
+                    yield index, json.loads(buffer), None
+                except ValueError:
+                    yield index, None, "Invalid JSON"
+            return
+        
+        body = b"".join([chunk async for chunk in chunks])
+        items = json.loads(body)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array of records")
+        
+        for index, item in enumerate(items):
+            yield index, item, None
 
 
 
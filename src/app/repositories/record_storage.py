@@ -0,0 +1,454 @@
+from sqlalchemy import Table, Column, MetaData, Text, Numeric, BigInteger, Boolean, DateTime, ColumnElement, select, insert, delete, func, literal, case, cast, null, true, false
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, AsyncIterator, Sequence
+from uuid import uuid4
+import math
+import pandas as pd
+
+from app.model.dataset import Dataset
+from app.model.records import Record, RecordCodec, NUMBER_PATTERN, TRUE_WORDS, FALSE_WORDS
+from app.core.db.diagnostics import QueryDiagnostics
+
+
+class StorageError(Exception):
+    pass
+
+
+class RecordStorage:
+    """Where the rows of a dataset live.
+
+    Services read, filter and export through this interface so a dataset
+    can be kept either as JSONB documents in `records` or as a typed table.
+    """
+    name: str
+
+    async def create(self, db: AsyncSession, dataset: Dataset) -> None:
+        pass
+
+    async def insert_rows(self, db: AsyncSession, dataset: Dataset, rows: list[dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    async def page(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        key: str | None = None,
+        value: str | None = None,
+        page: int = 1,
+        page_size: int = 100,
+        sort_by: str | None = None,
+        sort_order: str = "asc",
+        columns: list[str] | None = None,
+        diagnostics: QueryDiagnostics | None = None
+    ) -> dict[str, Any]:
+        raise NotImplementedError
+
+    def stream(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        key: str | None = None,
+        value: str | None = None,
+        after: str | None = None,
+        columns: list[str] | None = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Sequence[Any]]:
+        raise NotImplementedError
+
+    async def distinct_values(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        column: str,
+        limit: int = 20,
+        prefix: str | None = None
+    ) -> list[dict[str, Any]]:
+        raise NotImplementedError
+
+    async def export_frame(self, db: AsyncSession, dataset: Dataset) -> pd.DataFrame:
+        raise NotImplementedError
+
+    async def drop(self, db: AsyncSession, dataset: Dataset) -> None:
+        pass
+
+
+class JsonbRecordStorage(RecordStorage):
+    name = "jsonb"
+
+    async def insert_rows(self, db: AsyncSession, dataset: Dataset, rows: list[dict[str, Any]]) -> None:
+        codec = RecordCodec.for_dataset(dataset)
+        first_position = await dataset.reserve_positions(db, len(rows))
+        await Record.bulk_insert_records(
+            db=db, dataset_id=str(dataset.id), records=[codec.encode(row) for row in rows], first_position=first_position
+        )
+
+    async def page(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        key: str | None = None,
+        value: str | None = None,
+        page: int = 1,
+        page_size: int = 100,
+        sort_by: str | None = None,
+        sort_order: str = "asc",
+        columns: list[str] | None = None,
+        diagnostics: QueryDiagnostics | None = None
+    ) -> dict[str, Any]:
+        records = await Record.filter_records(
+            db=db,
+            dataset_id=str(dataset.id),
+            key=key,
+            value=value,
+            page=page,
+            page_size=page_size,
+            sort_by=sort_by,
+            sort_order=sort_order,
+            columns=columns,
+            codec=RecordCodec.for_dataset(dataset),
+            diagnostics=diagnostics
+        )
+        records["records"] = [dict(record) for record in records["records"]]
+        return records
+
+    async def stream(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        key: str | None = None,
+        value: str | None = None,
+        after: str | None = None,
+        columns: list[str] | None = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Sequence[Any]]:
+        async for batch in Record.stream_records(
+            db=db,
+            dataset_id=str(dataset.id),
+            key=key,
+            value=value,
+            after=after,
+            columns=columns,
+            codec=RecordCodec.for_dataset(dataset),
+            batch_size=batch_size
+        ):
+            yield batch
+
+    async def distinct_values(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        column: str,
+        limit: int = 20,
+        prefix: str | None = None
+    ) -> list[dict[str, Any]]:
+        return await Record.distinct_values(
+            db, str(dataset.id), column, limit, prefix, codec=RecordCodec.for_dataset(dataset)
+        )
+
+    async def export_frame(self, db: AsyncSession, dataset: Dataset) -> pd.DataFrame:
+        codec = RecordCodec.for_dataset(dataset)
+        records = await Record.get_all_by_dataset(str(dataset.id), db)
+        return pd.DataFrame(
+            [codec.decode(record.data) for record in records], columns=codec.columns or None
+        )
+
+
+class ColumnarRecordStorage(RecordStorage):
+    """One typed table per dataset, named after the dataset id.
+
+    Column names are user supplied, so physical columns are named c0..cN and
+    the mapping is kept in `Dataset.storage_options`. Rows are read-mostly:
+    the per-row write endpoints only work on jsonb datasets.
+    """
+    name = "columnar"
+
+    TYPE_MAP = {
+        "string": Text,
+        "number": Numeric,
+        "integer": BigInteger,
+        "boolean": Boolean
+    }
+
+    def _column_map(self, dataset: Dataset) -> dict[str, str]:
+        return dataset.storage_options["columns"]
+
+    def _table(self, dataset: Dataset) -> Table:
+        column_map = self._column_map(dataset)
+
+        return Table(
+            dataset.storage_options["table"],
+            MetaData(),
+            Column("id", UUID(as_uuid=True), primary_key=True),
+            Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+            Column("updated_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+            *[
+                Column(physical, self.TYPE_MAP.get(dataset.data_schema.get(name), Text), nullable=True)
+                for name, physical in column_map.items()
+            ]
+        )
+
+    def _text(self, table: Table, dataset: Dataset, name: str) -> ColumnElement[Any]:
+        """A typed column read as text, the way data->>name reads it on jsonb"""
+        physical = table.c[self._column_map(dataset)[name]]
+        return physical if isinstance(physical.type, Text) else cast(physical, Text)
+
+    def _rows(self, dataset: Dataset, rows: Sequence[Any], columns: list[str]) -> list[dict[str, Any]]:
+        column_map = self._column_map(dataset)
+        return [
+            {
+                "id": row["id"],
+                "dataset_id": dataset.id,
+                "data": {name: row[column_map[name]] for name in columns},
+                "created_at": row["created_at"],
+                "updated_at": row["updated_at"]
+            }
+            for row in rows
+        ]
+
+    def _select(self, table: Table, dataset: Dataset, columns: list[str]):
+        column_map = self._column_map(dataset)
+        return select(
+            table.c.id,
+            table.c.created_at,
+            table.c.updated_at,
+            *[table.c[column_map[name]] for name in columns]
+        )
+
+    async def create(self, db: AsyncSession, dataset: Dataset) -> None:
+        dataset.storage_options = {
+            "table": f"dataset_{dataset.id.hex}",
+            "columns": {
+                name: f"c{i}"
+                for i, name in enumerate(RecordCodec.for_dataset(dataset).columns or dataset.data_schema.keys())
+            }
+        }
+
+        table = self._table(dataset)
+        conn = await db.connection()
+        await conn.run_sync(table.create)
+
+    async def insert_rows(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        rows: list[dict[str, Any]],
+        batch_size: int = 1000
+    ) -> None:
+        table = self._table(dataset)
+        column_map = self._column_map(dataset)
+
+        for i in range(0, len(rows), batch_size):
+            payload = [
+                {
+                    "id": uuid4(),
+                    **{physical: row.get(name) for name, physical in column_map.items()}
+                }
+                for row in rows[i:i+batch_size]
+            ]
+            await db.execute(insert(table), payload)
+
+    async def page(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        key: str | None = None,
+        value: str | None = None,
+        page: int = 1,
+        page_size: int = 100,
+        sort_by: str | None = None,
+        sort_order: str = "asc",
+        columns: list[str] | None = None,
+        diagnostics: QueryDiagnostics | None = None
+    ) -> dict[str, Any]:
+        diagnostics = diagnostics or QueryDiagnostics()
+        table = self._table(dataset)
+        column_map = self._column_map(dataset)
+        columns = columns or list(column_map.keys())
+
+        page = max(1, page)
+        page_size = min(max(1, page_size), 100)
+
+        query = self._select(table, dataset, columns)
+        count_query = select(func.count()).select_from(table)
+
+        if key and value and key in column_map:
+            condition = self._text(table, dataset, key).ilike(f"%{value}%")
+            query = query.where(condition)
+            count_query = count_query.where(condition)
+
+        if sort_by and sort_by in column_map:
+            sort_column = table.c[column_map[sort_by]]
+            if sort_order.lower() == "desc":
+                query = query.order_by(sort_column.desc(), table.c.id.desc())
+            else:
+                query = query.order_by(sort_column.asc(), table.c.id.asc())
+        else:
+            query = query.order_by(table.c.created_at.desc(), table.c.id.desc())
+
+        query = query.limit(page_size).offset((page - 1) * page_size)
+
+        with diagnostics.phase("count"):
+            count = (await db.execute(count_query)).scalar() or 0
+
+        with diagnostics.phase("page"):
+            rows = (await db.execute(query)).mappings().all()
+
+        await diagnostics.capture_plan(db, "count", count_query)
+        await diagnostics.capture_plan(db, "page", query)
+
+        total_page = math.ceil(count / page_size)
+
+        return {
+            "records": self._rows(dataset, rows, columns),
+            "meta": {
+                "page": page,
+                "page_size": page_size,
+                "total": count,
+                "total_page": total_page,
+                "has_next_page": total_page > page,
+                "has_prev_page": page > 1
+            }
+        }
+
+    async def stream(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        key: str | None = None,
+        value: str | None = None,
+        after: str | None = None,
+        columns: list[str] | None = None,
+        batch_size: int = 1000
+    ) -> AsyncIterator[Sequence[Any]]:
+        table = self._table(dataset)
+        column_map = self._column_map(dataset)
+        columns = columns or list(column_map.keys())
+
+        conditions = []
+        if key and value and key in column_map:
+            conditions.append(self._text(table, dataset, key).ilike(f"%{value}%"))
+        if after:
+            conditions.append(table.c.id > after)
+
+        query = (
+            self._select(table, dataset, columns)
+            .where(*conditions)
+            .order_by(table.c.id.asc())
+            .execution_options(yield_per=batch_size)
+        )
+
+        result = await db.stream(query)
+        async for partition in result.mappings().partitions():
+            yield self._rows(dataset, partition, columns)
+
+    async def distinct_values(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        column: str,
+        limit: int = 20,
+        prefix: str | None = None
+    ) -> list[dict[str, Any]]:
+        table = self._table(dataset)
+        value = table.c[self._column_map(dataset)[column]]
+        count = func.count().label("count")
+
+        query = select(value.label("value"), count)
+        if prefix:
+            query = query.where(self._text(table, dataset, column).istartswith(prefix, autoescape=True))
+
+        query = query.group_by(value).order_by(count.desc(), value.asc()).limit(limit)
+
+        result = await db.execute(query)
+        return [dict(row) for row in result.mappings().all()]
+
+    async def export_frame(self, db: AsyncSession, dataset: Dataset) -> pd.DataFrame:
+        table = self._table(dataset)
+        column_map = self._column_map(dataset)
+
+        result = await db.execute(
+            select(*[table.c[physical].label(name) for name, physical in column_map.items()])
+        )
+        return pd.DataFrame(result.all(), columns=list(column_map.keys()))
+
+    async def drop(self, db: AsyncSession, dataset: Dataset) -> None:
+        table = self._table(dataset)
+        conn = await db.connection()
+        await conn.run_sync(lambda sync_conn: table.drop(sync_conn, checkfirst=True))
+
+    def _typed_value(self, text: ColumnElement[Any], column_type: str | None) -> ColumnElement[Any]:
+        """A value read through ->> cast to its column type, NULL when it does not convert"""
+        if column_type in ("integer", "number"):
+            number = cast(text, Numeric)
+            if column_type == "integer":
+                number = cast(func.round(number), BigInteger)
+            return case((text.regexp_match(NUMBER_PATTERN), number), else_=null())
+
+        if column_type == "boolean":
+            word = func.lower(func.trim(text))
+            return case((word.in_(TRUE_WORDS), true()), (word.in_(FALSE_WORDS), false()), else_=null())
+
+        return text
+
+    async def load_from_records(self, db: AsyncSession, dataset: Dataset) -> None:
+        """Copy the jsonb rows of a dataset into its typed table and remove them"""
+        table = self._table(dataset)
+        column_map = self._column_map(dataset)
+        codec = RecordCodec.for_dataset(dataset)
+
+        source = select(
+            Record.id,
+            Record.created_at,
+            Record.updated_at,
+            *[self._typed_value(codec.value(name), dataset.data_schema.get(name)) for name in column_map]
+        ).where(Record.dataset_id == dataset.id)
+
+        await db.execute(
+            insert(table).from_select(["id", "created_at", "updated_at", *column_map.values()], source)
+        )
+        await db.execute(delete(Record).where(Record.dataset_id == dataset.id))
+
+    async def unload_to_records(self, db: AsyncSession, dataset: Dataset) -> None:
+        """Copy the typed table back into jsonb rows"""
+        table = self._table(dataset)
+        column_map = self._column_map(dataset)
+
+        codec = RecordCodec.for_dataset(dataset)
+        data = codec.build({name: table.c[physical] for name, physical in column_map.items()})
+
+        # the typed table keeps no positions, rows are numbered in created order again
+        first_position = await dataset.reserve_positions(db, 0)
+        position = func.row_number().over(order_by=(table.c.created_at, table.c.id)) + (first_position - 1)
+
+        source = select(
+            table.c.id,
+            literal(dataset.id, UUID(as_uuid=True)),
+            data,
+            position,
+            table.c.created_at,
+            table.c.updated_at,
+            literal(True)
+        )
+
+        result = await db.execute(
+            insert(Record).from_select(
+                ["id", "dataset_id", "data", "position", "created_at", "updated_at", "is_active"], source
+            )
+        )
+        await dataset.reserve_positions(db, result.rowcount)
+
+
+_STORAGES: dict[str, RecordStorage] = {
+    JsonbRecordStorage.name: JsonbRecordStorage(),
+    ColumnarRecordStorage.name: ColumnarRecordStorage()
+}
+
+STORAGE_TYPES = tuple(_STORAGES.keys())
+
+
+def get_record_storage(storage: str) -> RecordStorage:
+    try:
+        return _STORAGES[storage]
+    except KeyError:
+        raise StorageError(f"Unknown storage backend: {storage}")
@@ -1,9 +1,11 @@
-from pydantic import BaseModel, Field
-from typing import Annotated, Any
+from pydantic import BaseModel, Field, model_validator
+from typing import Annotated, Any, Literal
 from uuid import UUID
 from datetime import datetime
 
 from app.schemas.base_response import BaseResponse, BasePaginatedResponseSchema
+from app.schemas.job_schema import JobSchema
+from app.schemas.record_schema import RecordFilter
 
 
     
@@ -15,6 +17,11 @@ class DatasetResponseSchema(BaseModel):
     data_schema: Annotated[dict[str, Any], Field(description="The Columns of the dataset")]
     row_count: Annotated[int, Field(description="Number of rows in dataset", examples=["1000"])]
     column_count: Annotated[int, Field(description="Number of columns in dataset", examples=["10"])]
+    storage: Annotated[str, Field(description="Storage backend holding the rows", examples=["jsonb", "columnar"])]
+    record_encoding: Annotated[str, Field(description="Layout of each stored row", examples=["object", "positional"])]
+    derived_columns: Annotated[dict[str, str] | None, Field(description="Expressions of the derived columns, by column name", examples=[{"total": "price * qty"}])] = None
+    next_position: Annotated[int, Field(description="Position the next record gets, the extent of viewport reads")] = 0
+    encoding_target: Annotated[str | None, Field(description="Encoding the rows are being rewritten to, records can not be read or written until it clears")] = None
     created_at: Annotated[datetime, Field(description="When user was created", examples=["2026-01-20"])]
     updated_at: Annotated[datetime, Field(description="When User was updated last", examples=["2026-01-23"])]
     
@@ -32,17 +39,164 @@ class DatasetResponse(BaseResponse):
     data: Annotated[DatasetResponseSchema, Field(description="Dataset Data")]
     
     
+class DatasetEncodingSchema(DatasetResponseSchema):
+    job: Annotated[JobSchema | None, Field(description="Background job rewriting the rows, for large datasets")] = None
+
+
+class DatasetEncodingResponse(BaseResponse):
+    data: Annotated[DatasetEncodingSchema, Field(description="The dataset, with the re-encoding job when one was started")]
+
+
 class DatasetPaginatedResponseSchema(BasePaginatedResponseSchema):
     datasets: Annotated[list[DatasetResponseSchema], Field(description="List of datasets")]
 
 class DatasetPaginatedResponse(BaseResponse):
     data: Annotated[DatasetPaginatedResponseSchema, Field(description="dataset data")]
     
+class ColumnValueCount(BaseModel):
+    value: Annotated[str | None, Field(description="Column value")]
+    count: Annotated[int, Field(description="Number of rows holding the value")]
+
+
+class ColumnProfileSchema(BaseModel):
+    count: Annotated[int, Field(description="Number of non-empty values")]
+    null_count: Annotated[int, Field(description="Number of empty values")]
+    null_ratio: Annotated[float, Field(description="Ratio of empty values to rows")]
+    distinct_count: Annotated[int, Field(description="Approximate number of distinct values")]
+    min: Annotated[str | None, Field(description="Smallest value (lexicographic)")]
+    max: Annotated[str | None, Field(description="Largest value (lexicographic)")]
+    numeric_count: Annotated[int, Field(description="Number of values that parse as numbers")]
+    numeric_min: Annotated[float | None, Field(description="Smallest numeric value")]
+    numeric_max: Annotated[float | None, Field(description="Largest numeric value")]
+    mean: Annotated[float | None, Field(description="Mean of the numeric values")]
+    top_values: Annotated[list[ColumnValueCount], Field(description="Most frequent values")]
+
+
+class DatasetProfileSchema(BaseModel):
+    dataset_id: Annotated[UUID, Field(description="Dataset Id")]
+    row_count: Annotated[int, Field(description="Number of rows in dataset")]
+    columns: Annotated[dict[str, ColumnProfileSchema], Field(description="Statistics keyed by column name")]
+
+
+class DatasetProfileResponse(BaseResponse):
+    data: Annotated[DatasetProfileSchema, Field(description="Dataset profile data")]
+
+
+
+class ColumnValuesSchema(BaseModel):
+    column: Annotated[str, Field(description="Column name")]
+    values: Annotated[list[ColumnValueCount], Field(description="Distinct values ordered by frequency")]
+
+
+class ColumnValuesResponse(BaseResponse):
+    data: Annotated[ColumnValuesSchema, Field(description="Column values data")]
+
+    
 class UpdateDataset(BaseModel):
     name: Annotated[str, Field(description="The name of the file")]
-    
-    
 
+
+class UpdateDatasetStorage(BaseModel):
+    storage: Annotated[Literal["jsonb", "columnar"], Field(description="jsonb keeps one document per row, columnar keeps a typed table per dataset for read-mostly data")]
+
+
+class UpdateDatasetEncoding(BaseModel):
+    record_encoding: Annotated[Literal["object", "positional"], Field(description="object stores column names in every row, positional stores rows as arrays in column order")]
+
+
+class AlterDatasetColumn(BaseModel):
+    op: Annotated[Literal["add", "rename", "drop", "retype", "derive"], Field(description="Change to make to the column, derive adds a column computed from an expression")]
+    column: Annotated[str, Field(min_length=1, description="Column to change, or to create for add", examples=["price"])]
+    new_name: Annotated[str | None, Field(description="New column name, for rename")] = None
+    type: Annotated[Literal["string", "integer", "number", "boolean"] | None, Field(description="Column type for add and retype, values that do not convert become null")] = None
+    default: Annotated[Any, Field(description="Value filled in on existing rows, for add")] = None
+    expression: Annotated[str | None, Field(description="Expression computing the column from the other columns, for derive", examples=["price * qty", "round(total / 100, 2)", "date(ordered_at)"])] = None
     
+    @model_validator(mode="after")
+    def check_arguments(self):
+        if self.op == "rename" and not (self.new_name and self.new_name.strip()):
+            raise ValueError("rename needs new_name")
+        if self.op == "retype" and not self.type:
+            raise ValueError("retype needs type")
+        if self.op == "derive" and not (self.expression and self.expression.strip()):
+            raise ValueError("derive needs expression")
+        return self
+
+
+class AlterDatasetColumnSchema(BaseModel):
+    dataset: Annotated[DatasetResponseSchema, Field(description="The dataset with its new columns")]
+    rewritten: Annotated[int, Field(description="Number of rows rewritten, 0 when a job does it")]
+    job: Annotated[JobSchema | None, Field(description="Background job rewriting the rows, for large datasets")] = None
+
+
+class AlterDatasetColumnResponse(BaseResponse):
+    data: Annotated[AlterDatasetColumnSchema, Field(description="Column change result")]
+
+
+class CloneDataset(BaseModel):
+    name: Annotated[str | None, Field(description="Name of the new dataset, the source name with (copy) when omitted")] = None
+    filter: Annotated[RecordFilter | None, Field(description="Only copy the records matching this filter")] = None
+    columns: Annotated[list[str] | None, Field(min_length=1, description="Columns to copy in this order, all of them when omitted", examples=[["name", "email"]])] = None
+    sort: Annotated[str | None, Field(description="Column the copied records are ordered by, the source order when omitted")] = None
+    sort_order: Annotated[Literal["asc", "desc"], Field(description="Direction of the sort")] = "asc"
+
+
+class JoinDatasets(BaseModel):
+    right_dataset_id: Annotated[UUID, Field(description="Dataset to join with, it must be yours")]
+    on: Annotated[list[str], Field(min_length=1, description="Key columns of this dataset", examples=[["customer_id"]])]
+    right_on: Annotated[list[str] | None, Field(description="Key columns of the other dataset in the same order, the same names as on when omitted", examples=[["id"]])] = None
+    how: Annotated[Literal["inner", "left"], Field(description="inner keeps matched rows only, left keeps every row of this dataset")] = "inner"
+    name: Annotated[str | None, Field(description="Name of the new dataset")] = None
+    suffix: Annotated[str, Field(min_length=1, description="Appended to columns of the other dataset whose name is taken")] = "_right"
     
-    
\ No newline at end of file
+    @model_validator(mode="after")
+    def check_keys(self):
+        if self.right_on is not None and len(self.right_on) != len(self.on):
+            raise ValueError("right_on needs as many columns as on")
+        return self
+
+
+class JoinDatasetsSchema(BaseModel):
+    dataset: Annotated[DatasetResponseSchema, Field(description="The new dataset")]
+    rows: Annotated[int, Field(description="Number of rows joined, 0 when a job does it")]
+    job: Annotated[JobSchema | None, Field(description="Background job filling the new dataset, for large joins")] = None
+
+
+class JoinDatasetsResponse(BaseResponse):
+    data: Annotated[JoinDatasetsSchema, Field(description="Join result")]
+
+
+class CreateDatasetVersion(BaseModel):
+    name: Annotated[str | None, Field(description="Optional label for the version", examples=["before cleanup"])] = None
+
+
+class DatasetVersionSchema(BaseModel):
+    dataset_id: Annotated[UUID, Field(description="Dataset Id")]
+    version_number: Annotated[int, Field(description="Version number, increasing per dataset", examples=[1])]
+    name: Annotated[str | None, Field(description="Label of the version")]
+    row_count: Annotated[int, Field(description="Number of rows when the version was created")]
+    data_schema: Annotated[dict[str, Any], Field(description="The Columns of the dataset when the version was created")]
+    created_at: Annotated[datetime, Field(description="When the version was created")]
+
+
+class DatasetVersionResponse(BaseResponse):
+    data: Annotated[DatasetVersionSchema, Field(description="Dataset version data")]
+
+
+class DatasetVersionListResponse(BaseResponse):
+    data: Annotated[list[DatasetVersionSchema], Field(description="Versions of the dataset, newest first")]
+
+
+class VersionRecordSchema(BaseModel):
+    id: Annotated[UUID, Field(description="The record Id")]
+    data: Annotated[dict[str, Any], Field(description="The record as it was in the version")]
+    created_at: Annotated[datetime, Field(description="Date record is created at")]
+
+
+class DatasetVersionRecordsSchema(BasePaginatedResponseSchema):
+    version: Annotated[DatasetVersionSchema, Field(description="The version being read")]
+    records: Annotated[list[VersionRecordSchema], Field(description="Records of the version in id order")]
+
+
+class DatasetVersionRecordsResponse(BaseResponse):
+    data: Annotated[DatasetVersionRecordsSchema, Field(description="Paginated version records")]
@@ -0,0 +1,21 @@
+from pydantic import BaseModel, Field
+from typing import Annotated, Any
+from uuid import UUID
+from datetime import datetime
+
+from app.schemas.base_response import BaseResponse
+
+
+class JobSchema(BaseModel):
+    job_id: Annotated[UUID, Field(description="Id to poll the job with")]
+    kind: Annotated[str, Field(description="What the job does", examples=["update_by_filter"])]
+    status: Annotated[str, Field(description="pending, running, completed or failed", examples=["running"])]
+    dataset_id: Annotated[UUID | None, Field(description="Dataset the job works on")] = None
+    progress: Annotated[dict[str, Any] | None, Field(description="Progress reported by the job")] = None
+    result: Annotated[dict[str, Any] | None, Field(description="Result once the job has finished")] = None
+    created_at: Annotated[datetime, Field(description="When the job was submitted")]
+    updated_at: Annotated[datetime, Field(description="When the job last reported")]
+
+
+class JobResponse(BaseResponse):
+    data: Annotated[JobSchema, Field(description="Job data")]
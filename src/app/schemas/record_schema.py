@@ -1,9 +1,10 @@
-from pydantic import Field, BaseModel, field_serializer
-from typing import Any, Annotated
+from pydantic import Field, BaseModel, field_serializer, model_validator
+from typing import Any, Annotated, Literal
 from uuid import UUID
 from datetime import datetime
 
 from app.schemas.base_response import BaseResponse, BasePaginatedResponseSchema
+from app.schemas.job_schema import JobSchema
 
 
 class RecordBase(BaseModel):
@@ -18,6 +19,7 @@ class RecordUpdate(RecordBase):
 class RecordResponseSchema(RecordBase):
     id: Annotated[UUID, Field(description="Tue record Id")]
     dataset_id: Annotated[UUID, Field(description="Dataset id the record belong to")]
+    position: Annotated[int | None, Field(description="Position of the record in the dataset, for viewport reads")] = None
     created_at: Annotated[datetime, Field(description="Date record is created at")]
     updated_at: Annotated[datetime, Field(description="Date record was updated last")]
     
@@ -36,8 +38,13 @@ class RecordResponse(BaseResponse):
 class RecordListResponse(BaseResponse):
     data: Annotated[list[RecordResponseSchema], Field(description="List of Record data response")]
     
+class QueryDebugSchema(BaseModel):
+    timings_ms: Annotated[dict[str, float], Field(description="Time spent in each phase of the request")]
+    plans: Annotated[dict[str, Any], Field(description="EXPLAIN (ANALYZE, BUFFERS) output per query")]
+
 class RecordPaginatedResponseSchema(BasePaginatedResponseSchema):
     records: Annotated[list[RecordResponseSchema], Field(description="List of records for dataset")]
+    debug: Annotated[QueryDebugSchema | None, Field(description="Query diagnostics, only present when requested")] = None
     
 class RecordPaginatedRespone(BaseResponse):
     data: Annotated[RecordPaginatedResponseSchema, Field(description="Paginated Record data")]
@@ -53,4 +60,150 @@ class BatchUpdate(BaseModel):
     
 class ListBatchUpdate(BaseModel):
     records: Annotated[list[BatchUpdate], Field(description="List of records to update")]
-    
\ No newline at end of file
+    
+
+class FilterCondition(BaseModel):
+    column: Annotated[str, Field(description="Column to test", examples=["region"])]
+    op: Annotated[
+        Literal["eq", "ne", "contains", "starts_with", "gt", "gte", "lt", "lte", "in", "is_null", "not_null"],
+        Field(description="Comparison, gt/gte/lt/lte compare numerically and skip non numeric values")
+    ] = "eq"
+    value: Annotated[Any, Field(description="Value to compare with, a list for in", examples=["EU"])] = None
+    
+    @model_validator(mode="after")
+    def check_value(self):
+        if self.op in ("gt", "gte", "lt", "lte") and (isinstance(self.value, bool) or not isinstance(self.value, (int, float))):
+            raise ValueError(f"{self.op} needs a numeric value")
+        if self.op == "in" and not isinstance(self.value, list):
+            raise ValueError("in needs a list value")
+        return self
+
+class RecordFilter(BaseModel):
+    conditions: Annotated[list[FilterCondition], Field(min_length=1, description="Conditions a record has to meet")]
+    match: Annotated[Literal["all", "any"], Field(description="Whether all or any of the conditions must hold")] = "all"
+    
+class BulkDeleteRecords(BaseModel):
+    ids: Annotated[list[UUID] | None, Field(max_length=10000, description="Ids of the records to delete")] = None
+    filter: Annotated[RecordFilter | None, Field(description="Delete every record matching this filter")] = None
+    
+    @model_validator(mode="after")
+    def check_target(self):
+        if (self.ids is None) == (self.filter is None):
+            raise ValueError("Provide either ids or filter")
+        return self
+    
+class UpdateByFilter(BaseModel):
+    filter: Annotated[RecordFilter, Field(description="Records to update")]
+    data: Annotated[dict[str, Any], Field(min_length=1, description="Columns to set on every matching record", examples=[{"status": "closed"}])]
+    dry_run: Annotated[bool, Field(description="Only count the matching records")] = False
+    
+class UpdateByFilterSchema(BaseModel):
+    matched: Annotated[int, Field(description="Number of records matching the filter")]
+    updated: Annotated[int, Field(description="Number of records updated, 0 for dry runs and background jobs")]
+    dry_run: Annotated[bool, Field(description="Whether this was a dry run")]
+    job: Annotated[JobSchema | None, Field(description="Background job applying the update, when it was too large to run inline")] = None
+    
+class UpdateByFilterResponse(BaseResponse):
+    data: Annotated[UpdateByFilterSchema, Field(description="Update by filter result")]
+    
+class FindReplace(BaseModel):
+    find: Annotated[str, Field(min_length=1, description="Text to look for, or a POSIX regular expression when regex is set")]
+    replace: Annotated[str, Field(description="Replacement text, regex replacements may use \\1 to \\9 and \\& for matched groups")]
+    regex: Annotated[bool, Field(description="Treat find as a regular expression")] = False
+    case_sensitive: Annotated[bool, Field(description="Match case exactly")] = True
+    columns: Annotated[list[str] | None, Field(min_length=1, description="String columns to search, all of them when omitted")] = None
+    preview: Annotated[bool, Field(description="Only count the matches and return a sample of the changes")] = False
+    
+class FindReplaceSample(BaseModel):
+    id: Annotated[UUID, Field(description="Id of the record")]
+    column: Annotated[str, Field(description="Column of the cell")]
+    before: Annotated[Any, Field(description="Current value of the cell")]
+    after: Annotated[Any, Field(description="Value of the cell after the replace")]
+    
+class FindReplaceSchema(BaseModel):
+    matched: Annotated[int, Field(description="Number of records with at least one matching cell")]
+    cells: Annotated[int, Field(description="Number of matching cells")]
+    updated: Annotated[int, Field(description="Number of records updated, 0 for previews and background jobs")]
+    preview: Annotated[bool, Field(description="Whether this was a preview")]
+    samples: Annotated[list[FindReplaceSample] | None, Field(description="First changed cells in record id order, for previews")] = None
+    job: Annotated[JobSchema | None, Field(description="Background job applying the replace, when it was too large to run inline")] = None
+    
+class FindReplaceResponse(BaseResponse):
+    data: Annotated[FindReplaceSchema, Field(description="Find and replace result")]
+    
+class BulkDeleteSchema(BaseModel):
+    deleted: Annotated[int, Field(description="Number of records deleted")]
+    
+class BulkDeleteResponse(BaseResponse):
+    data: Annotated[BulkDeleteSchema, Field(description="Bulk delete result")]
+    
+
+class DuplicateGroupSchema(BaseModel):
+    row_hash: Annotated[str, Field(description="md5 of the compared values shared by the group")]
+    count: Annotated[int, Field(description="Number of records in the group")]
+    ids: Annotated[list[UUID], Field(description="Ids of the records oldest first, at most 100, the first one is kept when duplicates are removed")]
+    
+class DuplicatesSchema(BaseModel):
+    columns: Annotated[list[str], Field(description="Columns compared")]
+    groups: Annotated[int, Field(description="Number of groups of records with equal values")]
+    duplicates: Annotated[int, Field(description="Number of records removing duplicates would delete")]
+    items: Annotated[list[DuplicateGroupSchema], Field(description="Largest groups first")]
+    
+class DuplicatesResponse(BaseResponse):
+    data: Annotated[DuplicatesSchema, Field(description="Duplicate records")]
+    
+
+class RecordBulkError(BaseModel):
+    index: Annotated[int, Field(description="Position of the rejected record in the request body")]
+    error: Annotated[str, Field(description="Why the record was rejected")]
+    
+class RecordBulkCreateSchema(BaseModel):
+    inserted: Annotated[int, Field(description="Number of records created")]
+    rejected: Annotated[int, Field(description="Number of records rejected")]
+    errors: Annotated[list[RecordBulkError], Field(description="Rejected records")]
+    
+class RecordBulkCreateResponse(BaseResponse):
+    data: Annotated[RecordBulkCreateSchema, Field(description="Bulk create result")]
+    
+
+class ViewportRowSchema(BaseModel):
+    id: Annotated[UUID, Field(description="The record Id")]
+    position: Annotated[int, Field(description="Position of the record, stable while it exists")]
+    values: Annotated[list[Any], Field(description="Values of the record in the order of columns")]
+    
+class ViewportSchema(BaseModel):
+    start: Annotated[int, Field(description="First position of the block")]
+    end: Annotated[int, Field(description="Position after the block")]
+    next_position: Annotated[int, Field(description="Position the next record gets, the grid extent")]
+    columns: Annotated[list[str], Field(description="Columns of the block in file order")]
+    rows: Annotated[list[ViewportRowSchema], Field(description="Records in position order, positions of deleted records are skipped")]
+    
+class ViewportResponse(BaseResponse):
+    data: Annotated[ViewportSchema, Field(description="Block of records")]
+    
+
+class RecordSampleSchema(BaseModel):
+    method: Annotated[str, Field(description="Sampling method used")]
+    requested: Annotated[int, Field(description="Number of records requested")]
+    returned: Annotated[int, Field(description="Number of records returned, approximate methods may return fewer")]
+    records: Annotated[list[RecordResponseSchema], Field(description="Sampled records")]
+    
+class RecordSampleResponse(BaseResponse):
+    data: Annotated[RecordSampleSchema, Field(description="Sampled record data")]
+    
+
+class RecordChangeSchema(BaseModel):
+    seq: Annotated[int, Field(description="Sequence number of the change, increasing per dataset")]
+    op: Annotated[Literal["insert", "update", "delete", "reset"], Field(description="Kind of change, reset means the whole dataset should be reloaded")]
+    record_id: Annotated[UUID | None, Field(description="Id of the changed record")]
+    data: Annotated[dict[str, Any] | None, Field(description="Current data of the record, null once it is deleted")]
+    created_at: Annotated[datetime, Field(description="When the change was made")]
+
+class RecordChangesSchema(BaseModel):
+    changes: Annotated[list[RecordChangeSchema], Field(description="Changes in sequence order")]
+    next_since: Annotated[int, Field(description="Pass as since to fetch the following changes")]
+    latest_seq: Annotated[int, Field(description="Sequence number of the latest change to the dataset")]
+    has_more: Annotated[bool, Field(description="Whether more changes are available after next_since")]
+    
+class RecordChangesResponse(BaseResponse):
+    data: Annotated[RecordChangesSchema, Field(description="Dataset change data")]
@@ -1,30 +1,57 @@
-from fastapi import UploadFile, status, HTTPException
+from fastapi import UploadFile, status, HTTPException, BackgroundTasks
 from fastapi.responses import Response
+from sqlalchemy import update, delete, select, func, and_, or_, literal, ColumnElement
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Any
+from functools import partial
+from datetime import datetime, timezone
 import structlog
 from uuid import UUID
 import pandas as pd
+import math
 from io import BytesIO
 
 from app.model.dataset import Dataset
-from app.model.records import Record
+from app.model.records import Record, RecordCodec, JSON_TYPES, JSON_NULL, convert_json_value
+from app.model.dataset_version import DatasetVersion, RecordVersion
+from app.model.dataset_change import DatasetChange
 from app.model.user import User
+from app.model.task import Task
 from app.repositories.dataset_repositories import dataset_repository, FileValidationError
-from app.core.exceptions.http_exceptions import BadRequestException, NotFoundException, ForbiddenException
+from app.repositories.profile_repository import profile_repository
+from app.repositories.record_repository import record_repository
+from app.repositories.expressions import Expression, ExpressionError
+from app.repositories.record_storage import get_record_storage, ColumnarRecordStorage, STORAGE_TYPES
+from app.core.exceptions.http_exceptions import BadRequestException, NotFoundException, ForbiddenException, ConflictException
 from app.core.response import response_builder
 from app.core.utils.helper import is_valid_uuid
+from app.core.config import settings
+from app.core.db.database import async_session
+from app.service.job_service import job_service, ProgressReporter
 
 logger = structlog.get_logger(__name__)
 
 class DatasetService():
+    ALTER_COLUMN_JOB = "alter_column"
+    CHANGE_ENCODING_JOB = "change_encoding"
+    # RecordService jobs
+    RECORD_JOBS = ("update_by_filter", "find_replace")
+    
     async def create_dataset(
         self,
         db: AsyncSession,
         file: UploadFile,
         user_id: UUID,
-
+        storage: str = "jsonb",
+        record_encoding: str | None = None
     ) -> dict[str, Any]:
+        
+        if storage not in STORAGE_TYPES:
+            raise BadRequestException(f"Invalid storage, expected one of {list(STORAGE_TYPES)}")
+        
+        if record_encoding and record_encoding not in RecordCodec.ENCODINGS:
+            raise BadRequestException(f"Invalid record encoding, expected one of {list(RecordCodec.ENCODINGS)}")
 
         try:
             df = await dataset_repository.validate_and_parse_upload(file)
@@ -37,19 +64,30 @@ class DatasetService():
             raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="File processing failed due to server error")
         
         schema = dataset_repository.infer_schema(df)
+        
+        if not record_encoding:
+            wide = len(df.columns) >= settings.POSITIONAL_ENCODING_MIN_COLUMNS
+            record_encoding = RecordCodec.POSITIONAL if wide else RecordCodec.OBJECT
 
         data = {
             "user_id": user_id,
             "name": file.filename,
             "data_schema": schema,
             "row_count": len(df),
-            "column_count": len(list(df.columns))
+            "column_count": len(list(df.columns)),
+            "column_stats": profile_repository.build_profile(df),
+            "storage": storage,
+            "column_positions": {str(col): i for i, col in enumerate(df.columns)},
+            "record_encoding": record_encoding
         }
         dataset = await Dataset.create(data, db)
 
         normalized_rows = dataset_repository.normalize_records(df)
         
-        await Record.bulk_insert_records(db=db, dataset_id=str(dataset.id), records=normalized_rows)
+        record_storage = get_record_storage(storage)
+        await record_storage.create(db, dataset)
+        await record_storage.insert_rows(db, dataset, normalized_rows)
+        await dataset.save(db)
         
         dataset_response = {
             "dataset_id": str(dataset.id),
@@ -91,6 +129,7 @@ class DatasetService():
         }  
         if name:
             filters["name"] = f"%{name}%"
+        filters["is_deleted"] = False
             
         datasets = await Dataset.get_by(db=db, filters=filters, page=page, page_size=page_size)
         
@@ -132,6 +171,37 @@ class DatasetService():
             data=dataset.to_dict()
         )
     
+    # Get column statistics for dataset
+    async def get_dataset_profile(
+        self,
+        id: str,
+        user: User,
+        db: AsyncSession
+    ):
+        if not is_valid_uuid(id):
+            raise BadRequestException("Invalid Id")
+        
+        dataset = await Dataset.get_profile(id=id, db=db)
+        if not dataset:
+            raise NotFoundException("Dataset not found")
+        
+        if dataset.user_id != user.id:
+            raise ForbiddenException("Can only view your dataset")
+        
+        if dataset.column_stats is None:
+            raise NotFoundException("Dataset has no profile")
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message="successfully fetch dataset profile",
+            data={
+                "dataset_id": id,
+                "row_count": dataset.row_count,
+                "columns": profile_repository.render(dataset.column_stats)
+            }
+        )
+    
     # update dataset name
     async def update_dataset(
         self,
@@ -166,7 +236,8 @@ class DatasetService():
         self,
         user: User,
         id: str,
-        db: AsyncSession
+        db: AsyncSession,
+        background_task: BackgroundTasks
     ):
         if not is_valid_uuid(id):
             raise BadRequestException("Invalid Id")
@@ -178,8 +249,940 @@ class DatasetService():
         if dataset.user_id != user.id:
             raise ForbiddenException("Can only delete your dataset")
         
-        await dataset.delete(db)
+        # hide the dataset now, the rows go once the response is sent
+        dataset.is_deleted = True
+        dataset.deleted_at = datetime.now(timezone.utc)
+        await dataset.save(db)
+        
+        # background tasks run before the request session commits, and the
+        # purge only touches datasets whose delete is committed
+        await db.commit()
+        background_task.add_task(self.purge_dataset, dataset.id)
+    
+    async def purge_dataset(self, dataset_id: UUID) -> None:
+        """Remove a deleted dataset in bounded transactions.
+
+        Runs outside the request, so it uses its own sessions. Each batch is
+        committed on its own to keep transactions and WAL bursts small; the
+        dataset row goes last and the FK cascade only has small tables left.
+        """
+        batch_size = settings.DATASET_PURGE_BATCH_SIZE
+        
+        try:
+            async with async_session() as session:
+                result = await session.execute(select(Dataset.is_deleted).where(Dataset.id == dataset_id))
+                if result.scalar_one_or_none() is not True:
+                    logger.warning("Dataset purge skipped, delete not committed", dataset_id=str(dataset_id))
+                    return
+            
+            for model, key in ((Record, Record.id), (RecordVersion, RecordVersion.id), (DatasetChange, DatasetChange.seq)):
+                while True:
+                    async with async_session() as session:
+                        batch = (
+                            select(key)
+                            .where(model.dataset_id == dataset_id)
+                            .limit(batch_size)
+                            .scalar_subquery()
+                        )
+                        result = await session.execute(
+                            delete(model).where(model.dataset_id == dataset_id, key.in_(batch))
+                        )
+                        await session.commit()
+                    
+                    if result.rowcount < batch_size:
+                        break
+            
+            async with async_session() as session:
+                dataset = await session.get(Dataset, dataset_id)
+                if dataset and dataset.is_deleted:
+                    await get_record_storage(dataset.storage).drop(session, dataset)
+                    await dataset.delete(session)
+                await session.commit()
+            
+            logger.info("Dataset purged", dataset_id=str(dataset_id))
         
+        except Exception as e:
+            # the dataset stays marked deleted and is picked up again on startup
+            logger.error("Dataset purge failed", dataset_id=str(dataset_id), reason=str(e))
+    
+    async def purge_deleted_datasets(self) -> None:
+        """Finish purges interrupted by a restart"""
+        try:
+            async with async_session() as session:
+                dataset_ids = await Dataset.get_deleted_ids(session)
+        except Exception as e:
+            logger.error("Deleted dataset lookup failed", reason=str(e))
+            return
+        
+        for dataset_id in dataset_ids:
+            await self.purge_dataset(dataset_id)
+        
+    
+    # move the rows of a dataset to another storage backend
+    async def change_storage(
+        self,
+        id: str,
+        storage: str,
+        user: User,
+        db: AsyncSession
+    ):
+        if not is_valid_uuid(id):
+            raise BadRequestException("Invalid Id")
+        
+        if storage not in STORAGE_TYPES:
+            raise BadRequestException(f"Invalid storage, expected one of {list(STORAGE_TYPES)}")
+        
+        dataset = await Dataset.get_by_id(id=id, db=db)
+        if not dataset:
+            raise NotFoundException("Dataset not found")
+        
+        if dataset.user_id != user.id:
+            raise ForbiddenException("Dataset not yours")
+        
+        self._require_settled_encoding(dataset)
+        
+        if dataset.storage != storage:
+            if dataset.current_version:
+                raise BadRequestException("Datasets with versions can not change storage")
+            
+            columnar = ColumnarRecordStorage()
+            if storage == ColumnarRecordStorage.name:
+                await columnar.create(db, dataset)
+                await columnar.load_from_records(db, dataset)
+            else:
+                await columnar.unload_to_records(db, dataset)
+                await columnar.drop(db, dataset)
+                dataset.storage_options = None
+            
+            dataset.storage = storage
+            await dataset.save(db)
+            # every row was rewritten, incremental readers have to reload
+            await DatasetChange.log(db, dataset.id, DatasetChange.RESET)
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message=f"dataset stored as {storage}",
+            data=dataset.to_dict()
+        )
+    
+    # rewrite the rows of a dataset in another record encoding, in keyset chunks
+    async def change_encoding(
+        self,
+        id: str,
+        record_encoding: str,
+        user: User,
+        db: AsyncSession,
+        background_task: BackgroundTasks
+    ):
+        if not is_valid_uuid(id):
+            raise BadRequestException("Invalid Id")
+        
+        if record_encoding not in RecordCodec.ENCODINGS:
+            raise BadRequestException(f"Invalid record encoding, expected one of {list(RecordCodec.ENCODINGS)}")
+        
+        dataset = await Dataset.get_by_id(id=id, db=db)
+        if not dataset:
+            raise NotFoundException("Dataset not found")
+        
+        if dataset.user_id != user.id:
+            raise ForbiddenException("Dataset not yours")
+        
+        if dataset.encoding_target:
+            if await Task.get_active_for_dataset(db, dataset.id, [self.CHANGE_ENCODING_JOB]):
+                raise ConflictException("The records of this dataset are still being re-encoded")
+            # a failed job leaves the rows mixed, only finishing it untangles them
+            if record_encoding != dataset.encoding_target:
+                raise BadRequestException(f"Resume the interrupted change to {dataset.encoding_target} first")
+        
+        response_data: dict[str, Any] = {}
+        message = f"dataset records encoded as {record_encoding}"
+        
+        if dataset.record_encoding != record_encoding:
+            # version images are stored in the encoding of the rows they copied
+            if dataset.current_version:
+                raise BadRequestException("Datasets with versions can not change encoding")
+            
+            # their chunks read rows through the codec of the current encoding
+            if await Task.get_active_for_dataset(db, dataset.id, [self.ALTER_COLUMN_JOB, *self.RECORD_JOBS]):
+                raise BadRequestException("Another job is still rewriting the records of this dataset")
+            
+            if not dataset.column_positions:
+                dataset.column_positions = {col: i for i, col in enumerate(dataset.data_schema)}
+            
+            # columnar datasets have no rows in `records`, the encoding only
+            # applies once they are moved back to jsonb
+            pending = 0 if dataset.storage == ColumnarRecordStorage.name else dataset.row_count
+            
+            if pending > settings.BACKGROUND_JOB_ROW_THRESHOLD:
+                dataset.encoding_target = record_encoding
+                await dataset.save(db)
+                task = await job_service.create_job(
+                    db, user, self.CHANGE_ENCODING_JOB, dataset.id, {"processed": 0, "total": pending}
+                )
+                await job_service.start(
+                    db, background_task, task, partial(self._change_encoding_job, dataset.id, record_encoding, pending)
+                )
+                response_data["job"] = task.to_dict()
+                message = f"records of {pending} rows being encoded as {record_encoding} in the background"
+            
+            elif pending:
+                await self._finish_encoding(db, dataset, record_encoding)
+            
+            else:
+                dataset.record_encoding = record_encoding
+                await dataset.save(db)
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message=message,
+            data={**dataset.to_dict(), **response_data}
+        )
+    
+    def _encoding_pending(self, record_encoding: str) -> ColumnElement[bool]:
+        """Rows not yet in `record_encoding`; positional rows are arrays, object rows objects"""
+        target_type = "array" if record_encoding == RecordCodec.POSITIONAL else "object"
+        return func.jsonb_typeof(Record.data) != target_type
+    
+    def _reencoded_data(self, dataset: Dataset, record_encoding: str) -> ColumnElement[Any]:
+        current = RecordCodec.for_dataset(dataset)
+        target = RecordCodec(record_encoding, dataset.column_positions)
+        return target.build({col: current.json_value(col) for col in current.columns})
+    
+    async def _reencode_chunk(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        record_encoding: str,
+        after: UUID | None = None
+    ) -> tuple[int, UUID | None]:
+        """Rewrite the next chunk of rows after `after` in id order: (rows rewritten, keyset cursor)"""
+        pending = self._encoding_pending(record_encoding)
+        ids = await Record.matching_ids(db, dataset.id, pending, after, settings.BACKGROUND_JOB_BATCH_SIZE)
+        if not ids:
+            return 0, after
+        
+        await Record.rewrite_matching(
+            db, dataset.id, and_(pending, Record.id.in_(ids)),
+            self._reencoded_data(dataset, record_encoding), batch_size=len(ids)
+        )
+        return len(ids), ids[-1]
+    
+    async def _finish_encoding(self, db: AsyncSession, dataset: Dataset, record_encoding: str) -> None:
+        """Rewrite whatever rows are left, then switch the dataset over.
+
+        After a job this only finds rows a writer slipped in behind its
+        cursor; small datasets are rewritten here directly.
+        """
+        pending = self._encoding_pending(record_encoding)
+        data = self._reencoded_data(dataset, record_encoding)
+        batch_size = settings.BACKGROUND_JOB_BATCH_SIZE
+        while await Record.rewrite_matching(db, dataset.id, pending, data, batch_size=batch_size) == batch_size:
+            pass
+        
+        dataset.record_encoding = record_encoding
+        dataset.encoding_target = None
+        await dataset.save(db)
+        await DatasetChange.log(db, dataset.id, DatasetChange.RESET)
+    
+    async def _change_encoding_job(
+        self,
+        dataset_id: UUID,
+        record_encoding: str,
+        pending: int,
+        report: ProgressReporter
+    ) -> dict[str, Any]:
+        rewritten = 0
+        after = None
+        
+        while True:
+            async with async_session() as session:
+                dataset = await Dataset.get_by_id(str(dataset_id), session)
+                if not dataset:
+                    raise RuntimeError("Dataset no longer exists")
+                
+                count, after = await self._reencode_chunk(session, dataset, record_encoding, after)
+                if not count:
+                    await self._finish_encoding(session, dataset, record_encoding)
+                await session.commit()
+            
+            if not count:
+                break
+            rewritten += count
+            await report({"processed": rewritten, "total": pending})
+        
+        return {"record_encoding": record_encoding, "rewritten": rewritten}
+    
+    # add, rename, drop or retype a column, rewriting the rows in set-based chunks
+    async def alter_column(
+        self,
+        id: str,
+        operation: dict[str, Any],
+        user: User,
+        db: AsyncSession,
+        background_task: BackgroundTasks
+    ):
+        dataset = await self._get_owned_dataset(id, user, db)
+        
+        if dataset.storage == ColumnarRecordStorage.name:
+            raise BadRequestException(f"Operation not supported for {dataset.storage} datasets")
+        
+        if dataset.current_version:
+            raise BadRequestException("Datasets with versions can not change columns")
+        
+        if await Task.get_active_for_dataset(db, dataset.id, [self.ALTER_COLUMN_JOB]):
+            raise BadRequestException("Another column change is still running on this dataset")
+        
+        plan = self._plan_column_change(dataset, operation)
+        
+        # the schema changes first; rows still waiting for their rewrite read
+        # the column as missing, or in its old type, until their chunk is done
+        stats = await dataset.load_column_stats(db, for_update=True)
+        self._apply_column_metadata(dataset, plan, stats)
+        await dataset.save(db)
+        
+        rewrite = self._column_rewrite(plan)
+        if rewrite:
+            pending = await Record.count_matching(db, dataset.id, rewrite[0])
+        else:
+            # pandas-evaluated derived columns visit every row
+            pending = dataset.row_count if plan["op"] == "derive" else 0
+        response_data: dict[str, Any] = {"rewritten": 0}
+        
+        if pending > settings.BACKGROUND_JOB_ROW_THRESHOLD:
+            await DatasetChange.log(db, dataset.id, DatasetChange.RESET)
+            task = await job_service.create_job(
+                db, user, self.ALTER_COLUMN_JOB, dataset.id, {"processed": 0, "total": pending}
+            )
+            # the metadata and the reset are committed first, the job's
+            # final dataset update would otherwise wait on this transaction
+            await job_service.start(
+                db, background_task, task, partial(self._alter_column_job, dataset.id, plan, pending)
+            )
+            response_data["job"] = task.to_dict()
+            message = f"column {plan['op']} running in the background for {pending} rows"
+        
+        else:
+            after, done = None, not pending
+            while not done:
+                count, after, done = await self._rewrite_chunk(db, dataset, plan, after)
+                response_data["rewritten"] += count
+            await self._finish_column_change(db, dataset, plan)
+            message = f"column {plan['op']} applied"
+        
+        response_data["dataset"] = dataset.to_dict()
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message=message,
+            data=response_data
+        )
+    
+    def _plan_column_change(self, dataset: Dataset, operation: dict[str, Any]) -> dict[str, Any]:
+        """Check a column operation against the dataset and pin down what the rewrite needs"""
+        op = operation["op"]
+        column = operation["column"].strip()
+        schema = dataset.data_schema
+        positions = dataset.column_positions or {col: i for i, col in enumerate(schema)}
+        
+        derived = dataset.derived_columns or {}
+        plan: dict[str, Any] = {
+            "op": op,
+            "column": column,
+            "encoding": dataset.record_encoding,
+            "positions": positions,
+            "position": positions.get(column)
+        }
+        
+        if op in ("add", "derive"):
+            if column in schema:
+                raise BadRequestException(f"Column {column} already exists")
+            if len(schema) >= dataset_repository.MAX_COLUMNS:
+                raise BadRequestException(f"Too many columns. Max allowed is {dataset_repository.MAX_COLUMNS}.")
+            plan["position"] = max(positions.values(), default=-1) + 1
+            
+            if op == "derive":
+                # derived columns read stored columns only, never each other
+                plan["schema"] = {col: kind for col, kind in schema.items() if col not in derived}
+                plan["expression"] = operation["expression"]
+                try:
+                    plan["type"] = Expression(plan["expression"], plan["schema"]).column_type
+                except ExpressionError as e:
+                    raise BadRequestException(str(e))
+                return plan
+            
+            plan["type"] = operation.get("type") or "string"
+            plan["default"] = operation.get("default")
+            if not record_repository.matches_type(plan["default"], plan["type"]):
+                raise BadRequestException(f"Default does not match the column type {plan['type']}")
+            return plan
+        
+        if column not in schema:
+            raise BadRequestException(f"Unknown column {column}")
+        
+        if column in derived and op == "retype":
+            raise BadRequestException("The type of a derived column follows its expression")
+        
+        base = {col: kind for col, kind in schema.items() if col not in derived}
+        for name, source in derived.items():
+            if name != column and column in Expression(source, base).columns:
+                raise BadRequestException(f"Column {column} is used by derived column {name}")
+        
+        if op == "rename":
+            new_name = operation["new_name"].strip()
+            if new_name in schema:
+                raise BadRequestException(f"Column {new_name} already exists")
+            plan["new_name"] = new_name
+        
+        elif op == "drop":
+            if len(schema) == 1:
+                raise BadRequestException("Can not drop the last column")
+        
+        elif op == "retype":
+            plan["type"] = operation["type"]
+        
+        return plan
+    
+    def _apply_column_metadata(self, dataset: Dataset, plan: dict[str, Any], stats: dict[str, Any] | None) -> None:
+        op, column = plan["op"], plan["column"]
+        schema = dict(dataset.data_schema)
+        positions = dict(dataset.column_positions or {col: i for i, col in enumerate(schema)})
+        derived = dict(dataset.derived_columns or {})
+        stats = dict(stats) if stats is not None else None
+        
+        if op == "add":
+            schema[column] = plan["type"]
+            positions[column] = plan["position"]
+            if stats is not None:
+                stats[column] = profile_repository.constant_column(plan["default"], dataset.row_count)
+        
+        elif op == "derive":
+            schema[column] = plan["type"]
+            positions[column] = plan["position"]
+            derived[column] = plan["expression"]
+        
+        elif op == "rename":
+            new_name = plan["new_name"]
+            schema = {new_name if col == column else col: kind for col, kind in schema.items()}
+            positions = {new_name if col == column else col: pos for col, pos in positions.items()}
+            derived = {new_name if col == column else col: source for col, source in derived.items()}
+            if stats is not None and column in stats:
+                stats[new_name] = stats.pop(column)
+        
+        elif op == "drop":
+            schema.pop(column)
+            positions.pop(column, None)
+            derived.pop(column, None)
+            if stats is not None:
+                stats.pop(column, None)
+        
+        else:
+            schema[column] = plan["type"]
+        
+        dataset.data_schema = schema
+        dataset.column_positions = positions
+        dataset.derived_columns = derived or None
+        dataset.column_count = len(schema)
+        if stats is not None:
+            dataset.column_stats = stats
+    
+    def _column_rewrite(self, plan: dict[str, Any]) -> tuple[ColumnElement[bool], ColumnElement[Any]] | None:
+        """(rows still to rewrite, their new data), or None when only the schema changes"""
+        op, column = plan["op"], plan["column"]
+        codec = RecordCodec(plan["encoding"], {**plan["positions"], column: plan["position"]})
+        value_type = func.coalesce(func.jsonb_typeof(codec.json_value(column)), "null")
+        
+        if op == "derive":
+            expression = Expression(plan["expression"], plan["schema"])
+            if not expression.translatable:
+                return None
+            value = expression.to_sql(codec)
+            current = func.coalesce(codec.json_value(column), JSON_NULL)
+            return current.is_distinct_from(value), codec.set_value(column, value)
+        
+        if op == "add":
+            if plan["default"] is None:
+                return None
+            return value_type == "null", codec.set_value(column, literal(plan["default"], JSONB))
+        
+        if op == "rename":
+            if codec.positional:
+                return None
+            return Record.data.has_key(column), codec.rename_value(column, plan["new_name"])
+        
+        if op == "drop":
+            present = value_type != "null" if codec.positional else Record.data.has_key(column)
+            return present, codec.remove_value(column)
+        
+        pending = value_type != JSON_TYPES[plan["type"]]
+        if plan["type"] == "integer":
+            pending = or_(pending, ~codec.value(column).regexp_match(r"^-?[0-9]+$"))
+        return (
+            and_(value_type != "null", pending),
+            codec.set_value(column, convert_json_value(codec.value(column), plan["type"]))
+        )
+    
+    async def _finish_column_change(self, db: AsyncSession, dataset: Dataset, plan: dict[str, Any]) -> None:
+        """Refresh what the rewrite invalidated and tell change feed clients to reload"""
+        stats = await dataset.load_column_stats(db, for_update=True)
+        if plan["op"] in ("retype", "derive") and stats is not None:
+            stats = {**stats, **await self._profile_rows(db, dataset, [plan["column"]])}
+        
+        await dataset.apply_write(db, column_stats=stats)
+        await DatasetChange.log(db, dataset.id, DatasetChange.RESET)
+    
+    async def _profile_rows(self, db: AsyncSession, dataset: Dataset, columns: list[str]) -> dict[str, Any]:
+        """Rebuild the profile of `columns` from the stored rows, in keyset batches"""
+        codec = RecordCodec.for_dataset(dataset)
+        profile: dict[str, Any] = {column: profile_repository.empty_column() for column in columns}
+        after = None
+        
+        # column names are user supplied, so they are selected under positional labels
+        values = [codec.value(column).label(f"c{i}") for i, column in enumerate(columns)]
+        
+        while True:
+            query = select(Record.id, *values).where(Record.dataset_id == dataset.id)
+            if after:
+                query = query.where(Record.id > after)
+            
+            result = await db.execute(query.order_by(Record.id).limit(settings.BACKGROUND_JOB_BATCH_SIZE))
+            rows = result.all()
+            if not rows:
+                break
+            
+            profile = profile_repository.apply_rows(
+                profile, [{column: row[i + 1] for i, column in enumerate(columns)} for row in rows]
+            )
+            after = rows[-1].id
+        
+        return profile
+    
+    async def _rewrite_chunk(
+        self,
+        db: AsyncSession,
+        dataset: Dataset,
+        plan: dict[str, Any],
+        after: UUID | None = None
+    ) -> tuple[int, UUID | None, bool]:
+        """Rewrite the next chunk of rows for a column change: (rows rewritten, keyset cursor, done)"""
+        batch_size = settings.BACKGROUND_JOB_BATCH_SIZE
+        
+        rewrite = self._column_rewrite(plan)
+        if rewrite:
+            count = await Record.rewrite_matching(db, dataset.id, *rewrite, batch_size=batch_size)
+            return count, None, count < batch_size
+        
+        if plan["op"] != "derive":
+            return 0, None, True
+        
+        # evaluated on pandas batches pulled in id order, then patched back
+        expression = Expression(plan["expression"], plan["schema"])
+        codec = RecordCodec.for_dataset(dataset)
+        query = select(Record.id, codec.as_object(expression.columns or None).label("data")).where(Record.dataset_id == dataset.id)
+        if after:
+            query = query.where(Record.id > after)
+        
+        result = await db.execute(query.order_by(Record.id).limit(batch_size))
+        rows = result.all()
+        if rows:
+            values = expression.evaluate(pd.DataFrame([row.data for row in rows]))
+            patches = {str(row.id): {plan["column"]: value} for row, value in zip(rows, values)}
+            await Record.patch_records(db, dataset.id, patches, codec)
+        
+        return len(rows), rows[-1].id if rows else after, len(rows) < batch_size
+    
+    async def _alter_column_job(
+        self,
+        dataset_id: UUID,
+        plan: dict[str, Any],
+        pending: int,
+        report: ProgressReporter
+    ) -> dict[str, Any]:
+        rewritten = 0
+        after, done = None, False
+        
+        while not done:
+            async with async_session() as session:
+                dataset = await Dataset.get_by_id(str(dataset_id), session)
+                if not dataset:
+                    raise RuntimeError("Dataset no longer exists")
+                if dataset.record_encoding != plan["encoding"]:
+                    raise RuntimeError("Dataset encoding changed while the column was rewritten")
+                
+                count, after, done = await self._rewrite_chunk(session, dataset, plan, after)
+                if done:
+                    await self._finish_column_change(session, dataset, plan)
+                await session.commit()
+            
+            rewritten += count
+            await report({"processed": rewritten, "total": pending})
+        
+        return {"op": plan["op"], "column": plan["column"], "rewritten": rewritten}
+    
+    # copy a dataset, or the filtered and projected part of it, into a new one inside postgres
+    async def clone_dataset(
+        self,
+        id: str,
+        clone: dict[str, Any],
+        user: User,
+        db: AsyncSession
+    ):
+        source = await self._get_owned_dataset(id, user, db)
+        if source.storage == ColumnarRecordStorage.name:
+            raise BadRequestException(f"Operation not supported for {source.storage} datasets")
+        
+        codec = RecordCodec.for_dataset(source)
+        columns = clone.get("columns")
+        unknown = [col for col in columns or [] if col not in source.data_schema]
+        if unknown:
+            raise BadRequestException(f"Unknown columns: {unknown}")
+        
+        sort = clone.get("sort")
+        if sort and sort not in source.data_schema:
+            raise BadRequestException(f"Unknown column: {sort}")
+        
+        condition = None
+        record_filter = clone.get("filter")
+        if record_filter:
+            reason = record_repository.validate_filter(record_filter["conditions"], source.data_schema)
+            if reason:
+                raise BadRequestException(reason)
+            condition = codec.where(record_filter["conditions"], record_filter.get("match", "all"))
+        
+        kept = [col for col in source.ordered_columns if col in columns] if columns else source.ordered_columns
+        
+        # a derived column stays derived only if everything it reads is copied too
+        derived = {}
+        base = {col: kind for col, kind in source.data_schema.items() if col not in (source.derived_columns or {})}
+        for name, expression in (source.derived_columns or {}).items():
+            if name in kept and all(col in kept for col in Expression(expression, base).columns):
+                derived[name] = expression
+        
+        # per-column stats carry over to a projection, a filtered clone is profiled once its rows are in
+        stats = await source.load_column_stats(db)
+        if stats is not None and not record_filter:
+            stats = {col: stats[col] for col in kept if col in stats}
+        else:
+            stats = None
+        
+        cloned = await Dataset.create({
+            "user_id": user.id,
+            "name": clone.get("name") or f"{source.name} (copy)",
+            "data_schema": {col: source.data_schema[col] for col in kept},
+            "row_count": 0,
+            "column_count": len(kept),
+            "column_stats": stats,
+            "column_positions": {col: i for i, col in enumerate(kept)},
+            "record_encoding": source.record_encoding,
+            "derived_columns": derived or None
+        }, db)
+        
+        # positional rows are repacked to the new positions, object rows copy as is
+        if codec.positional or columns:
+            data = RecordCodec.for_dataset(cloned).build({col: codec.json_value(col) for col in kept})
+        else:
+            data = Record.data
+        
+        rows = select(data.label("data")).where(Record.dataset_id == source.id)
+        if condition is not None:
+            rows = rows.where(condition)
+        
+        if sort:
+            sort_key = codec.json_value(sort)
+            order_by = [sort_key.desc() if clone.get("sort_order") == "desc" else sort_key.asc(), Record.id]
+        else:
+            order_by = [Record.position, Record.id]
+        
+        first_position = await cloned.reserve_positions(db, 0)
+        inserted = await Record.insert_from_select(db, cloned.id, rows, order_by, first_position)
+        await cloned.reserve_positions(db, inserted)
+        profile = await self._profile_rows(db, cloned, kept) if stats is None else None
+        await cloned.apply_write(db, row_delta=inserted, column_stats=profile)
+        
+        return response_builder(
+            status_code=status.HTTP_201_CREATED,
+            status="success",
+            message=f"cloned {inserted} rows",
+            data=cloned.to_dict()
+        )
+    
+    # join two datasets into a new one, computed entirely in postgres
+    async def join_datasets(
+        self,
+        id: str,
+        join: dict[str, Any],
+        user: User,
+        db: AsyncSession,
+        background_task: BackgroundTasks
+    ):
+        left = await self._get_owned_dataset(id, user, db)
+        right = await self._get_owned_dataset(str(join["right_dataset_id"]), user, db)
+        
+        for dataset in (left, right):
+            if dataset.storage == ColumnarRecordStorage.name:
+                raise BadRequestException(f"Operation not supported for {dataset.storage} datasets")
+        
+        plan = self._plan_join(left, right, join)
+        columns = plan["left_columns"] + list(plan["right_columns"])
+        schema = {
+            **{col: left.data_schema[col] for col in plan["left_columns"]},
+            **{name: right.data_schema[col] for name, col in plan["right_columns"].items()}
+        }
+        wide = len(columns) >= settings.POSITIONAL_ENCODING_MIN_COLUMNS
+        
+        # stats would need every row read back, so the new dataset starts without a profile
+        joined = await Dataset.create({
+            "user_id": user.id,
+            "name": join.get("name") or f"{left.name} join {right.name}",
+            "data_schema": schema,
+            "row_count": 0,
+            "column_count": len(columns),
+            "column_positions": {col: i for i, col in enumerate(columns)},
+            "record_encoding": RecordCodec.POSITIONAL if wide else RecordCodec.OBJECT
+        }, db)
+        plan["target"] = joined.id
+        response_data: dict[str, Any] = {"rows": 0}
+        
+        if left.row_count > settings.BACKGROUND_JOB_ROW_THRESHOLD:
+            # chunks walk the left positions, gaps left by deletes included
+            task = await job_service.create_job(
+                db, user, "join", joined.id, {"processed": 0, "total": left.next_position}
+            )
+            # the job fills the target from its own sessions, so the target
+            # and the job row have to be committed first
+            await job_service.start(
+                db, background_task, task, partial(self._join_job, plan, left.next_position)
+            )
+            response_data["job"] = task.to_dict()
+            message = f"join running in the background for {left.row_count} rows"
+        
+        else:
+            rows = await self._insert_join(db, plan, left, right, joined)
+            response_data["rows"] = rows
+            message = f"joined into {rows} rows"
+        
+        response_data["dataset"] = joined.to_dict()
+        
+        return response_builder(
+            status_code=status.HTTP_201_CREATED,
+            status="success",
+            message=message,
+            data=response_data
+        )
+    
+    def _plan_join(self, left: Dataset, right: Dataset, join: dict[str, Any]) -> dict[str, Any]:
+        """Check the join keys and name the output columns"""
+        keys = list(zip(join["on"], join.get("right_on") or join["on"]))
+        numeric = ("integer", "number")
+        
+        for left_key, right_key in keys:
+            if left_key not in left.data_schema:
+                raise BadRequestException(f"Unknown column in {left.name}: {left_key}")
+            if right_key not in right.data_schema:
+                raise BadRequestException(f"Unknown column in {right.name}: {right_key}")
+            
+            left_type, right_type = left.data_schema[left_key], right.data_schema[right_key]
+            if left_type != right_type and not (left_type in numeric and right_type in numeric):
+                raise BadRequestException(f"Cannot join {left_type} column {left_key} with {right_type} column {right_key}")
+        
+        left_columns = left.ordered_columns
+        right_keys = {right_key for _, right_key in keys}
+        
+        right_columns: dict[str, str] = {}
+        for col in right.ordered_columns:
+            if col in right_keys:
+                continue
+            name = f"{col}{join['suffix']}" if col in left.data_schema else col
+            if name in left.data_schema or name in right_columns:
+                raise BadRequestException(f"Column {name} would appear twice, choose another suffix")
+            right_columns[name] = col
+        
+        return {
+            "left": left.id,
+            "right": right.id,
+            "keys": keys,
+            "how": join["how"],
+            "left_columns": left_columns,
+            "right_columns": right_columns
+        }
+    
+    async def _insert_join(
+        self,
+        db: AsyncSession,
+        plan: dict[str, Any],
+        left: Dataset,
+        right: Dataset,
+        joined: Dataset,
+        left_positions: tuple[int, int] | None = None
+    ) -> int:
+        """Append the joined rows, in left position order, to the new dataset"""
+        rows, order_by = Record.join_select(
+            (left.id, RecordCodec.for_dataset(left)),
+            (right.id, RecordCodec.for_dataset(right)),
+            plan["keys"],
+            plan["right_columns"],
+            RecordCodec.for_dataset(joined),
+            how=plan["how"],
+            left_positions=left_positions
+        )
+        first_position = await joined.reserve_positions(db, 0)
+        inserted = await Record.insert_from_select(db, joined.id, rows, order_by, first_position)
+        await joined.reserve_positions(db, inserted)
+        await joined.apply_write(db, row_delta=inserted)
+        return inserted
+    
+    async def _join_job(self, plan: dict[str, Any], total: int, report: ProgressReporter) -> dict[str, Any]:
+        """Insert the join in chunks of left positions, one transaction per chunk.
+
+        A failed join deletes its half-filled target dataset.
+        """
+        batch_size = settings.BACKGROUND_JOB_BATCH_SIZE
+        rows = start = 0
+        
+        try:
+            while start < total:
+                async with async_session() as session:
+                    datasets = {
+                        dataset.id: dataset
+                        for dataset in await Dataset.bulk_get_by_ids([str(plan[key]) for key in ("left", "right", "target")], session)
+                    }
+                    if any(plan[key] not in datasets for key in ("left", "right", "target")):
+                        raise RuntimeError("Dataset no longer exists")
+                    left, right, joined = (datasets[plan[key]] for key in ("left", "right", "target"))
+                    
+                    rows += await self._insert_join(session, plan, left, right, joined, (start, start + batch_size))
+                    await session.commit()
+                
+                start += batch_size
+                await report({"processed": min(start, total), "total": total})
+        
+        except Exception:
+            async with async_session() as session:
+                await session.execute(
+                    update(Dataset)
+                    .where(Dataset.id == plan["target"])
+                    .values(is_deleted=True, deleted_at=func.now())
+                )
+                await session.commit()
+            await self.purge_dataset(plan["target"])
+            raise
+        
+        return {"dataset_id": str(plan["target"]), "rows": rows}
+    
+    async def _get_owned_dataset(self, id: str, user: User, db: AsyncSession) -> Dataset:
+        if not is_valid_uuid(id):
+            raise BadRequestException("Invalid Id")
+        
+        dataset = await Dataset.get_by_id(id=id, db=db)
+        if not dataset:
+            raise NotFoundException("Dataset not found")
+        
+        if dataset.user_id != user.id:
+            raise ForbiddenException("Dataset not yours")
+        
+        self._require_settled_encoding(dataset)
+        return dataset
+    
+    def _require_settled_encoding(self, dataset: Dataset) -> None:
+        if dataset.encoding_target:
+            raise ConflictException("The records of this dataset are being re-encoded, retry once the job finishes")
+    
+    # snapshot the dataset, rows are only copied when they change afterwards
+    async def create_version(
+        self,
+        id: str,
+        name: str | None,
+        user: User,
+        db: AsyncSession
+    ):
+        dataset = await self._get_owned_dataset(id, user, db)
+        
+        if dataset.storage == ColumnarRecordStorage.name:
+            raise BadRequestException(f"Operation not supported for {dataset.storage} datasets")
+        
+        version_number = await dataset.claim_version(db)
+        
+        version = await DatasetVersion.create({
+            "dataset_id": dataset.id,
+            "version_number": version_number,
+            "name": name,
+            "row_count": dataset.row_count,
+            "data_schema": dataset.data_schema
+        }, db)
+        
+        return response_builder(
+            status_code=status.HTTP_201_CREATED,
+            status="success",
+            message=f"successfully created version {version.version_number}",
+            data=version.to_dict()
+        )
+    
+    async def list_versions(
+        self,
+        id: str,
+        user: User,
+        db: AsyncSession
+    ):
+        if not is_valid_uuid(id):
+            raise BadRequestException("Invalid Id")
+        
+        owner_id = await Dataset.get_owner_id(id, db)
+        if not owner_id:
+            raise NotFoundException("Dataset not found")
+        
+        if owner_id != user.id:
+            raise ForbiddenException("Dataset not yours")
+        
+        versions = await DatasetVersion.list_for_dataset(id, db)
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message="successfully fetched dataset versions",
+            data=[version.to_dict() for version in versions]
+        )
+    
+    async def get_version_records(
+        self,
+        id: str,
+        version_number: int,
+        user: User,
+        db: AsyncSession,
+        page: int = 1,
+        page_size: int = 10
+    ):
+        dataset = await self._get_owned_dataset(id, user, db)
+        
+        version = await DatasetVersion.get_for_dataset(str(dataset.id), version_number, db)
+        if not version:
+            raise NotFoundException("Version not found")
+        
+        page = max(1, page)
+        page_size = min(max(1, page_size), 100)
+        records = await RecordVersion.read_version(db, dataset, version, page, page_size)
+        
+        # row_count is kept exact by the write paths, so the version total needs no count query
+        total_page = math.ceil(version.row_count / page_size)
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message="successfully fetched version records",
+            data={
+                "version": version.to_dict(),
+                "records": [dict(record) for record in records],
+                "meta": {
+                    "page": page,
+                    "page_size": page_size,
+                    "total": version.row_count,
+                    "total_page": total_page,
+                    "has_next_page": total_page > page,
+                    "has_prev_page": page > 1
+                }
+            }
+        )
     
     async def export_dataset(
         self,
@@ -198,11 +1201,9 @@ class DatasetService():
         if dataset.user_id != user.id:
             raise ForbiddenException("File not yours")
         
-        records = await Record.get_all_by_dataset(dataset_id, db)
-        
-        rows = [record.data for record in records]
+        self._require_settled_encoding(dataset)
         
-        df = pd.DataFrame(rows)
+        df = await get_record_storage(dataset.storage).export_frame(db, dataset)
         
         filename = dataset.name.split(".")[0]
         if format == "csv":
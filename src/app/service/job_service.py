@@ -0,0 +1,112 @@
+from fastapi import status, BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Any, Awaitable, Callable
+from uuid import UUID, uuid4
+import structlog
+
+from app.model.task import Task
+from app.model.user import User
+from app.core.db.database import async_session
+from app.core.exceptions.http_exceptions import BadRequestException, NotFoundException, ForbiddenException
+from app.core.response import response_builder
+from app.core.utils.helper import is_valid_uuid
+
+logger = structlog.get_logger(__name__)
+
+ProgressReporter = Callable[[dict[str, Any]], Awaitable[None]]
+
+
+class JobService:
+    """Long running dataset operations, tracked in the tasks table.
+
+    Jobs run as background tasks after the response is sent, each step on
+    its own session so progress is visible while the job runs.
+    """
+    async def create_job(
+        self,
+        db: AsyncSession,
+        user: User,
+        kind: str,
+        dataset_id: UUID | None = None,
+        progress: dict[str, Any] | None = None
+    ) -> Task:
+        return await Task.create({
+            "job_id": uuid4(),
+            "status": Task.PENDING,
+            "kind": kind,
+            "user_id": user.id,
+            "dataset_id": dataset_id,
+            "progress": progress
+        }, db)
+    
+    async def start(
+        self,
+        db: AsyncSession,
+        background_task: BackgroundTasks,
+        task: Task,
+        work: Callable[[ProgressReporter], Awaitable[dict[str, Any]]]
+    ) -> None:
+        """Commit the request transaction, then schedule `work` for `task`.
+
+        Background tasks run before the request session commits, so a job
+        scheduled without this would not see its task row or anything the
+        request wrote for it, and would wait on the row locks it holds.
+        """
+        await db.commit()
+        background_task.add_task(self.run, task.job_id, work)
+    
+    async def _update_job(self, job_id: UUID, **changes: Any) -> None:
+        async with async_session() as session:
+            task = await Task.get_by_unique(key="job_id", value=job_id, db=session)
+            if not task:
+                raise RuntimeError(f"Job {job_id} has no task row")
+            
+            for key, value in changes.items():
+                setattr(task, key, value)
+            await task.save(session)
+            await session.commit()
+    
+    async def run(
+        self,
+        job_id: UUID,
+        work: Callable[[ProgressReporter], Awaitable[dict[str, Any]]]
+    ) -> None:
+        """Run `work`, recording progress, the result and the final status"""
+        async def report(progress: dict[str, Any]) -> None:
+            await self._update_job(job_id, progress=progress)
+        
+        await self._update_job(job_id, status=Task.RUNNING)
+        try:
+            result = await work(report)
+        except Exception as e:
+            logger.error("Job failed", job_id=str(job_id), reason=str(e))
+            await self._update_job(job_id, status=Task.FAILED, result={"error": str(e)})
+            return
+        
+        await self._update_job(job_id, status=Task.COMPLETED, result=result)
+    
+    async def get_job(
+        self,
+        job_id: str,
+        user: User,
+        db: AsyncSession
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(job_id):
+            raise BadRequestException("Invalid job id")
+        
+        task = await Task.get_by_unique(key="job_id", value=job_id, db=db)
+        if not task:
+            raise NotFoundException("Job not found")
+        
+        if task.user_id != user.id:
+            raise ForbiddenException("Job not yours")
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message="successfully fetched job",
+            data=task.to_dict()
+        )
+
+
+job_service = JobService()
@@ -1,19 +1,40 @@
-from fastapi import status
+from fastapi import status, BackgroundTasks
+from fastapi.responses import StreamingResponse
+from sqlalchemy import and_, update
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Any, Literal
+from typing import Any, Literal, AsyncIterator
+from functools import partial
 from uuid import UUID
-from datetime import datetime, timezone
+import re
+import json
+import structlog
+import pandas as pd
+from redis.exceptions import RedisError
 
 
-from app.model.records import Record
+from app.model.records import Record, RecordCodec, JSON_EMPTY
 from app.model.user import User
 from app.model.dataset import Dataset
+from app.model.dataset_version import RecordVersion
+from app.model.dataset_change import DatasetChange
+from app.core.db.database import async_session
+from app.core.db.diagnostics import QueryDiagnostics
 from app.core.exceptions.http_exceptions import ForbiddenException, NotFoundException, BadRequestException, ConflictException
 from app.repositories.record_repository import record_repository
+from app.repositories.profile_repository import profile_repository
+from app.repositories.record_storage import get_record_storage, JsonbRecordStorage
+from app.repositories.expressions import Expression
 from app.core.response import response_builder
 from app.core.utils.helper import is_valid_uuid
+from app.core.utils.cache import get_cached_json, set_cached_json
+from app.core.utils.counters import queue_row_count, take_row_count_deltas, restore_row_count_deltas
+from app.core.config import settings
+from app.service.job_service import job_service, ProgressReporter
 
 
+logger = structlog.get_logger(__name__)
+
 
 class RecordService:
     async def _validate_ownership(
@@ -22,13 +43,136 @@ class RecordService:
         user_id: UUID,
         db: AsyncSession
     ) -> Dataset:
-        dataset = await Dataset.get_by_id(id=dataset_id, db=db)
+        dataset = await Dataset.get_for_records(id=dataset_id, db=db)
         if not dataset:
             raise NotFoundException("Dataset not found")
         if dataset.user_id != user_id:
             raise ForbiddenException("Dataset not yours")
+        # rows are in mixed encodings until the re-encode job finishes
+        if dataset.encoding_target:
+            raise ConflictException("The records of this dataset are being re-encoded, retry once the job finishes")
         
         return dataset
+    
+    def _require_row_storage(self, dataset: Dataset) -> None:
+        if dataset.storage != JsonbRecordStorage.name:
+            raise BadRequestException(f"Operation not supported for {dataset.storage} datasets")
+    
+    def _require_columns(self, dataset: Dataset, *names: str | None) -> None:
+        for name in names:
+            if name and name not in dataset.data_schema:
+                raise BadRequestException(f"Unknown column: {name}")
+    
+    def _resolve_columns(self, columns: str | None, dataset: Dataset) -> list[str] | None:
+        projected_columns, reason = record_repository.resolve_columns(columns, dataset.data_schema)
+        if reason:
+            raise BadRequestException(reason)
+        
+        return projected_columns
+    
+    def _record_dict(self, record: Record, codec: RecordCodec) -> dict[str, Any]:
+        return {**record.to_dict(), "data": codec.decode(record.data)}
+    
+    async def _refresh_derived(self, dataset: Dataset, db: AsyncSession, rows: list[dict[str, Any]]) -> None:
+        """Recompute the derived columns of rows just written, updating each row's data in place.
+
+        `rows` hold the id and the keyed `data` of each record. Expressions
+        that translate to SQL are applied in one UPDATE; the rest run on a
+        pandas frame of the rows and are patched back.
+        """
+        if not dataset.derived_columns or not rows:
+            return
+        
+        codec = RecordCodec.for_dataset(dataset)
+        base = {col: kind for col, kind in dataset.data_schema.items() if col not in dataset.derived_columns}
+        expressions = {name: Expression(source, base) for name, source in dataset.derived_columns.items()}
+        by_id = {str(row["id"]): row["data"] for row in rows}
+        
+        in_sql = [name for name, expression in expressions.items() if expression.translatable]
+        if in_sql:
+            data = Record.data
+            for name in in_sql:
+                data = codec.set_value(name, expressions[name].to_sql(codec), data)
+            
+            result = await db.execute(
+                update(Record)
+                .where(Record.dataset_id == dataset.id, Record.id.in_([row["id"] for row in rows]))
+                .values(data=data)
+                .returning(Record.id, codec.as_object(in_sql).label("derived"))
+                .execution_options(synchronize_session=False)
+            )
+            for row in result.mappings().all():
+                by_id[str(row["id"])].update(row["derived"])
+        
+        in_pandas = [name for name, expression in expressions.items() if not expression.translatable]
+        if in_pandas:
+            frame = pd.DataFrame([row["data"] for row in rows])
+            values = {name: expressions[name].evaluate(frame) for name in in_pandas}
+            patches = {
+                str(row["id"]): {name: values[name][i] for name in in_pandas}
+                for i, row in enumerate(rows)
+            }
+            await Record.patch_records(db, dataset.id, patches, codec)
+            for record_id, patch in patches.items():
+                by_id[record_id].update(patch)
+    
+    async def _apply_write(
+        self,
+        dataset: Dataset,
+        db: AsyncSession,
+        added: list[dict[str, Any]] | None = None,
+        removed: list[dict[str, Any]] | None = None,
+        row_delta: int = 0
+    ) -> None:
+        """Fold a row write into the dataset's stats and row_count with one UPDATE"""
+        stats = await dataset.load_column_stats(db, for_update=True)
+        stats = self._merge_column_stats(stats, added, removed)
+        await self._commit_write(dataset, db, stats, row_delta)
+    
+    def _merge_column_stats(
+        self,
+        stats: dict[str, Any] | None,
+        added: list[dict[str, Any]] | None = None,
+        removed: list[dict[str, Any]] | None = None
+    ) -> dict[str, Any] | None:
+        stats = profile_repository.apply_rows(stats, removed or [], sign=-1)
+        return profile_repository.apply_rows(stats, added or [], sign=1)
+    
+    async def _commit_write(
+        self,
+        dataset: Dataset,
+        db: AsyncSession,
+        stats: dict[str, Any] | None,
+        row_delta: int = 0
+    ) -> None:
+        if row_delta and settings.ROW_COUNT_BUFFERING:
+            queue_row_count(db, dataset.id, row_delta)
+            row_delta = 0
+            # nothing else to save: the row lock taken with the stats already
+            # orders the change log, so the dataset row is left untouched
+            if stats is None:
+                return
+        
+        await dataset.apply_write(db, row_delta=row_delta, column_stats=stats)
+    
+    async def fold_row_counts(self) -> None:
+        """Move buffered row_count deltas from Redis into postgres"""
+        try:
+            deltas = await take_row_count_deltas()
+        except (RuntimeError, RedisError) as e:
+            logger.warning("Row count fold skipped", error=str(e))
+            return
+        
+        try:
+            async with async_session() as session:
+                await Dataset.apply_row_count_deltas(session, deltas)
+                await session.commit()
+        except Exception as e:
+            logger.error("Row count fold failed", reason=str(e))
+            try:
+                await restore_row_count_deltas(deltas)
+            except (RuntimeError, RedisError) as e:
+                logger.error("Row count deltas lost", deltas=deltas, reason=str(e))
         
     async def create_record(
         self,
@@ -43,22 +187,102 @@ class RecordService:
         
         # Validate if dataset belongs to the user
         dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
         
-        is_valid_column, reason = record_repository.validate_record_payload(record_data["data"], dataset.data_schema)
+        is_valid_column, reason = record_repository.validate_record_payload(
+            record_data["data"], dataset.data_schema, read_only=dataset.derived_columns or ()
+        )
         if not is_valid_column:
             raise BadRequestException(reason)
             
-        record = await Record.create({"dataset_id": dataset_id, "data": record_data}, db)
-        dataset.row_count += 1
-        await dataset.save(db);
+        codec = RecordCodec.for_dataset(dataset)
+        data = dict(record_data["data"])
+        position = await dataset.reserve_positions(db, 1)
+        record = await Record.create({"dataset_id": dataset_id, "data": codec.encode(data), "position": position}, db)
+        await self._refresh_derived(dataset, db, [{"id": record.id, "data": data}])
+        await self._apply_write(dataset, db, added=[data], row_delta=1)
+        await DatasetChange.log(db, dataset.id, DatasetChange.INSERT, [record.id])
         
         return response_builder(
             status_code=status.HTTP_201_CREATED,
             status="success",
             message="successfully created a new record",
-            data=record.to_dict()
+            data={**self._record_dict(record, codec), "data": data}
         )
         
+    async def _bulk_items(self, chunks: AsyncIterator[bytes], content_type: str) -> AsyncIterator[tuple[int, Any, str | None]]:
+        """iter_bulk_items with a body that does not parse as a whole reported as a bad request"""
+        try:
+            async for entry in record_repository.iter_bulk_items(chunks, content_type):
+                yield entry
+        except ValueError as e:
+            raise BadRequestException(str(e))
+    
+    # Append many records from a JSON array or an NDJSON stream
+    async def bulk_create_records(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        chunks: AsyncIterator[bytes],
+        content_type: str
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        
+        codec = RecordCodec.for_dataset(dataset)
+        stats = await dataset.load_column_stats(db, for_update=True)
+        batch_size = settings.BULK_INSERT_BATCH_SIZE
+        
+        inserted_ids: list[UUID] = []
+        errors: list[dict[str, Any]] = []
+        batch: list[dict[str, Any]] = []
+        
+        async def flush() -> None:
+            nonlocal stats
+            first_position = await dataset.reserve_positions(db, len(batch))
+            ids = await Record.copy_records(dataset.id, [codec.encode(row) for row in batch], db, first_position)
+            await self._refresh_derived(dataset, db, [{"id": id, "data": row} for id, row in zip(ids, batch)])
+            stats = self._merge_column_stats(stats, added=batch)
+            # the dataset row is locked since the stats were loaded, see DatasetChange
+            await DatasetChange.log(db, dataset.id, DatasetChange.INSERT, ids)
+            inserted_ids.extend(ids)
+            batch.clear()
+        
+        async for index, item, parse_error in self._bulk_items(chunks, content_type):
+            if index >= settings.BULK_INSERT_MAX_ROWS:
+                raise BadRequestException(f"At most {settings.BULK_INSERT_MAX_ROWS} records per request")
+            
+            data, reason = (None, parse_error) if parse_error else record_repository.validate_bulk_item(item, dataset.data_schema, dataset.derived_columns or ())
+            if reason:
+                errors.append({"index": index, "error": reason})
+                continue
+            
+            batch.append(data)
+            if len(batch) >= batch_size:
+                await flush()
+        
+        if batch:
+            await flush()
+        
+        inserted = len(inserted_ids)
+        if inserted:
+            await self._commit_write(dataset, db, stats, row_delta=inserted)
+        
+        return response_builder(
+            status_code=status.HTTP_201_CREATED,
+            status="success",
+            message=f"{inserted} records created, {len(errors)} rejected",
+            data={
+                "inserted": inserted,
+                "rejected": len(errors),
+                "errors": errors
+            }
+        )
+    
     # Get all the records in a dataset, paginated
     async def get_records_for_dataset(
         self,
@@ -66,29 +290,31 @@ class RecordService:
         user: User,
         db: AsyncSession,
         page: int = 1,
-        page_size: int = 10
+        page_size: int = 10,
+        columns: str | None = None
     ):
         if not is_valid_uuid(dataset_id):
             raise BadRequestException("Invalid dataset Id")
 
         # Validate if dataset belongs to the user
-        await self._validate_ownership(dataset_id, user.id, db)
-        
-        records = await Record.get_by(
-            db,
-            {"dataset_id": dataset_id},
-            page,
-            page_size,
-            orderby=["-created_at", "-id"]
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        
+        projected_columns = self._resolve_columns(columns, dataset)
+        
+        records = await get_record_storage(dataset.storage).page(
+            db=db,
+            dataset=dataset,
+            page=page,
+            page_size=page_size,
+            columns=projected_columns
         )
         
-        record_dicts = [record.to_dict() for record in records["data"]]
         return response_builder(
             status_code=status.HTTP_200_OK,
             status="success",
             message="successfully fetched paginated records",
             data={
-                "records": record_dicts,
+                "records": records["records"],
                 "meta": records["meta"]
             }
         )
@@ -96,9 +322,27 @@ class RecordService:
     
     # Get a record by id
         
+    # update a record known only by id, for the original /records/{record_id} route
+    async def update_record_by_id(
+        self,
+        record_id: str,
+        record_data: dict[str, Any],
+        db: AsyncSession,
+        user: User
+    ):
+        if not is_valid_uuid(record_id):
+            raise BadRequestException("Invalid record id")
+        
+        dataset_id = await Record.get_dataset_id(record_id, db)
+        if not dataset_id:
+            raise NotFoundException("Record not found")
+        
+        return await self.update_record(str(dataset_id), record_id, record_data, db, user)
+    
     # update a record
     async def update_record(
         self,
+        dataset_id: str,
         record_id: str,
         record_data: dict[str, Any],
         db: AsyncSession,
@@ -107,25 +351,40 @@ class RecordService:
         if not is_valid_uuid(record_id):
             raise BadRequestException("Invalid record id")
         
-        record = await Record.get_by_id(id=record_id, db=db)
-        if not record:
-            raise NotFoundException("Record not found")
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db=db)
+        self._require_row_storage(dataset)
         
-        dataset = await self._validate_ownership(str(record.dataset_id), user.id, db=db)
+        # the dataset id prunes the lookup to a single records partition
+        record = await Record.get_in_dataset(dataset_id, record_id, db)
+        if not record:
+            raise NotFoundException("Record not found in dataset")
         
-        is_valid_column, reason =  record_repository.validate_record_payload(record_data["data"], dataset.data_schema, allow_partial=True)
+        is_valid_column, reason =  record_repository.validate_record_payload(
+            record_data["data"], dataset.data_schema, allow_partial=True, read_only=dataset.derived_columns or ()
+        )
         if not is_valid_column:
             raise BadRequestException(reason)
         
-        updated_data = { **record.data, **record_data}
+        await RecordVersion.capture(db, dataset, Record.id == record.id)
+        
+        codec = RecordCodec.for_dataset(dataset)
+        current_data = codec.decode(record.data)
+        updated_data = { **current_data, **record_data["data"]}
         
-        record = await record.update(updated_data, db)
+        record = await record.update({"data": codec.encode(updated_data)}, db)
+        await self._refresh_derived(dataset, db, [{"id": record.id, "data": updated_data}])
+        
+        await self._apply_write(dataset, db, added=[updated_data], removed=[current_data])
+        await DatasetChange.log(db, dataset.id, DatasetChange.UPDATE, [record.id])
         
         return response_builder(
             status_code=status.HTTP_200_OK,
             status="success",
             message="successfully update record",
-            data=record.to_dict()
+            data={**self._record_dict(record, codec), "data": updated_data}
         )
         
     async def batch_update(
@@ -139,9 +398,14 @@ class RecordService:
         if not update_data:
             raise BadRequestException("No updates provided")
         
-        # Validate input structure
-        record_ids = []
-        payload_map: dict[str, Any] = {}
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        
+        # Validate input structure and schema before touching any row
+        payload_map: dict[str, dict[str, Any]] = {}
         
         for item in update_data:
             record_id = item.get("id")
@@ -153,54 +417,41 @@ class RecordService:
             if not isinstance(data, dict):
                 raise BadRequestException(f"Invalid data payload for  record: {record_id}")
             
-            record_ids.append(record_id)
-            payload_map[record_id] = data
-            
-        # Bulk fetch records
-        records = await Record.bulk_get_by_ids(record_ids, db)
-        
-        if len(records) != len(record_ids):
-            found_ids = {str(r.id) for r in records}
-            missing = set(record_ids) - found_ids
-            raise NotFoundException(f"Records not found: {list(missing)}")
-        
-        dataset_ids = {str(r.dataset_id) for r in records}
-        
-        datasets = await Dataset.bulk_get_by_ids(list(dataset_ids), db)
-        
-        dataset_map = {str(d.id): d for d in datasets}
-        
-        # Validate Dataset Ownership
-        for dataset_id, dataset in dataset_map.items():
-            if dataset.user_id != user.id:
-                raise ForbiddenException("Dataset Not yours")
-            
-        # Validate Schema And merge updates (in-memory)
-        for record in records:
-            dataset = dataset_map[str(record.dataset_id)]
-            payload = payload_map[str(record.id)]
-            
             is_valid, reason = record_repository.validate_record_payload(
-                payload=payload,
+                payload=data,
                 dataset_schema=dataset.data_schema,
-                allow_partial=True
+                allow_partial=True,
+                read_only=dataset.derived_columns or ()
             )
-            
             if not is_valid:
                 raise BadRequestException(
-                    f"Schema validation failed for record {record.id}: {reason}"
+                    f"Schema validation failed for record {record_id}: {reason}"
                 )
-                
-            record.data = {**record.data, **payload}
-            record.updated_at = datetime.now(timezone.utc)
+            
+            payload_map[str(record_id)] = {**payload_map.get(str(record_id), {}), **data}
+        
+        await RecordVersion.capture(db, dataset, Record.id.in_(list(payload_map)))
+        
+        # One UPDATE ... FROM (VALUES) per chunk, scoped to the dataset
+        records = await Record.patch_records(
+            db, dataset.id, payload_map, codec=RecordCodec.for_dataset(dataset)
+        )
         
-        await Record.bulk_save(records, db)
+        if len(records) != len(payload_map):
+            found_ids = {str(r["id"]) for r in records}
+            missing = set(payload_map) - found_ids
+            raise NotFoundException(f"Records not found: {list(missing)}")
+        
+        previous = [r.pop("previous_data") for r in records]
+        await self._refresh_derived(dataset, db, records)
+        await self._apply_write(dataset, db, added=[r["data"] for r in records], removed=previous)
+        await DatasetChange.log(db, dataset.id, DatasetChange.UPDATE, [r["id"] for r in records])
         
         return response_builder(
             status_code=status.HTTP_200_OK,
             status="success",
             message=f"{len(records)} records updated successfully",
-            data=[r.to_dict() for r in records]
+            data=records
         )
         
         
@@ -218,17 +469,18 @@ class RecordService:
         if not is_valid_uuid(dataset_id):
             raise BadRequestException("Invalid dataset Id")
         
-        record = await Record.get_by_id(id=record_id, db=db)
-        if not record:
-            raise NotFoundException("Record not found")
+        dataset = await self._validate_ownership(dataset_id, user.id, db=db)
+        self._require_row_storage(dataset)
         
-        if str(record.dataset_id) != dataset_id:
-            raise ConflictException("Record doesn't belong to dataset")
+        record = await Record.get_in_dataset(dataset_id, record_id, db)
+        if not record:
+            raise NotFoundException("Record not found in dataset")
         
-        dataset = await self._validate_ownership(str(record.dataset_id), user.id, db=db)
+        await RecordVersion.capture(db, dataset, Record.id == record.id)
         
-        # Decrease dataset row count
-        await dataset.update({"row_count": dataset.row_count - 1}, db)
+        codec = RecordCodec.for_dataset(dataset)
+        await self._apply_write(dataset, db, removed=[codec.decode(record.data)], row_delta=-1)
+        await DatasetChange.log(db, dataset.id, DatasetChange.DELETE, [record.id])
         
         await record.delete(db)
         
@@ -237,6 +489,556 @@ class RecordService:
         
         
     
+    def _filter_condition(self, record_filter: dict[str, Any], dataset: Dataset, codec: RecordCodec):
+        reason = record_repository.validate_filter(record_filter["conditions"], dataset.data_schema)
+        if reason:
+            raise BadRequestException(reason)
+        
+        return codec.where(record_filter["conditions"], record_filter.get("match", "all"))
+    
+    async def _delete_rows(
+        self,
+        dataset: Dataset,
+        db: AsyncSession,
+        condition: Any,
+        codec: RecordCodec
+    ) -> int:
+        """Delete the matching rows, folding them out of the stats and logging them"""
+        await RecordVersion.capture(db, dataset, condition)
+        
+        stats = await dataset.load_column_stats(db, for_update=True)
+        deleted_ids: list[UUID] = []
+        async for rows in Record.delete_matching(db, dataset.id, condition, codec):
+            stats = self._merge_column_stats(stats, removed=[row["data"] for row in rows])
+            deleted_ids.extend(row["id"] for row in rows)
+        
+        deleted = len(deleted_ids)
+        if deleted:
+            await self._commit_write(dataset, db, stats, row_delta=-deleted)
+            await DatasetChange.log(db, dataset.id, DatasetChange.DELETE, deleted_ids)
+        
+        return deleted
+    
+    # Delete many records by id or by filter
+    async def bulk_delete_records(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        ids: list[str] | None = None,
+        record_filter: dict[str, Any] | None = None
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        codec = RecordCodec.for_dataset(dataset)
+        
+        if record_filter is not None:
+            condition = self._filter_condition(record_filter, dataset, codec)
+        else:
+            condition = Record.id.in_([str(id) for id in ids or []])
+        
+        deleted = await self._delete_rows(dataset, db, condition, codec)
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message=f"{deleted} records deleted",
+            data={"deleted": deleted}
+        )
+    
+    async def _update_rows(
+        self,
+        dataset: Dataset,
+        db: AsyncSession,
+        condition: Any,
+        patch: Any,
+        codec: RecordCodec
+    ) -> list[dict[str, Any]]:
+        """Merge a patch into the matching rows, then refresh derived columns, stats and the change log"""
+        await RecordVersion.capture(db, dataset, condition)
+        rows = await Record.update_matching(db, dataset.id, condition, patch, codec)
+        await self._refresh_derived(dataset, db, rows)
+        await self._apply_write(
+            dataset, db,
+            added=[row["data"] for row in rows],
+            removed=[row["previous_data"] for row in rows]
+        )
+        await DatasetChange.log(db, dataset.id, DatasetChange.UPDATE, [row["id"] for row in rows])
+        return rows
+    
+    # Set columns on every record matching a filter
+    async def update_by_filter(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        record_filter: dict[str, Any],
+        patch: dict[str, Any],
+        background_task: BackgroundTasks,
+        dry_run: bool = False
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        codec = RecordCodec.for_dataset(dataset)
+        
+        condition = self._filter_condition(record_filter, dataset, codec)
+        is_valid, reason = record_repository.validate_record_payload(
+            patch, dataset.data_schema, allow_partial=True, read_only=dataset.derived_columns or ()
+        )
+        if not is_valid:
+            raise BadRequestException(reason)
+        
+        matched = await Record.count_matching(db, dataset.id, condition)
+        response_data: dict[str, Any] = {"matched": matched, "updated": 0, "dry_run": dry_run}
+        
+        if dry_run:
+            message = f"{matched} records match"
+        
+        elif matched > settings.BACKGROUND_JOB_ROW_THRESHOLD:
+            task = await job_service.create_job(
+                db, user, "update_by_filter", dataset.id, {"processed": 0, "total": matched}
+            )
+            await job_service.start(
+                db, background_task, task,
+                partial(self._update_by_filter_job, dataset.id, record_filter, patch, matched)
+            )
+            response_data["job"] = task.to_dict()
+            message = f"{matched} records will be updated in the background"
+        
+        else:
+            rows = await self._update_rows(dataset, db, condition, patch, codec)
+            response_data["updated"] = len(rows)
+            message = f"{len(rows)} records updated"
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message=message,
+            data=response_data
+        )
+    
+    async def _update_by_filter_job(
+        self,
+        dataset_id: UUID,
+        record_filter: dict[str, Any],
+        patch: dict[str, Any],
+        matched: int,
+        report: ProgressReporter
+    ) -> dict[str, Any]:
+        """Apply an update by filter in keyset chunks, one transaction per chunk"""
+        updated = 0
+        after = None
+        
+        while True:
+            async with async_session() as session:
+                dataset = await Dataset.get_by_id(str(dataset_id), session)
+                if not dataset:
+                    raise RuntimeError("Dataset no longer exists")
+                
+                codec = RecordCodec.for_dataset(dataset)
+                condition = codec.where(record_filter["conditions"], record_filter.get("match", "all"))
+                
+                ids = await Record.matching_ids(
+                    session, dataset.id, condition, after, settings.BACKGROUND_JOB_BATCH_SIZE
+                )
+                if not ids:
+                    break
+                
+                chunk = and_(condition, Record.id.in_(ids))
+                rows = await self._update_rows(dataset, session, chunk, patch, codec)
+                await session.commit()
+            
+            updated += len(rows)
+            after = ids[-1]
+            await report({"processed": updated, "total": matched})
+        
+        return {"matched": matched, "updated": updated}
+    
+    def _replace_columns(self, columns: list[str] | None, dataset: Dataset) -> list[str]:
+        derived = dataset.derived_columns or {}
+        if columns is None:
+            return [col for col, kind in dataset.data_schema.items() if kind == "string" and col not in derived]
+        
+        for col in columns:
+            if col not in dataset.data_schema:
+                raise BadRequestException(f"Unknown column: {col}")
+            if col in derived:
+                raise BadRequestException(f"Column {col} is derived and cannot be edited")
+            if dataset.data_schema[col] != "string":
+                raise BadRequestException(f"Column {col} is not a string column")
+        
+        return columns
+    
+    def _replace_patch(self, codec: RecordCodec, columns: list[str], options: dict[str, Any]) -> Any:
+        pattern, replacement = options["find"], options["replace"]
+        if not options["regex"]:
+            pattern = re.sub(r"(\W)", r"\\\1", pattern)
+            replacement = replacement.replace("\\", "\\\\")
+        
+        flags = "g" if options["case_sensitive"] else "gi"
+        return codec.replace_patch(columns, pattern, replacement, flags)
+    
+    # Replace text in the string columns of every record
+    async def find_replace(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        options: dict[str, Any],
+        background_task: BackgroundTasks
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        codec = RecordCodec.for_dataset(dataset)
+        
+        columns = self._replace_columns(options.get("columns"), dataset)
+        if not columns:
+            raise BadRequestException("Dataset has no string columns to search")
+        
+        patch = self._replace_patch(codec, columns, options)
+        try:
+            async with db.begin_nested():
+                matched, cells = await Record.count_patch(db, dataset.id, patch)
+        except DBAPIError:
+            raise BadRequestException("Invalid regular expression or replacement")
+        
+        response_data: dict[str, Any] = {"matched": matched, "cells": cells, "updated": 0, "preview": options["preview"]}
+        
+        if options["preview"]:
+            response_data["samples"] = await Record.sample_patches(db, dataset.id, patch, codec, columns)
+            message = f"{cells} cells in {matched} records match"
+        
+        elif matched > settings.BACKGROUND_JOB_ROW_THRESHOLD:
+            task = await job_service.create_job(
+                db, user, "find_replace", dataset.id, {"processed": 0, "total": matched}
+            )
+            await job_service.start(
+                db, background_task, task,
+                partial(self._find_replace_job, dataset.id, columns, options, matched)
+            )
+            response_data["job"] = task.to_dict()
+            message = f"{cells} cells in {matched} records will be replaced in the background"
+        
+        else:
+            rows = await self._update_rows(dataset, db, patch != JSON_EMPTY, patch, codec)
+            response_data["updated"] = len(rows)
+            message = f"{cells} cells replaced in {len(rows)} records"
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message=message,
+            data=response_data
+        )
+    
+    async def _find_replace_job(
+        self,
+        dataset_id: UUID,
+        columns: list[str],
+        options: dict[str, Any],
+        matched: int,
+        report: ProgressReporter
+    ) -> dict[str, Any]:
+        """Apply a find and replace in keyset chunks, one transaction per chunk.
+
+        Replaced text can match again, so chunks advance by id rather than
+        waiting for the rows to stop matching.
+        """
+        updated = 0
+        after = None
+        
+        while True:
+            async with async_session() as session:
+                dataset = await Dataset.get_by_id(str(dataset_id), session)
+                if not dataset:
+                    raise RuntimeError("Dataset no longer exists")
+                
+                codec = RecordCodec.for_dataset(dataset)
+                patch = self._replace_patch(codec, columns, options)
+                condition = patch != JSON_EMPTY
+                
+                ids = await Record.matching_ids(
+                    session, dataset.id, condition, after, settings.BACKGROUND_JOB_BATCH_SIZE
+                )
+                if not ids:
+                    break
+                
+                rows = await self._update_rows(dataset, session, and_(condition, Record.id.in_(ids)), patch, codec)
+                await session.commit()
+            
+            updated += len(rows)
+            after = ids[-1]
+            await report({"processed": updated, "total": matched})
+        
+        return {"matched": matched, "updated": updated}
+    
+    # Group the records that share the same values
+    async def find_duplicates(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        columns: str | None = None,
+        limit: int = 100
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        codec = RecordCodec.for_dataset(dataset)
+        key_columns = self._resolve_columns(columns, dataset) or list(dataset.data_schema)
+        
+        group_count, surplus, groups = await Record.duplicate_groups(
+            db, dataset.id, codec.row_hash(key_columns), limit=limit
+        )
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message=f"{group_count} duplicate groups found",
+            data={
+                "columns": key_columns,
+                "groups": group_count,
+                "duplicates": surplus,
+                "items": [dict(group) for group in groups]
+            }
+        )
+    
+    # Delete all but the oldest record of each duplicate group
+    async def remove_duplicates(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        columns: str | None = None
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        codec = RecordCodec.for_dataset(dataset)
+        key_columns = self._resolve_columns(columns, dataset) or list(dataset.data_schema)
+        
+        condition = Record.duplicate_condition(dataset.id, codec.row_hash(key_columns))
+        deleted = await self._delete_rows(dataset, db, condition, codec)
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message=f"{deleted} duplicate records deleted",
+            data={"deleted": deleted}
+        )
+    
+    # Stream every record as newline delimited json
+    async def stream_records(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        key: str | None = None,
+        value: str | None = None,
+        after: str | None = None,
+        columns: str | None = None,
+        batch_size: int = 1000
+    ) -> StreamingResponse:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        if after and not is_valid_uuid(after):
+            raise BadRequestException("Invalid resume id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_columns(dataset, key)
+        projected_columns = self._resolve_columns(columns, dataset)
+        storage = get_record_storage(dataset.storage)
+        
+        async def generate() -> AsyncIterator[str]:
+            # The request session is closed once the endpoint returns, so the
+            # cursor lives on its own session for the lifetime of the response
+            async with async_session() as session:
+                async for batch in storage.stream(
+                    db=session,
+                    dataset=dataset,
+                    key=key,
+                    value=value,
+                    after=after,
+                    columns=projected_columns,
+                    batch_size=batch_size
+                ):
+                    yield "".join(json.dumps(dict(row), default=str) + "\n" for row in batch)
+        
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+    
+    # Random or stratified sample of records
+    async def sample_records(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        n: int = 100,
+        method: Literal["system", "bernoulli", "reservoir", "stratified"] = "bernoulli",
+        column: str | None = None,
+        seed: int | None = None,
+        columns: str | None = None
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        projected_columns = self._resolve_columns(columns, dataset)
+        
+        if method == "stratified":
+            if not column:
+                raise BadRequestException("Stratified sampling requires a column")
+            if column not in dataset.data_schema:
+                raise BadRequestException(f"Unknown column: {column}")
+        
+        records = await Record.sample_records(
+            db=db,
+            dataset_id=dataset_id,
+            n=n,
+            method=method,
+            row_count=dataset.row_count,
+            column=column,
+            seed=seed,
+            columns=projected_columns,
+            codec=RecordCodec.for_dataset(dataset)
+        )
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message="successfully sampled records",
+            data={
+                "method": method,
+                "requested": n,
+                "returned": len(records),
+                "records": [dict(record) for record in records]
+            }
+        )
+    
+    # A block of rows by position and of columns by index, for grid clients
+    async def get_viewport(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        start: int,
+        end: int,
+        column_start: int = 0,
+        column_end: int | None = None
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        if end <= start:
+            raise BadRequestException("end must be greater than start")
+        if end - start > settings.VIEWPORT_MAX_ROWS:
+            raise BadRequestException(f"At most {settings.VIEWPORT_MAX_ROWS} rows per viewport")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        self._require_row_storage(dataset)
+        
+        columns = dataset.ordered_columns[column_start:column_end]
+        if not columns:
+            raise BadRequestException("Column range selects no columns")
+        
+        rows = await Record.viewport(db, dataset.id, start, end, columns, RecordCodec.for_dataset(dataset))
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message="successfully fetched viewport",
+            data={
+                "start": start,
+                "end": end,
+                "next_position": dataset.next_position,
+                "columns": columns,
+                "rows": [dict(row) for row in rows]
+            }
+        )
+    
+    # Top distinct values of a column, cached per dataset version
+    async def get_column_values(
+        self,
+        dataset_id: str,
+        column: str,
+        user: User,
+        db: AsyncSession,
+        limit: int = 20,
+        prefix: str | None = None
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        
+        if column not in dataset.data_schema:
+            raise NotFoundException("Column not found")
+        
+        # buffered record writes leave the dataset row alone, the change log
+        # seq still moves with every one of them
+        seq = await DatasetChange.latest_seq(db, dataset.id)
+        cache_key = f"facets:{dataset_id}:{dataset.data_version}:{seq}:{column}:{limit}:{prefix or ''}"
+        values = await get_cached_json(cache_key)
+        if values is None:
+            values = await get_record_storage(dataset.storage).distinct_values(db, dataset, column, limit, prefix)
+            await set_cached_json(cache_key, values)
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message="successfully fetched column values",
+            data={
+                "column": column,
+                "values": values
+            }
+        )
+    
+    # Record changes after a sequence number, for incremental sync
+    async def get_changes(
+        self,
+        dataset_id: str,
+        user: User,
+        db: AsyncSession,
+        since: int = 0,
+        limit: int = 1000,
+        columns: str | None = None
+    ) -> dict[str, Any]:
+        if not is_valid_uuid(dataset_id):
+            raise BadRequestException("Invalid dataset Id")
+        
+        dataset = await self._validate_ownership(dataset_id, user.id, db)
+        projected_columns = self._resolve_columns(columns, dataset)
+        
+        changes = await DatasetChange.changes_since(db, dataset, since, limit + 1, projected_columns)
+        has_more = len(changes) > limit
+        changes = changes[:limit]
+        
+        return response_builder(
+            status_code=status.HTTP_200_OK,
+            status="success",
+            message="successfully fetched dataset changes",
+            data={
+                "changes": [dict(change) for change in changes],
+                "next_since": changes[-1]["seq"] if changes else since,
+                "latest_seq": await DatasetChange.latest_seq(db, dataset.id),
+                "has_more": has_more
+            }
+        )
+    
     async def filter_record_by_column(
         self,
         dataset_id: str,
@@ -247,32 +1049,44 @@ class RecordService:
         page_size: int = 100,
         page: int = 1,
         sort_by: str | None = None,
-        sort_order: Literal["asc", "desc"] = "asc"
+        sort_order: Literal["asc", "desc"] = "asc",
+        columns: str | None = None,
+        debug: bool = False
     ) -> dict[str, Any]: 
         
-        await self._validate_ownership(dataset_id, user.id, db)
+        diagnostics = QueryDiagnostics(debug=debug)
         
-        records = await Record.filter_records(
+        with diagnostics.phase("ownership"):
+            dataset = await self._validate_ownership(dataset_id, user.id, db)
+        
+        self._require_columns(dataset, key, sort_by)
+        projected_columns = self._resolve_columns(columns, dataset)
+        
+        records = await get_record_storage(dataset.storage).page(
             key=key, 
             value=value, 
             db=db, 
-            dataset_id=dataset_id, 
+            dataset=dataset, 
             page_size=page_size, 
             page=page,
             sort_by=sort_by,
-            sort_order=sort_order
+            sort_order=sort_order,
+            columns=projected_columns,
+            diagnostics=diagnostics
         )
         
-        record_dicts = [record.to_dict() for record in records["records"]]
+        response_data: dict[str, Any] = {
+            "records": records["records"],
+            "meta": records["meta"]
+        }
+        if debug:
+            response_data["debug"] = diagnostics.to_dict()
         
         return response_builder(
             status_code=status.HTTP_200_OK,
             status="success",
             message="successfully filter records by column",
-            data={
-                "records": record_dicts,
-                "meta": records["meta"]
-            }
+            data=response_data
         )
 
 
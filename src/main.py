@@ -1,4 +1,5 @@
 from contextlib import asynccontextmanager
+import asyncio
 
 from fastapi import FastAPI, status
 from fastapi.requests import Request
@@ -13,10 +14,17 @@ from app.core.config import settings
 from app.core.health import check_database_health, check_redis_health
 from app.core.db.database import async_get_db, async_engine
 from app.core.redis import  get_redis, init_redis
+from app.service.dataset_service import dataset_service
+from app.service.record_service import record_service
 
 
 logger = structlog.get_logger(__name__)
 
+async def fold_row_counts_periodically():
+    while True:
+        await asyncio.sleep(settings.ROW_COUNT_FLUSH_SECONDS)
+        await record_service.fold_row_counts()
+
 @asynccontextmanager
 async def fastapi_lifespan(app: FastAPI):
     
@@ -33,9 +41,21 @@ async def fastapi_lifespan(app: FastAPI):
             logger.info("✅ Redis working properly")
     except RuntimeError as e:
         logger.exception(f"❌ {str(e)}")
+    
+    # datasets deleted right before a restart still have rows to purge
+    purge_task = asyncio.create_task(dataset_service.purge_deleted_datasets())
+    
+    fold_task = None
+    if settings.ROW_COUNT_BUFFERING:
+        fold_task = asyncio.create_task(fold_row_counts_periodically())
         
     yield
     
+    purge_task.cancel()
+    if fold_task:
+        fold_task.cancel()
+        await record_service.fold_row_counts()
+    
     await async_engine.dispose()
     logger.info("✅ successfully shutdown postgres engine")
     
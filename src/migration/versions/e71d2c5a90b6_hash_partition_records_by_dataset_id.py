@@ -0,0 +1,78 @@
+"""hash partition records by dataset_id
+
+Revision ID: e71d2c5a90b6
+Revises: 9b3f27c8e1a4
+Create Date: 2026-10-19 12:21:54.873016
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e71d2c5a90b6'
+down_revision: Union[str, Sequence[str], None] = '9b3f27c8e1a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Changing the modulus later means rebuilding the table, pick it for the expected size
+PARTITIONS = 16
+
+COLUMNS = "dataset_id, data, id, created_at, updated_at, is_active"
+
+
+def _create_records_table(partitioned: bool) -> None:
+    op.execute(
+        f"""
+        CREATE TABLE records (
+            dataset_id UUID NOT NULL REFERENCES datasets (id) ON DELETE CASCADE,
+            data JSONB NOT NULL,
+            id UUID NOT NULL,
+            created_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            updated_at TIMESTAMP WITH TIME ZONE NOT NULL,
+            is_active BOOLEAN NOT NULL,
+            CONSTRAINT records_pkey PRIMARY KEY ({"dataset_id, id" if partitioned else "id"})
+        ){" PARTITION BY HASH (dataset_id)" if partitioned else ""}
+        """
+    )
+
+
+def _rename_existing_records_table() -> None:
+    op.execute("ALTER TABLE records RENAME TO records_old")
+    op.execute("ALTER TABLE records_old RENAME CONSTRAINT records_pkey TO records_old_pkey")
+    op.execute("ALTER INDEX idx_records_data_gin RENAME TO idx_records_old_data_gin")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _rename_existing_records_table()
+    op.execute("DROP INDEX IF EXISTS ix_records_dataset_id")
+    
+    _create_records_table(partitioned=True)
+    for remainder in range(PARTITIONS):
+        op.execute(
+            f"CREATE TABLE records_p{remainder} PARTITION OF records "
+            f"FOR VALUES WITH (MODULUS {PARTITIONS}, REMAINDER {remainder})"
+        )
+    
+    op.execute(f"INSERT INTO records ({COLUMNS}) SELECT {COLUMNS} FROM records_old")
+    op.execute("DROP TABLE records_old")
+    
+    # Indexes on the parent cascade to every partition
+    op.execute("CREATE INDEX idx_records_data_gin ON records USING gin (data)")
+    op.execute("CREATE INDEX ix_records_id ON records (id)")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP INDEX IF EXISTS ix_records_id")
+    _rename_existing_records_table()
+    
+    _create_records_table(partitioned=False)
+    op.execute(f"INSERT INTO records ({COLUMNS}) SELECT {COLUMNS} FROM records_old")
+    op.execute("DROP TABLE records_old")
+    
+    op.execute("CREATE INDEX idx_records_data_gin ON records USING gin (data)")
+    op.execute("CREATE INDEX ix_records_dataset_id ON records (dataset_id)")
@@ -0,0 +1,139 @@
+"""Parsing and checking of bulk record bodies (JSON arrays and NDJSON streams)."""
+import json
+
+import pytest
+
+from app.core.exceptions.http_exceptions import BadRequestException
+from app.repositories.record_repository import record_repository
+from app.service.record_service import record_service
+
+SCHEMA = {"name": "string", "age": "integer", "score": "number", "active": "boolean"}
+NDJSON = "application/x-ndjson"
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+async def stream(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+async def parse(content_type: str, *chunks: bytes) -> list[tuple[int, object, str | None]]:
+    return [item async for item in record_repository.iter_bulk_items(stream(*chunks), content_type)]
+
+
+def line(data: dict) -> bytes:
+    return json.dumps({"data": data}).encode() + b"\n"
+
+
+@pytest.mark.anyio
+async def test_ndjson_lines_split_across_chunks():
+    body = line({"name": "Ada"}) + line({"name": "Ünïcode"}) + line({"name": "Cy"})
+    # every possible split point, including inside a multi-byte character
+    for cut in range(1, len(body)):
+        items = await parse(NDJSON, body[:cut], body[cut:])
+        assert [item["data"]["name"] for _, item, _ in items] == ["Ada", "Ünïcode", "Cy"]
+        assert [index for index, _, _ in items] == [0, 1, 2]
+
+
+@pytest.mark.anyio
+async def test_ndjson_one_byte_chunks():
+    body = line({"name": "Ada"}) + line({"name": "Bo"})
+    items = await parse(NDJSON, *[body[i:i+1] for i in range(len(body))])
+    assert [item["data"]["name"] for _, item, _ in items] == ["Ada", "Bo"]
+
+
+@pytest.mark.anyio
+async def test_ndjson_skips_blank_lines_without_using_an_index():
+    items = await parse(NDJSON, b"\n" + line({"name": "Ada"}) + b"   \n\r\n" + line({"name": "Bo"}) + b"\n")
+    assert [(index, item["data"]["name"]) for index, item, _ in items] == [(0, "Ada"), (1, "Bo")]
+
+
+@pytest.mark.anyio
+async def test_ndjson_trailing_line_without_newline():
+    items = await parse(NDJSON, line({"name": "Ada"}), b'{"data": {"name": "Bo"}}')
+    assert [(index, item["data"]["name"]) for index, item, _ in items] == [(0, "Ada"), (1, "Bo")]
+
+
+@pytest.mark.anyio
+async def test_ndjson_crlf_line_endings():
+    items = await parse(NDJSON, b'{"data": {"name": "Ada"}}\r\n{"data": {"name": "Bo"}}\r\n')
+    assert [item["data"]["name"] for _, item, _ in items] == ["Ada", "Bo"]
+
+
+@pytest.mark.anyio
+async def test_ndjson_invalid_line_mid_stream_is_reported_and_parsing_goes_on():
+    items = await parse(NDJSON, line({"name": "Ada"}), b'{"data": {"name": \n', line({"name": "Cy"}))
+    assert items[0][2] is None
+    assert items[1] == (1, None, "Invalid JSON")
+    assert items[2][0] == 2 and items[2][1]["data"]["name"] == "Cy"
+
+
+@pytest.mark.anyio
+async def test_ndjson_invalid_trailing_line():
+    items = await parse(NDJSON, line({"name": "Ada"}), b"{not json")
+    assert items[-1] == (1, None, "Invalid JSON")
+
+
+@pytest.mark.anyio
+async def test_ndjson_content_type_parameters_are_ignored():
+    items = await parse("application/ndjson; charset=utf-8", line({"name": "Ada"}))
+    assert len(items) == 1
+
+
+@pytest.mark.anyio
+async def test_json_array_read_across_chunks():
+    body = json.dumps([{"data": {"name": "Ada"}}, {"data": {"name": "Bo"}}]).encode()
+    items = await parse("application/json", body[:7], body[7:])
+    assert [(index, item["data"]["name"], error) for index, item, error in items] == [(0, "Ada", None), (1, "Bo", None)]
+
+
+@pytest.mark.anyio
+async def test_json_body_that_is_not_an_array_is_rejected():
+    with pytest.raises(ValueError):
+        await parse("application/json", b'{"data": {"name": "Ada"}}')
+
+
+@pytest.mark.anyio
+async def test_invalid_json_array_is_rejected():
+    with pytest.raises(ValueError):
+        await parse("application/json", b'[{"data": ')
+
+
+def test_validate_bulk_item_accepts_a_record_body():
+    data = {"name": "Ada", "age": 36, "score": 9.5, "active": True}
+    assert record_repository.validate_bulk_item({"data": data}, SCHEMA) == (data, None)
+
+
+@pytest.mark.parametrize("item", [None, [], "text", {}, {"data": None}, {"data": ["Ada"]}])
+def test_validate_bulk_item_rejects_other_shapes(item):
+    assert record_repository.validate_bulk_item(item, SCHEMA) == (None, "Expected an object with a data object")
+
+
+@pytest.mark.parametrize("data, reason", [
+    ({"name": "Ada", "age": 36, "score": 1}, "Missing required fields"),
+    ({"name": "Ada", "age": 36, "score": 1, "active": True, "extra": 1}, "Unknown fields"),
+    ({"name": "Ada", "age": 36.5, "score": 1, "active": True}, "Values do not match the column type"),
+    ({"name": "Ada", "age": True, "score": 1, "active": True}, "Values do not match the column type"),
+    ({"name": "Ada", "age": 36, "score": 1, "active": "yes"}, "Values do not match the column type"),
+])
+def test_validate_bulk_item_applies_the_record_rules(data, reason):
+    data_out, error = record_repository.validate_bulk_item({"data": data}, SCHEMA)
+    assert data_out is None
+    assert error.startswith(reason)
+
+
+def test_validate_bulk_item_rejects_derived_columns():
+    data = {"name": "Ada", "age": 36, "score": 1, "active": True}
+    _, error = record_repository.validate_bulk_item({"data": data}, SCHEMA, read_only=("score",))
+    assert error.startswith("Derived fields can not be written")
+
+
+@pytest.mark.anyio
+async def test_unparsable_body_is_a_bad_request():
+    items = record_service._bulk_items(stream(b'{"data": {}}'), "application/json")
+    with pytest.raises(BadRequestException):
+        [item async for item in items]
@@ -0,0 +1,125 @@
+"""Column statistics merged incrementally agree with a profile built from scratch."""
+import pandas as pd
+import pytest
+
+from app.repositories.profile_repository import profile_repository
+
+ROWS = [
+    {"city": "Oslo", "temp": "4.5", "code": 1},
+    {"city": "Lima", "temp": "19", "code": None},
+    {"city": "", "temp": "n/a", "code": 3},
+    {"city": "Oslo", "temp": None, "code": 1},
+    {"city": " Rome ", "temp": "-2", "code": 2.5},
+]
+
+
+def empty_profile() -> dict:
+    return {col: profile_repository.empty_column() for col in ROWS[0]}
+
+
+def comparable(profile: dict) -> dict:
+    # rendered, so top values compare in count order and the sketch as its estimate
+    return profile_repository.render(profile)
+
+
+def many_rows(count: int) -> list[dict]:
+    return [{**row, "city": f"{row['city']}{i % 7}"} for i in range(count) for row in ROWS][:count]
+
+
+def test_profile_of_a_column():
+    stats = profile_repository.build_profile(pd.DataFrame(ROWS, dtype=object))["temp"]
+
+    assert stats["count"] == 4
+    assert stats["null_count"] == 1
+    assert stats["numeric_count"] == 3
+    assert stats["numeric_sum"] == pytest.approx(21.5)
+    assert (stats["numeric_min"], stats["numeric_max"]) == (-2, 19)
+    assert (stats["min"], stats["max"]) == ("-2", "n/a")
+
+
+def test_blank_strings_count_as_null():
+    stats = profile_repository.build_profile(pd.DataFrame(ROWS, dtype=object))["city"]
+    assert (stats["count"], stats["null_count"]) == (4, 1)
+    assert stats["top"] == {"Oslo": 2, "Lima": 1, " Rome ": 1}
+
+
+@pytest.mark.parametrize("count", [len(ROWS), profile_repository.SMALL_DELTA_ROWS + 1, 500])
+def test_applied_rows_match_a_built_profile(count):
+    rows = many_rows(count)
+    built = profile_repository.build_profile(pd.DataFrame(rows, dtype=object))
+
+    assert comparable(profile_repository.apply_rows(empty_profile(), rows)) == comparable(built)
+
+
+def test_small_and_large_deltas_profile_alike():
+    rows = many_rows(profile_repository.SMALL_DELTA_ROWS + 1)
+    small = empty_profile()
+    for start in range(0, len(rows), 8):
+        small = profile_repository.apply_rows(small, rows[start:start + 8])
+
+    assert comparable(small) == comparable(profile_repository.apply_rows(empty_profile(), rows))
+
+
+def test_integers_next_to_nulls_keep_their_text():
+    rows = [{"code": 1}, {"code": None}] * profile_repository.SMALL_DELTA_ROWS
+    profile = profile_repository.apply_rows({"code": profile_repository.empty_column()}, rows)
+    assert profile["code"]["top"] == {"1": profile_repository.SMALL_DELTA_ROWS}
+
+
+def test_removed_rows_are_taken_back_out():
+    profile = profile_repository.apply_rows(empty_profile(), ROWS)
+    profile = profile_repository.apply_rows(profile, ROWS[:2], sign=-1)
+    stats = profile["city"]
+
+    assert (stats["count"], stats["null_count"]) == (2, 1)
+    assert stats["top"] == {"Oslo": 1, " Rome ": 1}
+    assert profile["temp"]["numeric_sum"] == pytest.approx(-2)
+
+
+def test_removing_more_than_was_counted_stops_at_zero():
+    profile = profile_repository.apply_rows(empty_profile(), ROWS[:1])
+    profile = profile_repository.apply_rows(profile, ROWS, sign=-1)
+    assert all(stats["count"] >= 0 and stats["null_count"] >= 0 for stats in profile.values())
+
+
+def test_missing_profile_or_rows_are_left_alone():
+    assert profile_repository.apply_rows(None, ROWS) is None
+    profile = empty_profile()
+    assert profile_repository.apply_rows(profile, []) is profile
+
+
+@pytest.mark.parametrize("distinct", [10, 200, 5000])
+def test_distinct_estimate_is_close(distinct):
+    df = pd.DataFrame({"key": [f"key-{i}" for i in range(distinct)] * 2}, dtype=object)
+    stats = profile_repository.build_profile(df)["key"]
+
+    estimate = profile_repository.render({"key": stats})["key"]["distinct_count"]
+    # 256 registers give a standard error of about 6.5%
+    assert estimate == pytest.approx(distinct, rel=0.2)
+
+
+def test_merged_sketches_estimate_the_union():
+    first = profile_repository.apply_rows({"key": profile_repository.empty_column()}, [{"key": i} for i in range(1000)])
+    both = profile_repository.apply_rows(first, [{"key": i} for i in range(500, 1500)])
+
+    estimate = profile_repository.render(both)["key"]["distinct_count"]
+    assert estimate == pytest.approx(1500, rel=0.2)
+
+
+def test_render_summarises_the_stats():
+    rendered = profile_repository.render(profile_repository.apply_rows(empty_profile(), ROWS))
+    city, temp = rendered["city"], rendered["temp"]
+
+    assert city["null_ratio"] == pytest.approx(0.2)
+    assert city["distinct_count"] == 3
+    assert city["top_values"][0] == {"value": "Oslo", "count": 2}
+    assert temp["mean"] == pytest.approx(21.5 / 3)
+    assert profile_repository.render({"x": profile_repository.empty_column()})["x"]["mean"] is None
+
+
+def test_constant_column_matches_a_filled_column():
+    built = profile_repository.build_profile(pd.DataFrame({"flag": ["on"] * 40}, dtype=object))
+
+    assert comparable({"flag": profile_repository.constant_column("on", 40)}) == comparable(built)
+    assert profile_repository.constant_column("on", 0) == profile_repository.empty_column()
+    assert profile_repository.constant_column(None, 5)["null_count"] == 5
@@ -0,0 +1,166 @@
+"""Pin the queries the dataset lookups on hot paths issue.
+
+The session records every statement instead of running it, so these run
+without a database: each test checks how many statements a call issues and
+which tables and columns they read.
+"""
+from types import SimpleNamespace
+from typing import Any
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.api import dependencies
+from app.core.exceptions.http_exceptions import ForbiddenException
+from app.model.dataset import Dataset
+from app.model.records import RecordCodec
+from app.model.refresh_token import RefreshToken
+from app.model.user import User
+from app.service.dataset_service import dataset_service
+from app.service.record_service import record_service
+
+
+class RecordingResult:
+    def __init__(self, row: Any):
+        self.row = row
+
+    def scalar(self) -> Any:
+        return self.row
+
+    def scalar_one_or_none(self) -> Any:
+        return self.row
+
+    def one_or_none(self) -> Any:
+        return self.row
+
+    def mappings(self) -> "RecordingResult":
+        return self
+
+    def all(self) -> Any:
+        return self.row
+
+
+class RecordingSession:
+    """Answers the statements with `rows` in order, repeating the last one"""
+    def __init__(self, *rows: Any):
+        self.rows = rows or (None,)
+        self.statements: list[str] = []
+
+    async def execute(self, statement: Any, *args: Any, **kwargs: Any) -> RecordingResult:
+        compiled = str(statement.compile(dialect=postgresql.dialect()))
+        self.statements.append(" ".join(compiled.split()))
+        return RecordingResult(self.rows[min(len(self.statements), len(self.rows)) - 1])
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+def selected_columns(statement: str) -> str:
+    return statement.split(" FROM ", 1)[0]
+
+
+def record_dataset(user_id) -> SimpleNamespace:
+    """The columns `Dataset.get_for_records` loads"""
+    return SimpleNamespace(
+        id=uuid4(), user_id=user_id, data_schema={"name": "string", "age": "integer"}, row_count=2,
+        storage="jsonb", storage_options=None, record_encoding=RecordCodec.OBJECT,
+        column_positions={"name": 0, "age": 1}, encoding_target=None
+    )
+
+
+def assert_one_dataset_read_then_records(statements: list[str]) -> None:
+    assert " FROM datasets" in statements[0]
+    assert "column_stats" not in selected_columns(statements[0])
+    for statement in statements[1:]:
+        assert " FROM records" in statement
+        assert "datasets" not in statement
+
+
+@pytest.mark.parametrize("relationship", [Dataset.records, Dataset.user, User.datasets, User.refresh_tokens, RefreshToken.user])
+def test_relationships_are_never_loaded_implicitly(relationship):
+    assert relationship.property.lazy == "raise"
+
+
+@pytest.mark.anyio
+async def test_record_ownership_check_is_one_narrow_query():
+    owner = uuid4()
+    db = RecordingSession(SimpleNamespace(user_id=owner, encoding_target=None))
+
+    await record_service._validate_ownership(str(uuid4()), owner, db)
+
+    assert len(db.statements) == 1
+    statement = db.statements[0]
+    assert " FROM datasets" in statement
+    assert "records" not in statement
+    assert "column_stats" not in selected_columns(statement)
+    assert "datasets.name" not in selected_columns(statement)
+
+
+@pytest.mark.anyio
+async def test_record_ownership_check_rejects_other_users_in_one_query():
+    db = RecordingSession(SimpleNamespace(user_id=uuid4()))
+
+    with pytest.raises(ForbiddenException):
+        await record_service._validate_ownership(str(uuid4()), uuid4(), db)
+
+    assert len(db.statements) == 1
+
+
+@pytest.mark.anyio
+async def test_dataset_profile_is_one_query():
+    user = SimpleNamespace(id=uuid4())
+    db = RecordingSession(SimpleNamespace(user_id=user.id, row_count=0, column_stats={}))
+
+    await dataset_service.get_dataset_profile(str(uuid4()), user, db)
+
+    assert len(db.statements) == 1
+    assert selected_columns(db.statements[0]) == (
+        "SELECT datasets.user_id, datasets.row_count, datasets.column_stats"
+    )
+
+
+@pytest.mark.anyio
+async def test_records_page_is_ownership_count_and_page():
+    user = SimpleNamespace(id=uuid4())
+    db = RecordingSession(record_dataset(user.id), 0, [])
+
+    await record_service.get_records_for_dataset(str(uuid4()), user, db, columns="name")
+
+    assert len(db.statements) == 3
+    assert_one_dataset_read_then_records(db.statements)
+    assert "count(*)" in db.statements[1]
+
+
+@pytest.mark.anyio
+async def test_filtered_records_page_is_ownership_count_and_page():
+    user = SimpleNamespace(id=uuid4())
+    db = RecordingSession(record_dataset(user.id), 0, [])
+
+    await record_service.filter_record_by_column(
+        str(uuid4()), db, user, key="name", value="ad", sort_by="age", sort_order="desc"
+    )
+
+    assert len(db.statements) == 3
+    assert_one_dataset_read_then_records(db.statements)
+    assert "ILIKE" in db.statements[1] and "ILIKE" in db.statements[2]
+
+
+@pytest.mark.anyio
+async def test_current_user_is_one_query_without_relationships(monkeypatch):
+    user_id = uuid4()
+
+    async def verify_token(token, expected_token_type):
+        return {"sub": str(user_id)}
+
+    monkeypatch.setattr(dependencies, "verify_token", verify_token)
+    db = RecordingSession(SimpleNamespace(id=user_id))
+
+    await dependencies.get_current_user(SimpleNamespace(credentials="token"), db)
+
+    assert len(db.statements) == 1
+    assert " FROM users" in db.statements[0]
+    assert "datasets" not in db.statements[0]
+    assert "refresh_tokens" not in db.statements[0]
@@ -0,0 +1,153 @@
+"""Rows read back the same whichever encoding stored them.
+
+The python side runs anywhere. The SQL builders are compiled for postgres
+here and run against one when TEST_DATABASE_URL is set
+(postgresql+asyncpg://...).
+"""
+import os
+
+import pytest
+from sqlalchemy import literal, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.model.records import RecordCodec
+
+POSITIONS = {"name": 0, "age": 1, "city": 2}
+ROW = {"name": "Ada", "age": "36", "city": None}
+
+
+def codec(encoding: str, positions: dict[str, int] = POSITIONS) -> RecordCodec:
+    return RecordCodec(encoding, positions)
+
+
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+def test_rows_round_trip(encoding):
+    assert codec(encoding).decode(codec(encoding).encode(ROW)) == ROW
+
+
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+def test_patches_round_trip(encoding):
+    patch = {"age": "37", "city": "Oslo"}
+    assert codec(encoding).decode_patch(codec(encoding).encode_patch(patch)) == patch
+
+
+def test_positional_rows_are_arrays_in_column_order():
+    positional = codec(RecordCodec.POSITIONAL, {"city": 2, "name": 0, "age": 1})
+    assert positional.encode(ROW) == ["Ada", "36", None]
+    assert positional.columns == ["name", "age", "city"]
+    assert positional.encode_patch({"city": "Oslo"}) == {"2": "Oslo"}
+
+
+def test_positional_rows_written_before_a_column_was_added_read_as_null():
+    wider = codec(RecordCodec.POSITIONAL, {**POSITIONS, "score": 3})
+    assert wider.decode(["Ada", "36", None]) == {**ROW, "score": None}
+
+
+def test_positional_patches_ignore_unknown_slots():
+    assert codec(RecordCodec.POSITIONAL).decode_patch({"1": "37", "9": "x"}) == {"age": "37"}
+
+
+def test_object_rows_are_stored_as_given():
+    assert codec(RecordCodec.OBJECT).encode(ROW) is ROW
+    assert codec(RecordCodec.OBJECT).decode(ROW) is ROW
+
+
+# -------- SQL -------- #
+def stored(encoding: str, row: dict = ROW):
+    return literal(codec(encoding).encode(row), JSONB)
+
+
+SQL_BUILDERS = {
+    "merge": lambda c, data: c.merge(literal(c.encode_patch({"age": "37"}), JSONB), data),
+    "set_value": lambda c, data: c.set_value("city", literal("Oslo", JSONB), data),
+    "remove_value": lambda c, data: c.remove_value("age", data),
+    "rename_value": lambda c, data: c.rename_value("age", "years", data),
+    "as_object": lambda c, data: c.as_object(["name", "city"], data),
+    "replace_patch": lambda c, data: c.replace_patch(["name"], "a", "o", data=data),
+}
+
+
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+@pytest.mark.parametrize("builder", SQL_BUILDERS)
+def test_sql_builders_compile(builder, encoding):
+    expr = SQL_BUILDERS[builder](codec(encoding), stored(encoding))
+    select(expr).compile(dialect=postgresql.dialect())
+
+
+@pytest.fixture
+def anyio_backend() -> str:
+    return "asyncio"
+
+
+@pytest.fixture
+async def postgres():
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    engine = create_async_engine(url)
+    async with engine.connect() as conn:
+        yield conn
+    await engine.dispose()
+
+
+async def run(postgres, expr):
+    return (await postgres.execute(select(expr))).scalar()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+async def test_merge_in_sql(postgres, encoding):
+    c = codec(encoding)
+    data = await run(postgres, c.merge(literal(c.encode_patch({"age": "37", "city": "Oslo"}), JSONB), stored(encoding)))
+    assert c.decode(data) == {"name": "Ada", "age": "37", "city": "Oslo"}
+
+
+@pytest.mark.anyio
+async def test_merge_pads_short_positional_rows(postgres):
+    wider = codec(RecordCodec.POSITIONAL, {**POSITIONS, "score": 3})
+    patch = literal(wider.encode_patch({"score": 9}), JSONB)
+    data = await run(postgres, wider.merge(patch, literal(["Ada", "36"], JSONB)))
+    assert data == ["Ada", "36", None, 9]
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+async def test_set_value_in_sql(postgres, encoding):
+    c = codec(encoding)
+    data = await run(postgres, c.set_value("city", literal("Oslo", JSONB), stored(encoding)))
+    assert c.decode(data) == {**ROW, "city": "Oslo"}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+async def test_remove_value_in_sql(postgres, encoding):
+    remaining = {"name": 0, "city": 2}
+    data = await run(postgres, codec(encoding).remove_value("age", stored(encoding)))
+    assert codec(encoding, remaining).decode(data) == {"name": "Ada", "city": None}
+    if encoding == RecordCodec.OBJECT:
+        assert "age" not in data
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+async def test_rename_value_in_sql(postgres, encoding):
+    renamed = {"name": 0, "years": 1, "city": 2}
+    data = await run(postgres, codec(encoding).rename_value("age", "years", stored(encoding)))
+    assert codec(encoding, renamed).decode(data) == {"name": "Ada", "years": "36", "city": None}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+async def test_as_object_in_sql(postgres, encoding):
+    data = await run(postgres, codec(encoding).as_object(["name", "city"], stored(encoding)))
+    assert data == {"name": "Ada", "city": None}
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("encoding", RecordCodec.ENCODINGS)
+async def test_replace_patch_in_sql(postgres, encoding):
+    c = codec(encoding)
+    patch = await run(postgres, c.replace_patch(["name", "age"], "A", "E", data=stored(encoding)))
+    assert c.decode_patch(patch) == {"name": "Eda"}